@@ -0,0 +1,55 @@
+"""add user_id created_at indexes
+
+Revision ID: 5874e25207af
+Revises: 84d915024ccd
+Create Date: 2026-10-17 12:00:41.118204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5874e25207af"
+down_revision: Union[str, None] = "84d915024ccd"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индексы строятся CONCURRENTLY, чтобы не блокировать запись в таблицы на время миграции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_statistics_user_id_created_at",
+            "statistics",
+            ["user_id", "created_at"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_recommendation_history_user_id_created_at",
+            "recommendation_history",
+            ["user_id", "created_at"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_recommendation_history_user_id_created_at",
+            table_name="recommendation_history",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_statistics_user_id_created_at",
+            table_name="statistics",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
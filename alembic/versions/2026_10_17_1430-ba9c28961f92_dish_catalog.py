@@ -0,0 +1,102 @@
+"""dish catalog: merge duplicate dishes
+
+Revision ID: ba9c28961f92
+Revises: 1e6f5aaeef3d
+Create Date: 2026-10-17 14:30:12.904417
+
+"""
+
+import hashlib
+import re
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "ba9c28961f92"
+down_revision: Union[str, None] = "1e6f5aaeef3d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5_000
+
+# Замороженные копии usecases.utils на момент миграции: её результат не должен зависеть от будущих правок приложения
+MAX_DISH_NAME_LENGTH = 100
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+
+def normalize_dish_text(text: str) -> str:
+    text = _NON_WORD_RE.sub(" ", text.lower().replace("ё", "е"))
+    return " ".join(text.split())
+
+
+def nutrition_hash(protein: Decimal, fat: Decimal, carbohydrates: Decimal, calories: Decimal) -> str:
+    values = (
+        Decimal(value).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+        for value in (protein, fat, carbohydrates, calories)
+    )
+    return hashlib.sha256("|".join(map(str, values)).encode()).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column("dishes", sa.Column("normalized_name", sa.String(length=MAX_DISH_NAME_LENGTH), nullable=True))
+    op.add_column("dishes", sa.Column("nutrition_hash", sa.String(length=64), nullable=True))
+
+    # Ключ каталога считается тем же алгоритмом, что и в приложении, поэтому заполняется из Python пачками
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.text(
+                "SELECT dishes.id, dishes.name, nutrition.protein, nutrition.fat, nutrition.carbohydrates, "
+                "nutrition.calories FROM dishes JOIN nutrition ON dishes.nutrition_id = nutrition.id "
+                "WHERE dishes.id > :last_id ORDER BY dishes.id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE},
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            sa.text(
+                "UPDATE dishes SET normalized_name = :normalized_name, nutrition_hash = :nutrition_hash WHERE id = :id"
+            ),
+            [
+                {
+                    "id": row.id,
+                    "normalized_name": normalize_dish_text(row.name)[:MAX_DISH_NAME_LENGTH],
+                    "nutrition_hash": nutrition_hash(row.protein, row.fat, row.carbohydrates, row.calories),
+                }
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+    # Дубликаты сливаются в запись с наименьшим id, ссылки на них переводятся на неё
+    op.execute(
+        "CREATE TEMPORARY TABLE dish_merge ON COMMIT DROP AS "
+        "SELECT id, min(id) OVER (PARTITION BY normalized_name, nutrition_hash) AS canonical_id FROM dishes"
+    )
+    op.execute("DELETE FROM dish_merge WHERE id = canonical_id")
+    for table in ("statistics", "recommendation_history", "dish_text_cache"):
+        op.execute(
+            f"UPDATE {table} SET dish_id = dish_merge.canonical_id FROM dish_merge WHERE {table}.dish_id = dish_merge.id"
+        )
+    op.execute("DELETE FROM dishes USING dish_merge WHERE dishes.id = dish_merge.id")
+    op.execute(
+        "DELETE FROM nutrition WHERE NOT EXISTS (SELECT 1 FROM dishes WHERE dishes.nutrition_id = nutrition.id) "
+        "AND NOT EXISTS (SELECT 1 FROM users WHERE users.nutrition_goal_id = nutrition.id)"
+    )
+
+    op.alter_column("dishes", "normalized_name", existing_type=sa.String(length=MAX_DISH_NAME_LENGTH), nullable=False)
+    op.alter_column("dishes", "nutrition_hash", existing_type=sa.String(length=64), nullable=False)
+    op.create_unique_constraint("uq_dishes_normalized_name_nutrition", "dishes", ["normalized_name", "nutrition_hash"])
+
+
+def downgrade() -> None:
+    # Слитые дубликаты не восстанавливаются: ссылки уже указывают на каноничные записи
+    op.drop_constraint("uq_dishes_normalized_name_nutrition", "dishes", type_="unique")
+    op.drop_column("dishes", "nutrition_hash")
+    op.drop_column("dishes", "normalized_name")
@@ -0,0 +1,104 @@
+"""Бенчмарк пикового потребления памяти на одно голосовое сообщение.
+
+Сравнивает прежний конвейер (bytes -> BytesIO -> stdin ffmpeg -> WAV в BytesIO -> AudioFile.record)
+с потоковой конвертацией AudioProcessor.convert_ogg_to_pcm (чанки -> ffmpeg -> PCM 16 кГц моно).
+Пик снимается tracemalloc, т.е. учитываются только аллокации Python. Распознавание речи в сеть не отправляется,
+замер заканчивается на подготовленном speech_recognition.AudioData.
+
+Нужен ffmpeg в PATH. Без --input тестовое OGG/Opus генерируется самим ffmpeg:
+    python benchmarks/audio_memory.py --duration 60
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import tracemalloc
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import speech_recognition
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from usecases.audio import PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH, AudioProcessor
+
+CHUNK_SIZE = 64 * 1024  # как у aiogram при скачивании файла
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="OGG-файл голосового сообщения")
+    parser.add_argument("--duration", type=int, default=60, help="длительность сгенерированного аудио, сек")
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def generate_voice_message(duration: int) -> bytes:
+    return subprocess.run(
+        [
+            *("ffmpeg", "-hide_banner", "-loglevel", "error"),
+            *("-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}"),
+            *("-c:a", "libopus", "-b:a", "32k", "-f", "ogg", "pipe:1"),
+        ],
+        check=True,
+        capture_output=True,
+    ).stdout
+
+
+async def legacy_pipeline(file_bytes: bytes) -> speech_recognition.AudioData:
+    """Воспроизводит конвейер до потоковой конвертации"""
+    file_bytes_io = io.BytesIO(file_bytes)  # bot.download_file
+    file_bytes = file_bytes_io.read()
+    process = await asyncio.create_subprocess_exec(
+        *("ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "ogg", "-i", "pipe:0", "-f", "wav", "pipe:1"),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    out, _ = await process.communicate(input=io.BytesIO(file_bytes).read())
+    with speech_recognition.AudioFile(io.BytesIO(out)) as source:
+        return speech_recognition.Recognizer().record(source)
+
+
+async def streaming_pipeline(file_bytes: bytes, audio_processor: AudioProcessor) -> speech_recognition.AudioData:
+    async def chunks() -> AsyncIterator[bytes]:
+        # Имитирует stream_content: каждый чанк — новый объект bytes, как из сокета
+        for offset in range(0, len(file_bytes), CHUNK_SIZE):
+            yield bytes(file_bytes[offset : offset + CHUNK_SIZE])
+
+    pcm = await audio_processor.convert_ogg_to_pcm(chunks())
+    return speech_recognition.AudioData(pcm, sample_rate=PCM_SAMPLE_RATE, sample_width=PCM_SAMPLE_WIDTH)
+
+
+async def measure(name: str, repeat: int, run) -> None:
+    peaks, sizes = [], []
+    for _ in range(repeat):
+        tracemalloc.start()
+        audio = await run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+        sizes.append(len(audio.frame_data))
+    print(f"{name:<10} пик={max(peaks) / 1024:>10.1f} КиБ  аудиоданные={sizes[0] / 1024:>10.1f} КиБ")
+
+
+async def run_benchmark(file_bytes: bytes, repeat: int) -> None:
+    audio_processor = AudioProcessor(max_concurrency=1, max_queue_size=1, executor_workers=1, ffmpeg_timeout_sec=60)
+    try:
+        await measure("legacy", repeat, lambda: legacy_pipeline(file_bytes))
+        await measure("streaming", repeat, lambda: streaming_pipeline(file_bytes, audio_processor))
+    finally:
+        audio_processor.shutdown()
+
+
+def main() -> None:
+    args = parse_args()
+    file_bytes = Path(args.input).read_bytes() if args.input else generate_voice_message(args.duration)
+    print(f"OGG: {len(file_bytes) / 1024:.1f} КиБ, повторов: {args.repeat}")
+    asyncio.run(run_benchmark(file_bytes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
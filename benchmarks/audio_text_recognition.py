@@ -0,0 +1,140 @@
+"""Сравнение режимов распознавания блюда по расшифровке голосового сообщения: single и two_step.
+
+Прогоняет набор расшифровок из fixtures/audio_transcripts.json через GigachatClient.recognize_meal_by_text_from_audio
+в обоих режимах GIGACHAT_AUDIO_RECOGNITION_MODE и печатает задержку, число запросов к модели на сообщение и
+точность КБЖУ относительно эталона (средняя относительная ошибка калорий и доля ответов в пределах допуска).
+
+По умолчанию GigaChat подменяется заглушкой с фиксированной задержкой ответа: так видна разница в задержке и числе
+запросов, а точность заглушки всегда 100%. С --live запросы уходят в настоящий API (нужны GIGACHAT_* из .env):
+    python benchmarks/audio_text_recognition.py --completion-latency-ms 800
+    python benchmarks/audio_text_recognition.py --live
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from config import GigachatConfig
+from repositories.gigachat import (
+    AIRequestScheduler,
+    CircuitBreaker,
+    GigachatClient,
+    GigachatTokenCache,
+    create_gigachat_http_client,
+    is_service_failure,
+)
+
+FIXTURES_PATH = Path(__file__).parent / "fixtures" / "audio_transcripts.json"
+MODES = ("two_step", "single")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES_PATH)
+    parser.add_argument("--live", action="store_true", help="обращаться к настоящему GigaChat API")
+    parser.add_argument("--completion-latency-ms", type=float, default=800, help="задержка ответа заглушки")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="допустимая относительная ошибка калорий")
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args()
+
+
+def stub_transport(fixtures: list[dict], latency_sec: float, counter: dict) -> httpx.MockTransport:
+    """Заглушка GigaChat: отвечает списком еды или эталонным JSON в зависимости от запроса"""
+    by_transcript = {fixture["transcript"]: fixture for fixture in fixtures}
+    by_foods = {fixture["foods"]: fixture for fixture in fixtures}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/oauth"):
+            return httpx.Response(200, json={"access_token": "stub", "expires_at": int((time.time() + 1800) * 1000)})
+
+        counter["completions"] += 1
+        await asyncio.sleep(latency_sec)
+        messages = json.loads(request.content)["messages"]
+        system_message, user_message = messages[0]["content"], messages[1]["content"]
+        if user_message in by_transcript and "просто перечисли" in system_message:
+            content = by_transcript[user_message]["foods"]
+        else:
+            fixture = by_transcript.get(user_message) or by_foods[user_message]
+            content = f"```json\n{json.dumps(fixture['expected'], ensure_ascii=False)}\n```"
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    return httpx.MockTransport(handler)
+
+
+def make_client(config: GigachatConfig, http_client: httpx.AsyncClient) -> GigachatClient:
+    return GigachatClient(
+        config=config,
+        http_client=http_client,
+        token_cache=GigachatTokenCache(config=config, http_client=http_client),
+        scheduler=AIRequestScheduler(
+            max_concurrency=config.GIGACHAT_MAX_CONCURRENT_REQUESTS,
+            rate_per_sec=config.GIGACHAT_RATE_LIMIT_PER_SEC,
+            burst=config.GIGACHAT_RATE_LIMIT_BURST,
+        ),
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=config.GIGACHAT_BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout_sec=config.GIGACHAT_BREAKER_RECOVERY_TIMEOUT_SEC,
+            half_open_max_calls=config.GIGACHAT_BREAKER_HALF_OPEN_MAX_CALLS,
+            is_failure=is_service_failure,
+        ),
+    )
+
+
+async def run_mode(mode: str, fixtures: list[dict], args: argparse.Namespace) -> None:
+    counter = {"completions": 0}
+    config = GigachatConfig(GIGACHAT_AUDIO_RECOGNITION_MODE=mode)
+    if args.live:
+        http_client = create_gigachat_http_client(config)
+    else:
+        config = config.model_copy(update={"GIGACHAT_RATE_LIMIT_PER_SEC": 1_000, "GIGACHAT_RATE_LIMIT_BURST": 1_000})
+        http_client = httpx.AsyncClient(transport=stub_transport(fixtures, args.completion_latency_ms / 1000, counter))
+
+    latencies, errors, failures = [], [], 0
+    async with http_client:
+        client = make_client(config, http_client)
+        for _ in range(args.repeat):
+            for fixture in fixtures:
+                started_at = time.perf_counter()
+                try:
+                    dish = await client.recognize_meal_by_text_from_audio(message=fixture["transcript"])
+                except Exception as e:
+                    failures += 1
+                    print(f"  {mode}: ошибка на «{fixture['transcript']}»: {e!r}")
+                    continue
+                latencies.append(time.perf_counter() - started_at)
+                expected_calories = fixture["expected"]["calories"]
+                errors.append(abs(float(dish.calories) - expected_calories) / expected_calories)
+
+    calls = args.repeat * len(fixtures)
+    completions = f"{counter['completions'] / calls:.2f}" if not args.live else "—"
+    within_tolerance = sum(error <= args.tolerance for error in errors) / calls
+    print(
+        f"{mode:<9} p50={statistics.median(latencies) * 1000:8.1f} мс  "
+        f"p95={statistics.quantiles(latencies, n=20)[-1] * 1000:8.1f} мс  запросов/сообщение={completions:>5}  "
+        f"ошибка ккал={statistics.mean(errors) * 100:5.1f}%  в допуске={within_tolerance * 100:5.1f}%  "
+        f"сбоев={failures}"
+    )
+
+
+async def run_benchmark(fixtures: list[dict], args: argparse.Namespace) -> None:
+    for mode in MODES:
+        await run_mode(mode, fixtures, args)
+
+
+def main() -> None:
+    args = parse_args()
+    fixtures = json.loads(args.fixtures.read_text())
+    print(f"Расшифровок: {len(fixtures)}, повторов: {args.repeat}, {'live' if args.live else 'заглушка'}")
+    asyncio.run(run_benchmark(fixtures, args))
+
+
+if __name__ == "__main__":
+    main()
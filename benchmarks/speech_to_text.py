@@ -0,0 +1,129 @@
+"""Бенчмарк бэкендов распознавания речи на записанных голосовых сообщениях.
+
+Каждый OGG из каталога фикстур один раз конвертируется в PCM (как в боте), затем для каждого бэкенда замеряются
+время прогрева, задержка распознавания одного сообщения (последовательно) и пропускная способность при
+параллельной обработке в пуле потоков AudioProcessor.
+
+Если в каталоге нет записанных сообщений, ffmpeg синтезирует OGG/Opus как у Telegram (розовый шум в полосе речи
+с модуляцией по слогам) длительностью --synthetic-durations. На них замеряется стоимость декодирования,
+а не качество распознавания.
+
+Запуск из корня проекта (нужен ffmpeg, для vosk — extra vosk и распакованная модель):
+    python benchmarks/speech_to_text.py --fixtures benchmarks/fixtures/voice --backends google vosk
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from config import SpeechConfig
+from repositories.speech import create_speech_to_text
+from usecases.audio import PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH, AudioProcessor
+from usecases.interfaces import SpeechToTextInterface
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default="benchmarks/fixtures/voice", help="каталог с *.ogg")
+    parser.add_argument("--backends", nargs="+", default=["google", "vosk"], choices=["google", "vosk"])
+    parser.add_argument("--vosk-model-path", default=SpeechConfig().SPEECH_VOSK_MODEL_PATH)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--synthetic-durations",
+        nargs="+",
+        type=int,
+        default=[3, 8, 15, 30],
+        help="длительности синтетических фикстур, сек",
+    )
+    return parser.parse_args()
+
+
+def synthesize_voice_message(duration: int) -> bytes:
+    return subprocess.run(
+        [
+            *("ffmpeg", "-hide_banner", "-loglevel", "error"),
+            *("-f", "lavfi", "-i", f"anoisesrc=color=pink:sample_rate=48000:amplitude=0.3:duration={duration}"),
+            *("-af", "tremolo=f=4:d=0.9,bandpass=f=1000:width_type=h:w=3000"),
+            *("-c:a", "libopus", "-b:a", "32k", "-f", "ogg", "pipe:1"),
+        ],
+        check=True,
+        capture_output=True,
+    ).stdout
+
+
+async def file_chunks(data: bytes, chunk_size: int = 64 * 1024):
+    for offset in range(0, len(data), chunk_size):
+        yield data[offset : offset + chunk_size]
+
+
+def audio_seconds(pcm: bytes) -> float:
+    return len(pcm) / (PCM_SAMPLE_RATE * PCM_SAMPLE_WIDTH)
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+async def run_backend(
+    name: str, speech_to_text: SpeechToTextInterface, fixtures: list[bytes], concurrency: int, repeat: int
+) -> None:
+    audio_processor = AudioProcessor(
+        max_concurrency=concurrency, max_queue_size=len(fixtures), executor_workers=concurrency, ffmpeg_timeout_sec=60
+    )
+    try:
+        started_at = time.perf_counter()
+        await audio_processor.run_blocking(speech_to_text.warm_up)
+        warm_up_sec = time.perf_counter() - started_at
+
+        latencies = []
+        for _ in range(repeat):
+            for pcm in fixtures:
+                started_at = time.perf_counter()
+                await audio_processor.run_blocking(speech_to_text.transcribe, pcm)
+                latencies.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(audio_processor.run_blocking(speech_to_text.transcribe, pcm) for pcm in fixtures))
+        wall_sec = time.perf_counter() - started_at
+    finally:
+        audio_processor.shutdown()
+
+    total_audio_sec = sum(audio_seconds(pcm) for pcm in fixtures)
+    print(
+        f"{name:<8} прогрев={warm_up_sec:7.2f} с  "
+        f"p50={statistics.median(latencies) * 1000:8.1f} мс  p95={percentile(latencies, 95) * 1000:8.1f} мс  "
+        f"сообщений/с={len(fixtures) / wall_sec:6.2f}  аудио-с/с={total_audio_sec / wall_sec:6.2f}"
+    )
+
+
+async def run_benchmark(args: argparse.Namespace, ogg_fixtures: list[bytes]) -> None:
+    converter = AudioProcessor(max_concurrency=1, max_queue_size=1, executor_workers=1, ffmpeg_timeout_sec=60)
+    fixtures = [await converter.convert_ogg_to_pcm(file_chunks(data)) for data in ogg_fixtures]
+    converter.shutdown()
+    print(f"Фикстур: {len(fixtures)}, аудио: {sum(map(audio_seconds, fixtures)):.1f} с")
+
+    for backend in args.backends:
+        config = SpeechConfig(SPEECH_BACKEND=backend, SPEECH_VOSK_MODEL_PATH=args.vosk_model_path)
+        await run_backend(backend, create_speech_to_text(config), fixtures, args.concurrency, args.repeat)
+
+
+def main() -> None:
+    args = parse_args()
+    paths = sorted(Path(args.fixtures).glob("*.ogg"))
+    if paths:
+        ogg_fixtures = [path.read_bytes() for path in paths]
+    else:
+        print(f"В {args.fixtures} нет *.ogg, синтезируем фикстуры: {args.synthetic_durations} с")
+        ogg_fixtures = [synthesize_voice_message(duration) for duration in args.synthetic_durations]
+    asyncio.run(run_benchmark(args, ogg_fixtures))
+
+
+if __name__ == "__main__":
+    main()
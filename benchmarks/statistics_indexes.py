@@ -0,0 +1,183 @@
+"""Бенчмарк индексов (user_id, created_at) на statistics и recommendation_history.
+
+Наполняет отдельную схему локального Postgres несколькими миллионами строк, снимает планы и задержки
+запросов репозитория без индексов, строит индексы и повторяет замеры.
+
+Запуск из корня проекта (по умолчанию используются DB_* из .env):
+    python benchmarks/statistics_indexes.py --statistics-rows 3000000
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from config import DBConfig, current_moscow_datetime
+from repositories.db.db_repository import DBRepository
+from repositories.db.models import Base
+
+INDEXES = {
+    "ix_statistics_user_id_created_at": "statistics (user_id, created_at)",
+    "ix_recommendation_history_user_id_created_at": "recommendation_history (user_id, created_at)",
+}
+
+EXPLAIN_QUERIES = {
+    "dishes_history_by_period": """
+        SELECT statistics.id, dishes.name, nutrition.calories
+        FROM statistics
+        JOIN dishes ON dishes.id = statistics.dish_id
+        JOIN nutrition ON nutrition.id = dishes.nutrition_id
+        WHERE statistics.user_id = :user_id AND statistics.created_at >= :valid_from_dt
+          AND statistics.created_at <= :valid_to_dt
+    """,
+    "dishes_history": """
+        SELECT dishes.name FROM statistics JOIN dishes ON dishes.id = statistics.dish_id
+        WHERE statistics.user_id = :user_id LIMIT 50
+    """,
+    "recommendation_history": """
+        SELECT dish_id FROM recommendation_history
+        WHERE user_id = :user_id AND created_at >= :valid_from_dt AND created_at <= :valid_to_dt
+    """,
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", default=DBConfig().db_url)
+    parser.add_argument("--schema", default="bench_indexes")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--dishes", type=int, default=5_000)
+    parser.add_argument("--statistics-rows", type=int, default=3_000_000)
+    parser.add_argument("--recommendation-rows", type=int, default=500_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="не удалять схему с данными после замеров")
+    return parser.parse_args()
+
+
+async def seed(engine: AsyncEngine, args: argparse.Namespace) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {args.schema}"))
+        await conn.run_sync(Base.metadata.create_all)
+        for index_name in INDEXES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+        started_at = time.perf_counter()
+        await conn.execute(
+            text(
+                "INSERT INTO users (telegram_id, first_name) "
+                "SELECT g, 'user_' || g FROM generate_series(1, :users) AS g"
+            ),
+            {"users": args.users},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO nutrition (id, protein, fat, carbohydrates, calories) "
+                "SELECT g, random() * 100, random() * 100, random() * 300, random() * 2000 "
+                "FROM generate_series(1, :dishes) AS g"
+            ),
+            {"dishes": args.dishes},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO dishes (id, name, normalized_name, nutrition_hash, nutrition_id) "
+                "SELECT g, 'dish_' || g, 'dish_' || g, md5(g::text), g FROM generate_series(1, :dishes) AS g"
+            ),
+            {"dishes": args.dishes},
+        )
+        for table, rows in (("statistics", args.statistics_rows), ("recommendation_history", args.recommendation_rows)):
+            like_column = ', "like"' if table == "statistics" else ""
+            like_value = ", true" if table == "statistics" else ""
+            await conn.execute(
+                text(
+                    f"INSERT INTO {table} (user_id, dish_id, created_at{like_column}) "
+                    f"SELECT 1 + floor(random() * :users)::bigint, 1 + floor(random() * :dishes)::bigint, "
+                    f"now() - random() * make_interval(days => :days){like_value} "
+                    f"FROM generate_series(1, :rows)"
+                ),
+                {"users": args.users, "dishes": args.dishes, "days": args.days, "rows": rows},
+            )
+        print(f"Наполнение данными: {time.perf_counter() - started_at:.1f} с")
+
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE"))
+
+
+async def explain(engine: AsyncEngine, params: dict) -> None:
+    async with engine.connect() as conn:
+        for name, query in EXPLAIN_QUERIES.items():
+            plan = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) {query}"), params)
+            print(f"\n--- {name}")
+            print("\n".join(row[0] for row in plan))
+
+
+async def measure(repository: DBRepository, args: argparse.Namespace) -> None:
+    now = current_moscow_datetime()
+    day_start = now - datetime.timedelta(days=1)
+    month_start = now - datetime.timedelta(days=30)
+    cases = {
+        "get_user_dishes_history_by_period (день)": lambda db, user_id: db.get_user_dishes_history_by_period(
+            user_id=user_id, valid_from_dt=day_start, valid_to_dt=now
+        ),
+        "get_user_daily_nutrition_totals (30 дней)": lambda db, user_id: db.get_user_daily_nutrition_totals(
+            user_id=user_id, valid_from_dt=month_start, valid_to_dt=now
+        ),
+        "get_user_dishes_history": lambda db, user_id: db.get_user_dishes_history(user_id=user_id),
+    }
+    for name, call in cases.items():
+        latencies = []
+        for attempt in range(args.repeat):
+            user_id = 1 + attempt * 7919 % args.users
+            async with repository as db:
+                started_at = time.perf_counter()
+                await call(db, user_id)
+                latencies.append((time.perf_counter() - started_at) * 1000)
+        latencies.sort()
+        print(
+            f"{name:45} p50={statistics.median(latencies):8.2f} мс "
+            f"p95={latencies[int(len(latencies) * 0.95) - 1]:8.2f} мс max={latencies[-1]:8.2f} мс"
+        )
+
+
+async def run_phase(title: str, engine: AsyncEngine, repository: DBRepository, args: argparse.Namespace) -> None:
+    print(f"\n===== {title} =====")
+    now = current_moscow_datetime()
+    await explain(engine, {"user_id": 42, "valid_from_dt": now - datetime.timedelta(days=1), "valid_to_dt": now})
+    print()
+    await measure(repository, args)
+
+
+async def main() -> None:
+    args = parse_args()
+    engine = create_async_engine(args.db_url, connect_args={"server_settings": {"search_path": args.schema}})
+    repository = DBRepository(session_factory=async_sessionmaker(bind=engine, autoflush=False))
+    try:
+        await seed(engine, args)
+        await run_phase("Без индексов", engine, repository, args)
+
+        async with engine.begin() as conn:
+            started_at = time.perf_counter()
+            for index_name, definition in INDEXES.items():
+                await conn.execute(text(f"CREATE INDEX {index_name} ON {definition}"))
+            print(f"\nПостроение индексов: {time.perf_counter() - started_at:.1f} с")
+            await conn.execute(text("ANALYZE statistics, recommendation_history"))
+
+        await run_phase("С индексами", engine, repository, args)
+    finally:
+        if not args.keep:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,21 +1,41 @@
 import asyncio
 import logging
+from collections.abc import AsyncIterator
+from decimal import Decimal
 from io import BytesIO
 
 import magic
-from aiogram import F, Router, types
+from aiogram import Bot, F, Router, types
+from aiogram.exceptions import TelegramAPIError
 from aiogram.fsm.context import FSMContext
 
 from bot.keyboards import goal_set_kb, goal_update_kb, statistics_set_kb, unlike_dish_or_back_kb, user_kb
 from bot.states import AddMealStates, SetNutritionGoalStates
 from bot.validators import GoalValidator
 from dependencies import container
+from repositories import UnitOfWork
 from usecases import DishRecognitionUseCase, RecommendationUseCase, StatisticsUseCase, UsersUseCase
-from usecases.errors import AudioToTextError, MaxRetryError, UserNutritionNotSetError
-from usecases.schemas import ActivityType, GoalType, NutritionGoalSchema
+from usecases.errors import (
+    AudioQueueFullError,
+    AudioToTextError,
+    MaxRetryError,
+    ServiceUnavailableError,
+    UserNutritionNotSetError,
+)
+from usecases.schemas import (
+    ActivityType,
+    DishRecommendation,
+    DishRecommendationDraft,
+    GoalType,
+    NutritionGoalSchema,
+)
 
 router = Router()
 
+SERVICE_UNAVAILABLE_TEXT = "⚠️ Сервис распознавания сейчас недоступен. Попробуйте через пару минут."
+# Telegram ограничивает частоту правок одного сообщения
+RECOMMENDATION_DRAFT_EDIT_INTERVAL_SEC = 1
+
 
 @router.message(F.text.lower() == "главное меню")
 async def main_menu(message: types.Message):
@@ -32,12 +52,15 @@ async def add_dish(message: types.Message, state: FSMContext):
 @router.message(AddMealStates.waiting_dish_obj, F.text)
 async def process_dish_text(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    statistics_uc: StatisticsUseCase = container.resolve(StatisticsUseCase)
     dish_recognition_uc: DishRecognitionUseCase = container.resolve(DishRecognitionUseCase)
     try:
-        dish_data = await dish_recognition_uc.recognize_dish_from_text(dish_name=message.text)
+        dish_data = await dish_recognition_uc.recognize_dish_from_text(
+            dish_name=message.text, user_id=user_id, log_meal=True
+        )
+        await commit_changes()
         await send_dish_info(message, dish_data)
-        await statistics_uc.update_statistics(user_id=user_id, dish_id=dish_data.id)
+    except ServiceUnavailableError:
+        await message.answer(SERVICE_UNAVAILABLE_TEXT)
     except Exception as e:
         logging.error(f"Ошибка={e}")
         await message.answer("❌ Не удалось рассчитать калории. Попробуйте еще раз.")
@@ -58,20 +81,33 @@ async def process_dish_image(message: types.Message, state: FSMContext):
     bot = message.bot
 
     try:
-        file = await bot.get_file(message.photo[-1].file_id)
-        file_bytes = await bot.download_file(file.file_path)
-        file_bytes = file_bytes.read() if isinstance(file_bytes, BytesIO) else file_bytes
-
-        mime = magic.Magic(mime=True)
-        mime_type = mime.from_buffer(file_bytes)
-        logging.info(f"mime_type={mime_type}")
-        dish_data = await dish_recognition_uc.recognize_dish_from_image(dish_bytes=file_bytes, mime_type=mime_type)
+        photo = message.photo[-1]
+        dish_data = dish_recognition_uc.get_cached_dish_by_file_id(photo.file_unique_id)
+        if dish_data:
+            await statistics_uc.update_statistics(user_id=user_id, dish_id=dish_data.id)
+        else:
+            file = await bot.get_file(photo.file_id)
+            file_bytes = await bot.download_file(file.file_path)
+            file_bytes = file_bytes.read() if isinstance(file_bytes, BytesIO) else file_bytes
+
+            mime = magic.Magic(mime=True)
+            mime_type = mime.from_buffer(file_bytes)
+            logging.info(f"mime_type={mime_type}")
+            dish_data = await dish_recognition_uc.recognize_dish_from_image(
+                dish_bytes=file_bytes,
+                mime_type=mime_type,
+                file_unique_id=photo.file_unique_id,
+                user_id=user_id,
+                log_meal=True,
+            )
+        await commit_changes()
 
         await send_dish_info(message, dish_data)
         await processing_message.edit_text("✅ Подсчет завершен!")
         await asyncio.sleep(3)
         await bot.delete_message(chat_id=message.chat.id, message_id=processing_message.message_id)
-        await statistics_uc.update_statistics(user_id=user_id, dish_id=dish_data.id)
+    except ServiceUnavailableError:
+        await processing_message.edit_text(SERVICE_UNAVAILABLE_TEXT)
     except Exception as e:
         logging.error(f"Ошибка={e}")
         await processing_message.edit_text("❌ Не удалось распознать фото. Попробуйте еще раз.")
@@ -81,7 +117,6 @@ async def process_dish_image(message: types.Message, state: FSMContext):
 
 @router.message(AddMealStates.waiting_dish_obj, F.voice)
 async def process_dish_audio(message: types.Message, state: FSMContext):
-    statistics_uc: StatisticsUseCase = container.resolve(StatisticsUseCase)
     dish_recognition_uc: DishRecognitionUseCase = container.resolve(DishRecognitionUseCase)
 
     processing_message = await message.answer("⏳Идет подсчет калорий..")
@@ -90,23 +125,31 @@ async def process_dish_audio(message: types.Message, state: FSMContext):
 
     try:
         file = await bot.get_file(message.voice.file_id)
-        file_bytes_io = await bot.download_file(file.file_path)
-        file_bytes = file_bytes_io.read()  # Приводим BytesIO к bytes
 
         try:
-            dish_data = await dish_recognition_uc.recognize_dish_from_audio(file_bytes=file_bytes)
+            dish_data = await dish_recognition_uc.recognize_dish_from_audio(
+                audio_chunks=stream_telegram_file(bot, file.file_path), user_id=user_id, log_meal=True
+            )
         except AudioToTextError:
             await processing_message.edit_text("❌ Не удалось распознать аудио. Попробуйте еще раз.")
             await asyncio.sleep(2)
             await bot.delete_message(chat_id=message.chat.id, message_id=processing_message.message_id)
             await state.clear()
             return
+        except AudioQueueFullError:
+            await processing_message.edit_text(
+                "⏳ Сейчас обрабатывается слишком много голосовых сообщений. Попробуйте через минуту."
+            )
+            await state.clear()
+            return
+        await commit_changes()
 
         await send_dish_info(message, dish_data)
         await processing_message.edit_text("✅ Подсчет завершен!")
         await asyncio.sleep(3)
         await bot.delete_message(chat_id=message.chat.id, message_id=processing_message.message_id)
-        await statistics_uc.update_statistics(user_id=user_id, dish_id=dish_data.id)
+    except ServiceUnavailableError:
+        await processing_message.edit_text(SERVICE_UNAVAILABLE_TEXT)
     except Exception as e:
         logging.error(f"Ошибка={e}")
         await processing_message.edit_text("❌ Не удалось рассчитать калории. Попробуйте еще раз.")
@@ -114,6 +157,20 @@ async def process_dish_audio(message: types.Message, state: FSMContext):
         await state.clear()
 
 
+async def commit_changes() -> None:
+    """Коммитит записи хендлера до ответа пользователю.
+
+    Пока бот правит и удаляет сообщения, соединение не простаивает в открытой транзакции, а ошибка коммита
+    обрабатывается хендлером до того, как пользователь увидит «✅ Подсчет завершен!»
+    """
+    await container.resolve(UnitOfWork).commit()
+
+
+def stream_telegram_file(bot: Bot, file_path: str) -> AsyncIterator[bytes]:
+    """Отдаёт файл с серверов Telegram чанками по мере скачивания, не собирая его в BytesIO"""
+    return bot.session.stream_content(url=bot.session.api.file_url(bot.token, file_path))
+
+
 async def send_dish_info(message: types.Message, dish_data):
     await message.answer(
         f"🍽 *Блюдо:* {dish_data.name}\n"
@@ -188,11 +245,35 @@ async def generate_user_dish_recommendation(message: types.Message):
     )
     user_id = message.from_user.id
     uc: RecommendationUseCase = container.resolve(RecommendationUseCase)
+    draft_message: types.Message | None = None
+    last_edit_at = 0.0
+
+    async def show_draft(draft: DishRecommendationDraft):
+        """Показывает название и КБЖУ, как только они пришли, не дожидаясь рецепта"""
+        nonlocal draft_message, last_edit_at
+        loop_time = asyncio.get_running_loop().time()
+        is_complete = None not in draft.model_dump().values()
+        if draft_message and not is_complete and loop_time - last_edit_at < RECOMMENDATION_DRAFT_EDIT_INTERVAL_SEC:
+            return
+        text = format_dish_composition(draft) + "\n\n📝 Рецепт готовится..."
+        try:
+            if draft_message:
+                await draft_message.edit_text(text, parse_mode="Markdown")
+            else:
+                draft_message = await message.answer(text, parse_mode="Markdown")
+            last_edit_at = loop_time
+        except TelegramAPIError as e:
+            logging.warning(f"Не удалось обновить черновик рекомендации: {e}")
+
     try:
-        recommendation = await uc.generate_recommendation(user_id=user_id)
+        recommendation = await uc.generate_recommendation(user_id=user_id, on_draft=show_draft)
+        await commit_changes()
     except MaxRetryError:
         await message.answer("Техническая ошибка. Попробуйте еще раз позднее.")
         return
+    except ServiceUnavailableError:
+        await message.answer(SERVICE_UNAVAILABLE_TEXT)
+        return
     except UserNutritionNotSetError:
         await message.bot.delete_message(chat_id=message.chat.id, message_id=processing_message.message_id)
         await message.answer(
@@ -202,16 +283,10 @@ async def generate_user_dish_recommendation(message: types.Message):
             parse_mode="Markdown",
         )
         return
-    servings_count = recommendation.servings_count
-    await message.answer(
-        f"**Блюдо**: {recommendation.name}\n\n"
-        f"**Состав**:\n"
-        f"• Белки: {(recommendation.protein / servings_count):.1f} г\n"
-        f"• Жиры: {(recommendation.fat / servings_count):.1f} г\n"
-        f"• Углеводы: {(recommendation.carbohydrates / servings_count):.1f} г\n"
-        f"• Калории: {(recommendation.calories / servings_count):.1f} ккал\n",
-        parse_mode="Markdown",
-    )
+    if draft_message:
+        await draft_message.edit_text(format_dish_composition(recommendation), parse_mode="Markdown")
+    else:
+        await message.answer(format_dish_composition(recommendation), parse_mode="Markdown")
     await message.answer(
         f"📝 **Рецепт на кол-во блюд - {recommendation.servings_count}**:\n{recommendation.receipt}\n\n"
         "Приятного аппетита! 😋",
@@ -219,6 +294,24 @@ async def generate_user_dish_recommendation(message: types.Message):
     )
 
 
+def format_dish_composition(dish: DishRecommendation | DishRecommendationDraft) -> str:
+    """КБЖУ на одну порцию. Ещё не полученные из потока значения показываются многоточием"""
+
+    def per_serving(value: Decimal | None, unit: str) -> str:
+        if value is None or not dish.servings_count:
+            return "..."
+        return f"{(value / dish.servings_count):.1f} {unit}"
+
+    return (
+        f"**Блюдо**: {dish.name or '...'}\n\n"
+        f"**Состав**:\n"
+        f"• Белки: {per_serving(dish.protein, 'г')}\n"
+        f"• Жиры: {per_serving(dish.fat, 'г')}\n"
+        f"• Углеводы: {per_serving(dish.carbohydrates, 'г')}\n"
+        f"• Калории: {per_serving(dish.calories, 'ккал')}\n"
+    )
+
+
 @router.message(F.text.lower() == "цель")
 async def handle_goal(message: types.Message):
     user_id = message.from_user.id
@@ -324,6 +417,7 @@ async def process_goal(message: types.Message, state: FSMContext):
         )
         uc: UsersUseCase = container.resolve(UsersUseCase)
         await uc.set_nutrition_goal(user_id=user_id, goal_data=goal_data)
+        await commit_changes()
         await message.answer("Цель обновлена!", reply_markup=user_kb)
         await state.clear()
     except ValueError as e:
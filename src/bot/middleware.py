@@ -5,25 +5,36 @@ from aiogram.types import TelegramObject, User
 
 from config import settings
 from dependencies import container
+from repositories import UnitOfWork, handler_scope
 from usecases import UsersUseCase
 from usecases.schemas import UserSchema
 
 
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """Одна сессия БД и один коммит на апдейт: все вызовы репозитория внутри хендлера делят транзакцию"""
+
+    async def __call__(self, handler: Callable, event: TelegramObject, data: dict):
+        unit_of_work: UnitOfWork = container.resolve(UnitOfWork)
+        handler_object = data.get("handler")
+        with handler_scope(handler_object.callback.__name__ if handler_object else type(event).__name__):
+            async with unit_of_work.begin():
+                return await handler(event, data)
+
+
 class SaveUserMiddleware(BaseMiddleware):
     async def __call__(self, handler: Callable, event: TelegramObject, data: dict):
         user: User = data["event_from_user"]
         users_uc: UsersUseCase = container.resolve(UsersUseCase)
 
-        if user.id in {u.telegram_id for u in await users_uc.get_users()}:
-            return await handler(event, data)
-
         user_to_save = UserSchema(
             telegram_id=user.id,
             username=user.username,
             first_name=user.first_name,
             last_name=user.last_name,
         )
-        await users_uc.save_user(user_to_save)
+        if not await users_uc.register_user_if_new(user_to_save):
+            return await handler(event, data)
+
         await event.bot.send_message(user_to_save.telegram_id, text=self._get_new_user_intro_message())
 
         if user.id != settings.ADMIN_ID:
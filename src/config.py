@@ -1,4 +1,5 @@
 import datetime
+from typing import Literal
 from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
@@ -22,6 +23,60 @@ class DBConfig(BaseSettings):
 class GigachatConfig(BaseSettings):
     GIGACHAT_API_KEY: str = ""
     GIGACHAT_SCOPE: str = "GIGACHAT_API_PERS"
+    GIGACHAT_MAX_CONNECTIONS: int = 20
+    GIGACHAT_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    GIGACHAT_KEEPALIVE_EXPIRY_SEC: float = 60
+    GIGACHAT_TIMEOUT_SEC: float = 5
+    GIGACHAT_HTTP2: bool = True
+    GIGACHAT_TOKEN_REFRESH_MARGIN_SEC: float = 60
+    GIGACHAT_MAX_CONCURRENT_REQUESTS: int = 5
+    GIGACHAT_RATE_LIMIT_PER_SEC: float = 2
+    GIGACHAT_RATE_LIMIT_BURST: int = 5
+    GIGACHAT_RETRY_MAX_ATTEMPTS: int = 3
+    GIGACHAT_RETRY_BASE_DELAY_SEC: float = 0.5
+    GIGACHAT_RETRY_MAX_DELAY_SEC: float = 4
+    GIGACHAT_REQUEST_DEADLINE_SEC: float = 30
+    GIGACHAT_BREAKER_FAILURE_THRESHOLD: int = 5
+    GIGACHAT_BREAKER_RECOVERY_TIMEOUT_SEC: float = 30
+    GIGACHAT_BREAKER_HALF_OPEN_MAX_CALLS: int = 1
+    # single — фото распознаётся одним мультимодальным запросом, two_step — сначала список еды, затем КБЖУ
+    GIGACHAT_PHOTO_RECOGNITION_MODE: Literal["single", "two_step"] = "single"
+    # То же для расшифровок голосовых: single — один запрос на извлечение еды и КБЖУ
+    GIGACHAT_AUDIO_RECOGNITION_MODE: Literal["single", "two_step"] = "single"
+    GIGACHAT_STREAMING_ENABLED: bool = True
+
+
+class CacheConfig(BaseSettings):
+    DISH_TEXT_CACHE_SIZE: int = 10_000
+    DISH_TEXT_CACHE_TTL_SEC: float = 7 * 24 * 60 * 60
+    DISH_TEXT_CACHE_DB_ENABLED: bool = False
+    DISH_IMAGE_CACHE_SIZE: int = 5_000
+    DISH_IMAGE_CACHE_TTL_SEC: float = 24 * 60 * 60
+    RECOMMENDATION_POOL_ENABLED: bool = True
+    RECOMMENDATION_POOL_SIZE: int = 2
+    RECOMMENDATION_POOL_MAX_AGE_SEC: float = 6 * 60 * 60
+    RECOMMENDATION_POOL_ACTIVE_USER_TTL_SEC: float = 3 * 24 * 60 * 60
+    RECOMMENDATION_POOL_REFRESH_INTERVAL_SEC: float = 60
+    RECOMMENDATION_CACHE_ENABLED: bool = True
+    RECOMMENDATION_CACHE_SIZE: int = 2_000
+    RECOMMENDATION_CACHE_TTL_SEC: float = 7 * 24 * 60 * 60
+    RECOMMENDATION_CACHE_CALORIES_BUCKET: int = 50
+    RECOMMENDATION_CACHE_MACROS_BUCKET: int = 5
+    RECOMMENDATION_CACHE_VARIANTS_PER_KEY: int = 5
+    RECOMMENDATION_CACHE_RECENT_DAYS: int = 14
+
+
+class AudioConfig(BaseSettings):
+    AUDIO_MAX_CONCURRENCY: int = 2
+    AUDIO_MAX_QUEUE_SIZE: int = 20
+    AUDIO_EXECUTOR_WORKERS: int = 2
+    AUDIO_FFMPEG_TIMEOUT_SEC: float = 30
+
+
+class SpeechConfig(BaseSettings):
+    SPEECH_BACKEND: Literal["google", "vosk"] = "google"
+    SPEECH_LANGUAGE: str = "ru-RU"
+    SPEECH_VOSK_MODEL_PATH: str = "models/vosk-model-small-ru-0.22"
 
 
 class Settings(BaseSettings):
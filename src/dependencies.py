@@ -1,19 +1,35 @@
 from punq import Container
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
-from config import DBConfig, GigachatConfig
-from repositories import DBRepository, GigachatClient
+from config import AudioConfig, CacheConfig, DBConfig, GigachatConfig, SpeechConfig
+from repositories import (
+    AIRequestScheduler,
+    CircuitBreaker,
+    DBRepository,
+    GigachatClient,
+    GigachatTokenCache,
+    UnitOfWork,
+    create_gigachat_http_client,
+    create_speech_to_text,
+    instrument_engine,
+    is_service_failure,
+)
 from usecases import (
     DishRecognitionUseCase,
     RecommendationUseCase,
     StatisticsUseCase,
     UsersUseCase,
 )
-from usecases.interfaces import AIClientInterface, DBRepositoryInterface
+from usecases.audio import AudioProcessor
+from usecases.caches import DishImageCache, DishTextCache, KnownUsersCache, RecommendationCache, RecommendationPool
+from usecases.interfaces import AIClientInterface, DBRepositoryInterface, SpeechToTextInterface
 
 container = Container()
 db_config = DBConfig()
 gigachat_config = GigachatConfig()
+cache_config = CacheConfig()
+audio_config = AudioConfig()
+speech_config = SpeechConfig()
 
 
 engine = create_async_engine(
@@ -23,10 +39,75 @@ engine = create_async_engine(
     max_overflow=20,
     pool_pre_ping=True,
 )
+instrument_engine(engine)
 
 session_factory = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-container.register(AIClientInterface, factory=GigachatClient, config=gigachat_config)
+gigachat_http_client = create_gigachat_http_client(gigachat_config)
+gigachat_token_cache = GigachatTokenCache(config=gigachat_config, http_client=gigachat_http_client)
+ai_request_scheduler = AIRequestScheduler(
+    max_concurrency=gigachat_config.GIGACHAT_MAX_CONCURRENT_REQUESTS,
+    rate_per_sec=gigachat_config.GIGACHAT_RATE_LIMIT_PER_SEC,
+    burst=gigachat_config.GIGACHAT_RATE_LIMIT_BURST,
+)
+gigachat_circuit_breaker = CircuitBreaker(
+    failure_threshold=gigachat_config.GIGACHAT_BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout_sec=gigachat_config.GIGACHAT_BREAKER_RECOVERY_TIMEOUT_SEC,
+    half_open_max_calls=gigachat_config.GIGACHAT_BREAKER_HALF_OPEN_MAX_CALLS,
+    is_failure=is_service_failure,
+)
+audio_processor = AudioProcessor(
+    max_concurrency=audio_config.AUDIO_MAX_CONCURRENCY,
+    max_queue_size=audio_config.AUDIO_MAX_QUEUE_SIZE,
+    executor_workers=audio_config.AUDIO_EXECUTOR_WORKERS,
+    ffmpeg_timeout_sec=audio_config.AUDIO_FFMPEG_TIMEOUT_SEC,
+)
+speech_to_text = create_speech_to_text(speech_config)
+
+container.register(KnownUsersCache, instance=KnownUsersCache())
+container.register(
+    DishTextCache,
+    instance=DishTextCache(
+        max_size=cache_config.DISH_TEXT_CACHE_SIZE,
+        ttl_sec=cache_config.DISH_TEXT_CACHE_TTL_SEC,
+        is_db_enabled=cache_config.DISH_TEXT_CACHE_DB_ENABLED,
+    ),
+)
+container.register(
+    DishImageCache,
+    instance=DishImageCache(max_size=cache_config.DISH_IMAGE_CACHE_SIZE, ttl_sec=cache_config.DISH_IMAGE_CACHE_TTL_SEC),
+)
+container.register(
+    RecommendationPool,
+    instance=RecommendationPool(
+        size=cache_config.RECOMMENDATION_POOL_SIZE if cache_config.RECOMMENDATION_POOL_ENABLED else 0,
+        max_age_sec=cache_config.RECOMMENDATION_POOL_MAX_AGE_SEC,
+        active_user_ttl_sec=cache_config.RECOMMENDATION_POOL_ACTIVE_USER_TTL_SEC,
+    ),
+)
+container.register(
+    RecommendationCache,
+    instance=RecommendationCache(
+        max_size=cache_config.RECOMMENDATION_CACHE_SIZE if cache_config.RECOMMENDATION_CACHE_ENABLED else 0,
+        ttl_sec=cache_config.RECOMMENDATION_CACHE_TTL_SEC,
+        calories_bucket=cache_config.RECOMMENDATION_CACHE_CALORIES_BUCKET,
+        macros_bucket=cache_config.RECOMMENDATION_CACHE_MACROS_BUCKET,
+        variants_per_key=cache_config.RECOMMENDATION_CACHE_VARIANTS_PER_KEY,
+        recent_days=cache_config.RECOMMENDATION_CACHE_RECENT_DAYS,
+    ),
+)
+container.register(AudioProcessor, instance=audio_processor)
+container.register(SpeechToTextInterface, instance=speech_to_text)
+container.register(
+    AIClientInterface,
+    factory=GigachatClient,
+    config=gigachat_config,
+    http_client=gigachat_http_client,
+    token_cache=gigachat_token_cache,
+    scheduler=ai_request_scheduler,
+    circuit_breaker=gigachat_circuit_breaker,
+)
+container.register(UnitOfWork, instance=UnitOfWork(session_factory=session_factory))
 container.register(DBRepositoryInterface, factory=DBRepository, session_factory=session_factory)
 container.register(DBRepository, factory=DBRepository, session_factory=session_factory)
 container.register(UsersUseCase, factory=UsersUseCase)
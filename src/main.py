@@ -3,12 +3,16 @@ import logging
 
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters.command import Command
+from aiogram.types import BufferedInputFile
 
 from bot.api import router
 from bot.auth import validate_admin
 from bot.keyboards import admin_kb, user_kb
-from bot.middleware import SaveUserMiddleware
+from bot.middleware import SaveUserMiddleware, UnitOfWorkMiddleware
 from config import settings
+from dependencies import audio_processor, cache_config, container, engine, gigachat_http_client, speech_to_text
+from metrics import registry
+from usecases import RecommendationUseCase, UsersUseCase
 from usecases.errors import ForbiddenError
 
 logging.basicConfig(level=logging.INFO)
@@ -32,12 +36,41 @@ async def cmd_start(message: types.Message):
         )
 
 
+@dp.message(Command("metrics"))
+async def cmd_metrics(message: types.Message):
+    try:
+        validate_admin(message.from_user.id)
+    except ForbiddenError:
+        return
+    await message.answer_document(BufferedInputFile(registry.render().encode(), filename="metrics.txt"))
+
+
 async def main():
     await bot.delete_webhook(drop_pending_updates=True)
+    await container.resolve(UsersUseCase).warm_up_known_users()
+    await audio_processor.run_blocking(speech_to_text.warm_up)
+    # Регистрация пользователя коммитится отдельно до UnitOfWork, чтобы KnownUsersCache не разошёлся с БД
+    # при откате транзакции хендлера. Для известного пользователя она не обращается к БД
     dp.message.middleware(SaveUserMiddleware())
     dp.callback_query.middleware(SaveUserMiddleware())
+    dp.message.middleware(UnitOfWorkMiddleware())
+    dp.callback_query.middleware(UnitOfWorkMiddleware())
     dp.include_routers(router)
-    await dp.start_polling(bot)
+    recommendation_pool_worker = None
+    if cache_config.RECOMMENDATION_POOL_ENABLED:
+        recommendation_pool_worker = asyncio.create_task(
+            container.resolve(RecommendationUseCase).run_recommendation_pool_worker(
+                refresh_interval_sec=cache_config.RECOMMENDATION_POOL_REFRESH_INTERVAL_SEC
+            )
+        )
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if recommendation_pool_worker is not None:
+            recommendation_pool_worker.cancel()
+        await gigachat_http_client.aclose()
+        audio_processor.shutdown()
+        await engine.dispose()
 
 
 if __name__ == "__main__":
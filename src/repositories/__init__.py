@@ -1,2 +1,10 @@
-from .db import DBRepository
-from .gigachat import GigachatClient
+from .db import DBRepository, UnitOfWork, handler_scope, instrument_engine
+from .gigachat import (
+    AIRequestScheduler,
+    CircuitBreaker,
+    GigachatClient,
+    GigachatTokenCache,
+    create_gigachat_http_client,
+    is_service_failure,
+)
+from .speech import GoogleSpeechToText, VoskSpeechToText, create_speech_to_text
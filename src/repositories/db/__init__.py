@@ -1 +1,3 @@
 from .db_repository import DBRepository
+from .instrumentation import handler_scope, instrument_engine
+from .unit_of_work import UnitOfWork
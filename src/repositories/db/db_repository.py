@@ -1,66 +1,190 @@
 import datetime
+from collections.abc import Callable
 from typing import Self
 
-from sqlalchemy import and_, select, update
+from sqlalchemy import CTE, BigInteger, Select, and_, exists, func, literal, select, true, union_all, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import joinedload
 
+from config import current_moscow_datetime, settings
 from usecases.interfaces import DBRepositoryInterface
-from usecases.schemas import DishData, DishSchema, NutritionData, NutritionSchema, UserSchema
+from usecases.schemas import (
+    CountedStatisticsSchema,
+    DailyNutritionSchema,
+    DishData,
+    DishSchema,
+    NutritionData,
+    NutritionSchema,
+    RecommendationDataSchema,
+    UserSchema,
+)
+from usecases.utils import MAX_DISH_NAME_LENGTH, normalize_dish_text, nutrition_hash
 
-from .models import Dish, Nutrition, RecommendationHistory, Statistics, User
+from .instrumentation import instrument_repository
+from .models import Dish, DishTextCache, Nutrition, RecommendationHistory, Statistics, User
+from .unit_of_work import (
+    add_on_commit,
+    commit_session,
+    current_session,
+    release_if_read_only,
+    rollback_session,
+    writes,
+)
 
 
+@instrument_repository
 class DBRepository(DBRepositoryInterface):
     def __init__(self, session_factory: async_sessionmaker) -> None:
         self._session_maker = session_factory
 
     async def __aenter__(self) -> Self:
-        self._session = self._session_maker()
+        self._session = current_session.get()
+        self._owns_session = self._session is None
+        if self._owns_session:
+            self._session = self._session_maker()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if not self._owns_session:
+            # Сессией владеет UnitOfWork: коммит и закрытие в конце его блока
+            if exc_type is None:
+                await release_if_read_only(self._session)
+            return
         try:
-            await self._session.commit()
+            await commit_session(self._session)
         except Exception as e:
-            await self._session.rollback()
+            await rollback_session(self._session)
             raise e
         finally:
             await self._session.close()
 
-    async def create_user(self, user: UserSchema) -> None:
-        self._session.add(User(**user.model_dump()))
-        await self._session.flush()
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        add_on_commit(self._session, callback)
+
+    @writes
+    async def create_user(self, user: UserSchema) -> bool:
+        query = (
+            insert(User)
+            .values(**user.model_dump())
+            .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            .returning(User.telegram_id)
+        )
+        return await self._session.scalar(query) is not None
 
     async def get_users(self) -> list[UserSchema]:
         return [UserSchema.model_validate(u) for u in (await self._session.scalars(select(User))).all()]
 
+    async def get_user_ids(self) -> list[int]:
+        return list((await self._session.scalars(select(User.telegram_id))).all())
+
+    @staticmethod
+    def _canonical_dish(dish_data: DishData) -> CTE:
+        """CTE с записью каталога для dish_data: существующей или вставленной вместе с её nutrition.
+
+        Колонки: id, name, protein, fat, carbohydrates, calories. Пусто, если такую же запись параллельно
+        вставила другая транзакция: её не видно в снимке запроса, а ON CONFLICT её пропускает
+        """
+        nutrition = dish_data.model_dump(exclude={"name"})
+        normalized_name = normalize_dish_text(dish_data.name)[:MAX_DISH_NAME_LENGTH]
+        dish_nutrition_hash = nutrition_hash(**nutrition)
+
+        existing = (
+            select(Dish.id, Dish.name, Nutrition.protein, Nutrition.fat, Nutrition.carbohydrates, Nutrition.calories)
+            .join(Nutrition, Dish.nutrition_id == Nutrition.id)
+            .filter(Dish.normalized_name == normalized_name)
+            .filter(Dish.nutrition_hash == dish_nutrition_hash)
+            .cte("existing_dish")
+        )
+        nutrition_row = (
+            insert(Nutrition)
+            .from_select(
+                list(nutrition),
+                select(*(literal(value, Nutrition.__table__.c[name].type) for name, value in nutrition.items())).where(
+                    ~exists(select(existing.c.id))
+                ),
+            )
+            .returning(Nutrition.id, Nutrition.protein, Nutrition.fat, Nutrition.carbohydrates, Nutrition.calories)
+            .cte("nutrition_row")
+        )
+        dish_row = (
+            insert(Dish)
+            .from_select(
+                ["name", "normalized_name", "nutrition_hash", "nutrition_id"],
+                select(
+                    literal(dish_data.name[:MAX_DISH_NAME_LENGTH], Dish.name.type),
+                    literal(normalized_name, Dish.normalized_name.type),
+                    literal(dish_nutrition_hash, Dish.nutrition_hash.type),
+                    nutrition_row.c.id,
+                ),
+            )
+            .on_conflict_do_nothing(index_elements=[Dish.normalized_name, Dish.nutrition_hash])
+            .returning(Dish.id, Dish.name, Dish.nutrition_id)
+            .cte("dish_row")
+        )
+        inserted = select(
+            dish_row.c.id,
+            dish_row.c.name,
+            nutrition_row.c.protein,
+            nutrition_row.c.fat,
+            nutrition_row.c.carbohydrates,
+            nutrition_row.c.calories,
+        ).join(nutrition_row, dish_row.c.nutrition_id == nutrition_row.c.id)
+        return union_all(inserted, select(existing)).cte("canonical_dish")
+
+    async def _execute_canonical(self, query: Select) -> DishSchema:
+        dish = (await self._session.execute(query)).one_or_none()
+        if dish is None:
+            # Запись каталога только что вставила другая транзакция: теперь она видна и повтор её найдёт
+            dish = (await self._session.execute(query)).one()
+        return DishSchema.model_validate(dish._mapping)
+
+    @writes
     async def save_dish(self, dish_data: DishData) -> DishSchema:
-        nutrition = Nutrition(**dish_data.model_dump(exclude={"name"}))
-        self._session.add(nutrition)
-        await self._session.flush()
+        """Возвращает запись каталога для блюда, создавая её при первом появлении"""
+        return await self._execute_canonical(select(self._canonical_dish(dish_data)))
 
-        dish = Dish(name=dish_data.name, nutrition_id=nutrition.id)
-        self._session.add(dish)
-        await self._session.flush()
+    @writes
+    async def log_meal(self, user_id: int, dish_data: DishData) -> DishSchema:
+        """Находит или создаёт блюдо в каталоге и добавляет запись статистики одним запросом"""
+        dish = self._canonical_dish(dish_data)
+        statistics_row = (
+            insert(Statistics)
+            .from_select(
+                ["user_id", "dish_id", "like", "created_at"],
+                select(literal(user_id, BigInteger), dish.c.id, literal(True), literal(current_moscow_datetime())),
+            )
+            .returning(Statistics.id)
+            .cte("statistics_row")
+        )
+        return await self._execute_canonical(select(dish).add_cte(statistics_row))
 
-        return DishSchema(
-            id=dish.id,
-            name=dish.name,
-            protein=dish.nutrition.protein,
-            fat=dish.nutrition.fat,
-            carbohydrates=dish.nutrition.carbohydrates,
-            calories=dish.nutrition.calories,
+    async def get_dish_by_text(self, normalized_text: str, created_after: datetime.datetime) -> DishSchema | None:
+        query = (
+            select(Dish.id, Dish.name, Nutrition.protein, Nutrition.fat, Nutrition.carbohydrates, Nutrition.calories)
+            .select_from(DishTextCache)
+            .join(Dish, DishTextCache.dish_id == Dish.id)
+            .join(Nutrition, Dish.nutrition_id == Nutrition.id)
+            .filter(DishTextCache.normalized_text == normalized_text)
+            .filter(DishTextCache.created_at >= created_after)
         )
+        dish = (await self._session.execute(query)).one_or_none()
+        return DishSchema.model_validate(dish._mapping) if dish else None
 
-    async def add_statistics_obj(self, user_id: int, dish_id: int, like: bool = True) -> None:
-        statistics_obj = Statistics(
-            user_id=user_id,
-            dish_id=dish_id,
-            like=like,
+    @writes
+    async def save_dish_text(self, normalized_text: str, dish_id: int) -> None:
+        query = insert(DishTextCache).values(
+            normalized_text=normalized_text, dish_id=dish_id, created_at=current_moscow_datetime()
         )
-        self._session.add(statistics_obj)
-        await self._session.flush()
+        query = query.on_conflict_do_update(
+            index_elements=[DishTextCache.normalized_text],
+            set_={"dish_id": query.excluded.dish_id, "created_at": query.excluded.created_at},
+        )
+        await self._session.execute(query)
+
+    @writes
+    async def add_statistics_obj(self, user_id: int, dish_id: int, like: bool = True) -> None:
+        await self._session.execute(insert(Statistics).values(user_id=user_id, dish_id=dish_id, like=like))
 
     async def get_user_dishes_history_by_period(
         self, user_id: int, valid_from_dt: datetime.datetime, valid_to_dt: datetime.datetime
@@ -85,6 +209,54 @@ class DBRepository(DBRepositoryInterface):
             for stat in statistics
         ]
 
+    async def get_nutrition_totals(
+        self, user_id: int, valid_from_dt: datetime.datetime, valid_to_dt: datetime.datetime
+    ) -> CountedStatisticsSchema:
+        query = (
+            select(
+                func.coalesce(func.sum(Nutrition.protein), 0).label("protein"),
+                func.coalesce(func.sum(Nutrition.fat), 0).label("fat"),
+                func.coalesce(func.sum(Nutrition.carbohydrates), 0).label("carbohydrates"),
+                func.coalesce(func.sum(Nutrition.calories), 0).label("calories"),
+            )
+            .select_from(Statistics)
+            .join(Dish, Statistics.dish_id == Dish.id)
+            .join(Nutrition, Dish.nutrition_id == Nutrition.id)
+            .filter(Statistics.user_id == user_id)
+            .filter(Statistics.created_at >= valid_from_dt)
+            .filter(Statistics.created_at <= valid_to_dt)
+        )
+        totals = (await self._session.execute(query)).one()
+        return CountedStatisticsSchema(
+            user_id=user_id, valid_from_dt=valid_from_dt, valid_to_dt=valid_to_dt, **totals._mapping
+        )
+
+    async def get_user_daily_nutrition_totals(
+        self, user_id: int, valid_from_dt: datetime.datetime, valid_to_dt: datetime.datetime
+    ) -> list[DailyNutritionSchema]:
+        # Часовой пояс подставляется литералом, иначе выражения в SELECT и GROUP BY получат разные параметры
+        moscow_tz = literal(str(settings.moscow_tz), literal_execute=True)
+        day = func.date(func.timezone(moscow_tz, Statistics.created_at)).label("date")
+        query = (
+            select(
+                day,
+                func.sum(Nutrition.protein).label("protein"),
+                func.sum(Nutrition.fat).label("fat"),
+                func.sum(Nutrition.carbohydrates).label("carbohydrates"),
+                func.sum(Nutrition.calories).label("calories"),
+            )
+            .select_from(Statistics)
+            .join(Dish, Statistics.dish_id == Dish.id)
+            .join(Nutrition, Dish.nutrition_id == Nutrition.id)
+            .filter(Statistics.user_id == user_id)
+            .filter(Statistics.created_at >= valid_from_dt)
+            .filter(Statistics.created_at <= valid_to_dt)
+            .group_by(day)
+            .order_by(day)
+        )
+        rows = await self._session.execute(query)
+        return [DailyNutritionSchema.model_validate(row._mapping) for row in rows]
+
     async def get_user_dishes_history(self, user_id: int, limit: int = 50) -> list[str]:
         query = (
             select(Statistics).filter(Statistics.user_id == user_id).limit(limit).options(joinedload(Statistics.dish))
@@ -93,17 +265,99 @@ class DBRepository(DBRepositoryInterface):
         statistics = await self._session.scalars(query)
         return [stat.dish.name for stat in statistics]
 
+    async def get_recommendation_data(
+        self, user_id: int, valid_from_dt: datetime.datetime, valid_to_dt: datetime.datetime, history_limit: int = 50
+    ) -> RecommendationDataSchema | None:
+        """Цель, итоги за период и последние блюда одним запросом из трёх CTE. None, если цель не задана"""
+        goal = (
+            select(
+                Nutrition.id.label("goal_id"),
+                Nutrition.protein.label("goal_protein"),
+                Nutrition.fat.label("goal_fat"),
+                Nutrition.carbohydrates.label("goal_carbohydrates"),
+                Nutrition.calories.label("goal_calories"),
+            )
+            .select_from(User)
+            .join(Nutrition, User.nutrition_goal_id == Nutrition.id)
+            .filter(User.telegram_id == user_id)
+            .cte("goal")
+        )
+        totals = (
+            select(
+                func.coalesce(func.sum(Nutrition.protein), 0).label("protein"),
+                func.coalesce(func.sum(Nutrition.fat), 0).label("fat"),
+                func.coalesce(func.sum(Nutrition.carbohydrates), 0).label("carbohydrates"),
+                func.coalesce(func.sum(Nutrition.calories), 0).label("calories"),
+            )
+            .select_from(Statistics)
+            .join(Dish, Statistics.dish_id == Dish.id)
+            .join(Nutrition, Dish.nutrition_id == Nutrition.id)
+            .filter(Statistics.user_id == user_id)
+            .filter(Statistics.created_at >= valid_from_dt)
+            .filter(Statistics.created_at <= valid_to_dt)
+            .cte("totals")
+        )
+        recent_dishes = (
+            select(Dish.name)
+            .select_from(Statistics)
+            .join(Dish, Statistics.dish_id == Dish.id)
+            .filter(Statistics.user_id == user_id)
+            .order_by(Statistics.created_at.desc())
+            .limit(history_limit)
+            .subquery()
+        )
+        history = select(func.array_agg(recent_dishes.c.name).label("dish_names")).cte("history")
+        query = select(goal, totals, history).select_from(goal).join(totals, true()).join(history, true())
+
+        row = (await self._session.execute(query)).one_or_none()
+        if row is None:
+            return None
+        return RecommendationDataSchema(
+            nutrition_goal=NutritionSchema(
+                id=row.goal_id,
+                protein=row.goal_protein,
+                fat=row.goal_fat,
+                carbohydrates=row.goal_carbohydrates,
+                calories=row.goal_calories,
+            ),
+            totals=CountedStatisticsSchema(
+                user_id=user_id,
+                protein=row.protein,
+                fat=row.fat,
+                carbohydrates=row.carbohydrates,
+                calories=row.calories,
+                valid_from_dt=valid_from_dt,
+                valid_to_dt=valid_to_dt,
+            ),
+            dishes_history=row.dish_names or [],
+        )
+
+    async def get_recommended_dish_names(self, user_id: int, created_after: datetime.datetime) -> list[str]:
+        query = (
+            select(Dish.name)
+            .select_from(RecommendationHistory)
+            .join(Dish, RecommendationHistory.dish_id == Dish.id)
+            .filter(RecommendationHistory.user_id == user_id)
+            .filter(RecommendationHistory.created_at >= created_after)
+        )
+        return list(await self._session.scalars(query))
+
+    @writes
     async def save_user_recommendation(self, user_id: int, dish_id: int) -> None:
-        user_recommendation = RecommendationHistory(user_id=user_id, dish_id=dish_id)
-        self._session.add(user_recommendation)
-        await self._session.flush()
+        await self._session.execute(insert(RecommendationHistory).values(user_id=user_id, dish_id=dish_id))
 
+    @writes
     async def save_nutrition(self, nutrition_data: NutritionData) -> NutritionSchema:
-        nutrition = Nutrition(**nutrition_data.model_dump())
-        self._session.add(nutrition)
-        await self._session.flush()
-        return NutritionSchema.model_validate(nutrition)
+        # Схема собирается из RETURNING: значения уже округлены до точности колонок, повторный SELECT не нужен
+        query = (
+            insert(Nutrition)
+            .values(**nutrition_data.model_dump())
+            .returning(Nutrition.id, Nutrition.protein, Nutrition.fat, Nutrition.carbohydrates, Nutrition.calories)
+        )
+        nutrition = (await self._session.execute(query)).one()
+        return NutritionSchema.model_validate(nutrition._mapping)
 
+    @writes
     async def set_user_nutrition_goal(self, user_id: int, nutrition_goal_id: int) -> None:
         query = update(User).where(and_(User.telegram_id == user_id)).values({"nutrition_goal_id": nutrition_goal_id})
         await self._session.execute(query)
@@ -0,0 +1,98 @@
+import inspect
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from metrics import Counter, Histogram
+
+db_statements = Counter(
+    "db_statements_total", "SQL-запросы по методу репозитория и Telegram-хендлеру", labelnames=["method", "handler"]
+)
+db_statement_duration_seconds = Histogram(
+    "db_statement_duration_seconds", "Время выполнения SQL-запроса по методу репозитория", labelnames=["method"]
+)
+db_rows = Counter("db_rows_total", "Строки, которые вернули или изменили SQL-запросы", labelnames=["method"])
+db_statements_per_call = Histogram(
+    "db_statements_per_call",
+    "Число SQL-запросов на один вызов метода репозитория",
+    labelnames=["method"],
+    buckets=(0, 1, 2, 3, 5, 10, 25),
+)
+
+NO_LABEL = "-"
+_STARTED_AT = "_topfit_statement_started_at"
+
+
+class RepositoryCall:
+    """Вызов метода репозитория и число SQL-запросов, которые он выполнил"""
+
+    __slots__ = ("method", "statements")
+
+    def __init__(self, method: str) -> None:
+        self.method = method
+        self.statements = 0
+
+
+current_repository_call: ContextVar[RepositoryCall | None] = ContextVar("current_repository_call", default=None)
+current_handler: ContextVar[str] = ContextVar("current_handler", default=NO_LABEL)
+
+
+def instrument_repository(cls: type) -> type:
+    """Помечает SQL-запросы публичных async-методов класса именем метода"""
+    for name, func in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.iscoroutinefunction(func):
+            setattr(cls, name, _track_repository_call(func))
+    return cls
+
+
+def _track_repository_call(func):
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        call = RepositoryCall(func.__name__)
+        token = current_repository_call.set(call)
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            current_repository_call.reset(token)
+            db_statements_per_call.observe(call.statements, method=call.method)
+
+    return wrapper
+
+
+@contextmanager
+def handler_scope(handler: str) -> Iterator[None]:
+    """Помечает SQL-запросы внутри блока именем Telegram-хендлера"""
+    token = current_handler.set(handler)
+    try:
+        yield
+    finally:
+        current_handler.reset(token)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Подключает к движку сбор метрик по каждому SQL-запросу"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(_conn, _cursor, _statement, _parameters, context, _executemany) -> None:
+    # Время старта живёт на контексте выполнения: упавший запрос ничего не оставляет на соединении
+    setattr(context, _STARTED_AT, time.perf_counter())
+
+
+def _after_cursor_execute(_conn, cursor, _statement, _parameters, context, _executemany) -> None:
+    elapsed = time.perf_counter() - getattr(context, _STARTED_AT)
+    call = current_repository_call.get()
+    method = call.method if call else NO_LABEL
+    if call:
+        call.statements += 1
+
+    db_statements.inc(method=method, handler=current_handler.get())
+    db_statement_duration_seconds.observe(elapsed, method=method)
+    if cursor.rowcount > 0:
+        db_rows.inc(cursor.rowcount, method=method)
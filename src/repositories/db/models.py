@@ -1,10 +1,11 @@
 import datetime
 from decimal import Decimal
 
-from sqlalchemy import TIMESTAMP, BigInteger, ForeignKey, Numeric, String
+from sqlalchemy import TIMESTAMP, BigInteger, ForeignKey, Index, Numeric, String, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 from config import current_moscow_datetime
+from usecases.utils import MAX_DISH_NAME_LENGTH, MAX_NORMALIZED_TEXT_LENGTH
 
 
 class Base(DeclarativeBase): ...
@@ -27,10 +28,17 @@ class Nutrition(Base):
 
 
 class Dish(Base):
+    """Каталог блюд: одна запись на нормализованное название и КБЖУ, их разделяют все пользователи"""
+
     __tablename__ = "dishes"
+    __table_args__ = (
+        UniqueConstraint("normalized_name", "nutrition_hash", name="uq_dishes_normalized_name_nutrition"),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    name: Mapped[str] = mapped_column(String(MAX_DISH_NAME_LENGTH), nullable=False)
+    normalized_name: Mapped[str] = mapped_column(String(MAX_DISH_NAME_LENGTH), nullable=False)
+    nutrition_hash: Mapped[str] = mapped_column(String(64), nullable=False)
     nutrition_id: Mapped[int] = mapped_column(ForeignKey("nutrition.id"))
 
     nutrition: Mapped["Nutrition"] = relationship()
@@ -39,8 +47,22 @@ class Dish(Base):
         return f"<Dish name={self.name} calories={self.nutrition.calories}>"
 
 
+class DishTextCache(Base):
+    __tablename__ = "dish_text_cache"
+
+    normalized_text: Mapped[str] = mapped_column(String(MAX_NORMALIZED_TEXT_LENGTH), primary_key=True)
+    dish_id: Mapped[int] = mapped_column(ForeignKey("dishes.id"))
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP(timezone=True), default=current_moscow_datetime)
+
+    dish: Mapped["Dish"] = relationship()
+
+    def __repr__(self) -> str:
+        return f"<DishTextCache text={self.normalized_text} dish_id={self.dish_id}>"
+
+
 class RecommendationHistory(Base):
     __tablename__ = "recommendation_history"
+    __table_args__ = (Index("ix_recommendation_history_user_id_created_at", "user_id", "created_at"),)
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.telegram_id"))
@@ -60,6 +82,7 @@ class RecommendationHistory(Base):
 
 class Statistics(Base):
     __tablename__ = "statistics"
+    __table_args__ = (Index("ix_statistics_user_id_created_at", "user_id", "created_at"),)
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.telegram_id"))
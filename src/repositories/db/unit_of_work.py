@@ -0,0 +1,91 @@
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+current_session: ContextVar[AsyncSession | None] = ContextVar("current_session", default=None)
+
+_HAS_WRITES = "has_writes"
+_ON_COMMIT = "on_commit"
+
+
+class UnitOfWork:
+    """Одна сессия и одна транзакция БД на логическую операцию, например на Telegram-апдейт.
+
+    Пока открыт begin(), DBRepository работает в общей сессии и не коммитит сам: коммит один, в конце блока
+    или раньше через commit(), при исключении — откат. Вложенный begin() переиспользует уже открытую сессию
+    """
+
+    def __init__(self, session_factory: async_sessionmaker) -> None:
+        self._session_factory = session_factory
+
+    @asynccontextmanager
+    async def begin(self) -> AsyncIterator[AsyncSession]:
+        if (session := current_session.get()) is not None:
+            yield session
+            return
+
+        session = self._session_factory()
+        token = current_session.set(session)
+        try:
+            yield session
+            await commit_session(session)
+        except BaseException:
+            await rollback_session(session)
+            raise
+        finally:
+            current_session.reset(token)
+            await session.close()
+
+    async def commit(self) -> None:
+        """Досрочно коммитит транзакцию открытого begin(), например сразу после записей хендлера.
+
+        Соединение возвращается в пул, пока хендлер отвечает пользователю; следующие запросы откроют новую
+        транзакцию в той же сессии. Вне begin() ничего не делает
+        """
+        if (session := current_session.get()) is not None:
+            await commit_session(session)
+
+
+def writes(method):
+    """Помечает метод репозитория как пишущий: транзакцию с его запросами release_if_read_only не откатит.
+
+    Запись отмечается явно, по тексту запроса её не определить: SELECT с INSERT в CTE тоже пишет
+    """
+
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        self._session.info[_HAS_WRITES] = True
+        return await method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def add_on_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    session.info.setdefault(_ON_COMMIT, []).append(callback)
+
+
+async def commit_session(session: AsyncSession) -> None:
+    """Коммитит транзакцию и вызывает колбэки, отложенные до её коммита"""
+    await session.commit()
+    session.info.pop(_HAS_WRITES, None)
+    for callback in session.info.pop(_ON_COMMIT, []):
+        callback()
+
+
+async def rollback_session(session: AsyncSession) -> None:
+    """Откатывает транзакцию: колбэки на коммит отбрасываются, их записи не сохранились"""
+    session.info.pop(_HAS_WRITES, None)
+    session.info.pop(_ON_COMMIT, None)
+    await session.rollback()
+
+
+async def release_if_read_only(session: AsyncSession) -> None:
+    """Возвращает соединение в пул, если транзакция только читала: не вызывался ни один метод с @writes.
+
+    Иначе соединение простаивало бы в открытой транзакции всё время запроса к GigaChat между чтением и записью
+    """
+    if session.in_transaction() and not session.info.get(_HAS_WRITES) and not session.info.get(_ON_COMMIT):
+        await session.rollback()
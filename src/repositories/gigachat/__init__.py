@@ -1 +1,5 @@
-from .gigachat_client import GigachatClient
+from .auth import GigachatTokenCache
+from .circuit_breaker import CircuitBreaker, CircuitState
+from .gigachat_client import GigachatClient, create_gigachat_http_client
+from .retry import ErrorKind, RetryPolicy, is_service_failure, retry
+from .scheduler import AIRequestScheduler, RequestPriority
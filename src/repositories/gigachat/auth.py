@@ -0,0 +1,56 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+from config import GigachatConfig
+
+
+class GigachatTokenCache:
+    """Процессный кэш OAuth-токена GigaChat, обновляемый незадолго до истечения срока действия"""
+
+    def __init__(self, config: GigachatConfig, http_client: httpx.AsyncClient) -> None:
+        self._config = config
+        self._http_client = http_client
+        self._access_token: str | None = None
+        self._expires_at: float = 0
+        self._refresh_lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        refresh_at = self._expires_at - self._config.GIGACHAT_TOKEN_REFRESH_MARGIN_SEC
+        return bool(self._access_token) and time.time() < refresh_at
+
+    async def get_token(self) -> str:
+        if self._is_fresh():
+            return self._access_token
+
+        # Одновременные запросы ждут одного обновления токена, а не идут в OAuth каждый сам
+        async with self._refresh_lock:
+            if not self._is_fresh():
+                await self._update_access_token()
+        return self._access_token
+
+    def invalidate(self, access_token: str) -> None:
+        """Сбрасывает токен, отклонённый API, если его ещё не успели обновить"""
+        if self._access_token == access_token:
+            self._access_token = None
+
+    async def _update_access_token(self) -> None:
+        url = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Accept": "application/json",
+            "RqUID": "b5cd3af6-8c96-457e-b807-641226b0040e",
+            "Authorization": f"Basic {self._config.GIGACHAT_API_KEY}",
+        }
+        payload = {"scope": "GIGACHAT_API_PERS"}
+        response = await self._http_client.post(url, headers=headers, data=payload)
+
+        response.raise_for_status()
+
+        token_data = response.json()
+        self._access_token = token_data["access_token"]
+        # expires_at приходит в миллисекундах unix time
+        self._expires_at = token_data["expires_at"] / 1000
+        logging.info("Токен GigaChat обновлён")
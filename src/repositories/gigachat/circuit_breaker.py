@@ -0,0 +1,103 @@
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+from metrics import Counter, Gauge
+from usecases.errors import ServiceUnavailableError
+
+gigachat_circuit_state = Gauge(
+    "gigachat_circuit_state", "Состояние предохранителя GigaChat: 0 closed, 1 half-open, 2 open"
+)
+gigachat_circuit_transitions = Counter(
+    "gigachat_circuit_transitions_total", "Переходы предохранителя GigaChat по новому состоянию", labelnames=["state"]
+)
+gigachat_circuit_rejected = Counter(
+    "gigachat_circuit_rejected_total", "Запросы к GigaChat, отклонённые открытым предохранителем"
+)
+
+
+class CircuitState(IntEnum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker:
+    """Предохранитель: после failure_threshold сбоев подряд перестаёт пускать запросы на recovery_timeout_sec.
+
+    Затем пропускает до half_open_max_calls пробных запросов: успех закрывает предохранитель, сбой снова открывает.
+    Сбоем считается исключение, для которого is_failure возвращает True, остальные исключения нейтральны
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        recovery_timeout_sec: float,
+        half_open_max_calls: int,
+        is_failure: Callable[[BaseException], bool],
+    ) -> None:
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout_sec = recovery_timeout_sec
+        self._half_open_max_calls = half_open_max_calls
+        self._is_failure = is_failure
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state is CircuitState.OPEN and time.monotonic() - self._opened_at >= self._recovery_timeout_sec:
+            self._set_state(CircuitState.HALF_OPEN)
+        return self._state
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        self._acquire()
+        try:
+            yield
+        except BaseException as e:
+            if isinstance(e, Exception) and self._is_failure(e):
+                self._on_failure()
+            else:
+                self._release()
+            raise
+        self._on_success()
+
+    def _acquire(self) -> None:
+        state = self.state
+        if state is CircuitState.OPEN or (
+            state is CircuitState.HALF_OPEN and self._half_open_calls >= self._half_open_max_calls
+        ):
+            gigachat_circuit_rejected.inc()
+            raise ServiceUnavailableError("GigaChat временно недоступен")
+        if state is CircuitState.HALF_OPEN:
+            self._half_open_calls += 1
+
+    def _release(self) -> None:
+        if self._state is CircuitState.HALF_OPEN and self._half_open_calls:
+            self._half_open_calls -= 1
+
+    def _on_success(self) -> None:
+        self._release()
+        self._failures = 0
+        if self._state is not CircuitState.CLOSED:
+            self._set_state(CircuitState.CLOSED)
+
+    def _on_failure(self) -> None:
+        self._release()
+        self._failures += 1
+        if self._state is CircuitState.HALF_OPEN or (
+            self._state is CircuitState.CLOSED and self._failures >= self._failure_threshold
+        ):
+            self._opened_at = time.monotonic()
+            self._set_state(CircuitState.OPEN)
+
+    def _set_state(self, state: CircuitState) -> None:
+        logging.warning(f"Предохранитель GigaChat: {self._state.name} -> {state.name}")
+        self._state = state
+        self._half_open_calls = 0
+        gigachat_circuit_state.set(state)
+        gigachat_circuit_transitions.inc(state=state.name)
@@ -1,105 +1,141 @@
-import asyncio
+import hashlib
 import json
 import logging
 import re
 import ssl
-from functools import wraps
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
 from typing import Self
 
 import httpx
 
 from config import GigachatConfig
-from usecases.errors import MaxRetryError, NotFoundError
+from usecases.errors import NotFoundError, ServiceUnavailableError
 from usecases.interfaces import AIClientInterface
-from usecases.schemas import DishData, DishRecommendation
+from usecases.schemas import DishData, DishRecommendation, DishRecommendationDraft
 
+from .auth import GigachatTokenCache
+from .circuit_breaker import CircuitBreaker, CircuitState
+from .retry import RETRYABLE_STATUS_CODES, RetryPolicy, retry
+from .scheduler import AIRequestScheduler, RequestPriority
+from .streaming import extract_completed_fields, iter_sse_content
 
-def retry(retry_num: int = 3, retry_sleep_sec: int = 2):
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            for attempt in range(retry_num):
-                try:
-                    if attempt != 0:
-                        kwargs["additional_message"] = (
-                            "Ответ должен быть в формате JSON и в формате ответа из примера. "
-                            "Пожалуйста, отправь данные снова, но строго в формате JSON."
-                        )
-                    return await func(*args, **kwargs)
-                except json.JSONDecodeError as e:
-                    logging.error(f"Ошибка в ответе от AI client (JSON Decode Error): {e}")
-                except Exception as e:
-                    logging.error(f"Ошибка в ответе от AI client: {e}")
+COMPLETIONS_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+RECOMMENDATION_DRAFT_FIELDS = {
+    "name": str,
+    "servings_count": int,
+    "protein": float,
+    "fat": float,
+    "carbohydrates": float,
+    "calories": float,
+}
 
-                if attempt < retry_num - 1:
-                    logging.error(f"Попытка {attempt + 1} не удалась.")
-                    await asyncio.sleep(retry_sleep_sec)
-                else:
-                    logging.error(f"Не удалось выполнить {func.__name__} после {retry_num} попыток")
-                    raise MaxRetryError(f"Превышено максимальное количество попыток для {func.__name__}")
-            return None
 
-        return wrapper
+def create_gigachat_http_client(config: GigachatConfig) -> httpx.AsyncClient:
+    """Создаёт общий на процесс HTTP-клиент с пулом keep-alive соединений к API GigaChat"""
+    # Создание SSL-контекста для отключения проверки сертификатов
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
 
-    return decorator
+    return httpx.AsyncClient(
+        verify=ssl_context,
+        http2=config.GIGACHAT_HTTP2,
+        timeout=config.GIGACHAT_TIMEOUT_SEC,
+        limits=httpx.Limits(
+            max_connections=config.GIGACHAT_MAX_CONNECTIONS,
+            max_keepalive_connections=config.GIGACHAT_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.GIGACHAT_KEEPALIVE_EXPIRY_SEC,
+        ),
+    )
 
 
 class GigachatClient(AIClientInterface):
-    def __init__(self, config: GigachatConfig) -> None:
+    def __init__(
+        self,
+        config: GigachatConfig,
+        http_client: httpx.AsyncClient,
+        token_cache: GigachatTokenCache,
+        scheduler: AIRequestScheduler,
+        circuit_breaker: CircuitBreaker,
+    ) -> None:
         self._config = config
-        self._access_token: str | None = None
-
-        # Создание SSL-контекста для отключения проверки сертификатов
-        self._ssl_context = ssl.create_default_context()
-        self._ssl_context.check_hostname = False
-        self._ssl_context.verify_mode = ssl.CERT_NONE
+        self._http_client = http_client
+        self._token_cache = token_cache
+        self._scheduler = scheduler
+        self._circuit_breaker = circuit_breaker
+        self._uploaded_file_ids: dict[str, str] = {}
+        self._retry_policy = RetryPolicy(
+            max_attempts=config.GIGACHAT_RETRY_MAX_ATTEMPTS,
+            base_delay_sec=config.GIGACHAT_RETRY_BASE_DELAY_SEC,
+            max_delay_sec=config.GIGACHAT_RETRY_MAX_DELAY_SEC,
+            deadline_sec=config.GIGACHAT_REQUEST_DEADLINE_SEC,
+        )
 
     async def __aenter__(self) -> Self:
-        await self._update_access_token()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None: ...
 
-    async def _update_access_token(self) -> None:
-        url = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Accept": "application/json",
-            "RqUID": "b5cd3af6-8c96-457e-b807-641226b0040e",
-            "Authorization": f"Basic {self._config.GIGACHAT_API_KEY}",
-        }
-        payload = {"scope": "GIGACHAT_API_PERS"}
-        async with httpx.AsyncClient(verify=self._ssl_context) as client:
-            response = await client.post(url, headers=headers, data=payload)
+    async def _authorized_post(
+        self, url: str, headers: dict, priority: RequestPriority, user_id: int | None, **kwargs
+    ) -> httpx.Response:
+        """POST с Bearer-токеном из кэша через предохранитель и планировщик запросов.
 
-        response.raise_for_status()
+        На 401 токен сбрасывается и запрос повторяется один раз. 429 и 5xx пробрасываются как HTTPStatusError,
+        чтобы их учёл предохранитель
+        """
+        for attempt in range(2):
+            async with self._circuit_breaker.guard():
+                access_token = await self._token_cache.get_token()
+                async with self._scheduler.slot(priority=priority, user_id=user_id):
+                    response = await self._http_client.post(
+                        url, headers={**headers, "Authorization": f"Bearer {access_token}"}, **kwargs
+                    )
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+            if response.status_code != httpx.codes.UNAUTHORIZED or attempt:
+                return response
+            logging.warning("GigaChat отклонил токен, выполняется повторная авторизация")
+            self._token_cache.invalidate(access_token)
+        return response
 
-        self._access_token = response.json()["access_token"]
+    @asynccontextmanager
+    async def _authorized_stream(
+        self, url: str, headers: dict, priority: RequestPriority, user_id: int | None, **kwargs
+    ) -> AsyncIterator[httpx.Response]:
+        """Потоковый аналог _authorized_post: слот планировщика занят, пока читается ответ"""
+        for attempt in range(2):
+            async with self._circuit_breaker.guard():
+                access_token = await self._token_cache.get_token()
+                async with (
+                    self._scheduler.slot(priority=priority, user_id=user_id),
+                    self._http_client.stream(
+                        "POST", url, headers={**headers, "Authorization": f"Bearer {access_token}"}, **kwargs
+                    ) as response,
+                ):
+                    if response.status_code != httpx.codes.UNAUTHORIZED or attempt:
+                        if response.status_code in RETRYABLE_STATUS_CODES:
+                            response.raise_for_status()
+                        yield response
+                        return
+            logging.warning("GigaChat отклонил токен, выполняется повторная авторизация")
+            self._token_cache.invalidate(access_token)
 
-    async def _send_request(
-        self,
+    @staticmethod
+    def _build_chat_payload(
         system_message: str,
         user_message: str | None = None,
         attachments: list[str] | None = None,
         additional_message: str = "",
-    ) -> str:
-        """Отправляет запрос в GigaChat API для генерации ответа."""
-        if not self._access_token:
-            await self._update_access_token()
-
+        stream: bool = False,
+    ) -> dict:
         system_message = f"{additional_message}\n {system_message}"
-        url = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-            "Authorization": f"Bearer {self._access_token}",
-        }
-
         logging.info(f"system_message={system_message}\n user_message={user_message}")
         payload = {
             "model": "GigaChat",
             "messages": [{"role": "system", "content": system_message}],
-            "stream": False,
+            "stream": stream,
             "update_interval": 0,
         }
 
@@ -111,31 +147,70 @@ class GigachatClient(AIClientInterface):
             payload["model"] = "GigaChat-Max"
         else:
             payload["model"] = "GigaChat"
+        return payload
 
-        async with httpx.AsyncClient(verify=self._ssl_context) as client:
-            response = await client.post(url, headers=headers, content=json.dumps(payload))
+    async def _send_request(
+        self,
+        system_message: str,
+        user_message: str | None = None,
+        attachments: list[str] | None = None,
+        additional_message: str = "",
+        user_id: int | None = None,
+        priority: RequestPriority = RequestPriority.TEXT,
+    ) -> str:
+        """Отправляет запрос в GigaChat API для генерации ответа."""
+        payload = self._build_chat_payload(system_message, user_message, attachments, additional_message)
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+        response = await self._authorized_post(
+            COMPLETIONS_URL, headers=headers, priority=priority, user_id=user_id, content=json.dumps(payload)
+        )
         response.raise_for_status()
         return response.json()["choices"][0]["message"]["content"]
 
-    async def _upload_gigachat_file(self, file_bytes: bytes, mime_type: str) -> str | None:
-        url = "https://gigachat.devices.sberbank.ru/api/v1/files"
+    async def _stream_request(
+        self,
+        system_message: str,
+        user_message: str | None = None,
+        additional_message: str = "",
+        user_id: int | None = None,
+        priority: RequestPriority = RequestPriority.TEXT,
+    ) -> AsyncIterator[str]:
+        """Потоковый запрос в GigaChat API: отдаёт фрагменты ответа по мере генерации"""
+        payload = self._build_chat_payload(
+            system_message, user_message, additional_message=additional_message, stream=True
+        )
         headers = {
-            "Authorization": f"Bearer {self._access_token}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
         }
+        async with self._authorized_stream(
+            COMPLETIONS_URL, headers=headers, priority=priority, user_id=user_id, content=json.dumps(payload)
+        ) as response:
+            response.raise_for_status()
+            async for content in iter_sse_content(response):
+                yield content
+
+    async def _upload_gigachat_file(
+        self,
+        file_bytes: bytes,
+        mime_type: str,
+        user_id: int | None = None,
+        priority: RequestPriority = RequestPriority.PHOTO,
+    ) -> str:
+        """Загружает файл в GigaChat. Ошибки HTTP пробрасываются, чтобы их классифицировала политика повторов"""
+        url = "https://gigachat.devices.sberbank.ru/api/v1/files"
         files = {"file": ("file_name", file_bytes, mime_type)}
         data = {"purpose": "general"}
-        try:
-            async with httpx.AsyncClient(verify=self._ssl_context) as client:
-                response = await client.post(url, headers=headers, files=files, data=data)
-
-            if response.status_code == 200:
-                return response.json()["id"]
-            else:
-                logging.error(f"Ошибка: {response.status_code}, {response.text}")
-                return None
-        except httpx.RequestError as e:
-            logging.error(f"Ошибка при отправке запроса: {e}")
-            return None
+        response = await self._authorized_post(
+            url, headers={}, priority=priority, user_id=user_id, files=files, data=data
+        )
+        if response.status_code != httpx.codes.OK:
+            logging.error(f"Ошибка загрузки файла: {response.status_code}, {response.text}")
+        response.raise_for_status()
+        return response.json()["id"]
 
     @staticmethod
     async def _parse_json_response(message_response: str) -> dict:
@@ -149,8 +224,10 @@ class GigachatClient(AIClientInterface):
                 raise
         raise NotFoundError("Not found json in AI client response")
 
-    @retry()
-    async def recognize_meal_by_text(self, message: str, additional_message: str = "") -> DishData:
+    @retry
+    async def recognize_meal_by_text(
+        self, message: str, additional_message: str = "", user_id: int | None = None
+    ) -> DishData:
         system_message = """
         Посчитай КБЖУ блюда.  
         Верни ответ строго в формате JSON, содержащий следующие поля:
@@ -165,19 +242,55 @@ class GigachatClient(AIClientInterface):
         ```
         """
         response = await self._send_request(
-            system_message=system_message, user_message=message, additional_message=additional_message
+            system_message=system_message,
+            user_message=message,
+            additional_message=additional_message,
+            user_id=user_id,
+            priority=RequestPriority.TEXT,
         )
         response_parsed = await self._parse_json_response(response)
         return DishData(**response_parsed)
 
-    @retry()
+    async def _get_uploaded_file_id(self, file_bytes: bytes, mime_type: str, user_id: int | None = None) -> str:
+        """Загружает файл один раз на клиент: повторы @retry переиспользуют уже полученный file_id"""
+        file_key = hashlib.sha256(file_bytes).hexdigest()
+        if file_key not in self._uploaded_file_ids:
+            self._uploaded_file_ids[file_key] = await self._upload_gigachat_file(
+                file_bytes=file_bytes, mime_type=mime_type, user_id=user_id
+            )
+        return self._uploaded_file_ids[file_key]
+
+    @retry
     async def recognize_meal_by_image(
-        self, dish_bytes: bytes, mime_type: str, additional_message: str = ""
+        self, dish_bytes: bytes, mime_type: str, additional_message: str = "", user_id: int | None = None
     ) -> DishData:
-        file_id = await self._upload_gigachat_file(file_bytes=dish_bytes, mime_type=mime_type)
-        if not file_id:
-            logging.error("Ошибка загрузки файла")
-            raise
+        file_id = await self._get_uploaded_file_id(file_bytes=dish_bytes, mime_type=mime_type, user_id=user_id)
+
+        if self._config.GIGACHAT_PHOTO_RECOGNITION_MODE == "single":
+            # Один мультимодальный запрос: распознавание еды на фото и расчёт КБЖУ сразу
+            system_message = """
+            Найди на фото ВСЮ ЕДУ и посчитай КБЖУ.  
+            Верни ответ строго в формате JSON, содержащий следующие поля:
+            - "name" (str) - название 
+            - "calories" (float) — калории  
+            - "protein" (float) — белки  
+            - "fat" (float) — жиры  
+            - "carbohydrates" (float) — углеводы  
+            Формат ответа:
+            ```json
+            {"name": "Ризотто с курицей, "protein": 25.3, "fat": 10.2, "carbohydrates": 150.2, "calories": 400.1}
+            ```
+            """
+            response = await self._send_request(
+                system_message=system_message,
+                user_message="Посчитай КБЖУ еды на фото.",
+                attachments=[file_id],
+                additional_message=additional_message,
+                user_id=user_id,
+                priority=RequestPriority.PHOTO,
+            )
+            response_parsed = await self._parse_json_response(response)
+            return DishData(**response_parsed)
 
         system_message = """
         Найди в тексте ВСЮ ЕДУ и посчитай КБЖУ.  
@@ -198,16 +311,24 @@ class GigachatClient(AIClientInterface):
             user_message=find_meal_text,
             attachments=[file_id],
             additional_message=additional_message,
+            user_id=user_id,
+            priority=RequestPriority.PHOTO,
         )
         logging.info(f"Meal recognized: {photo_recognize_text}")
         response = await self._send_request(
-            system_message=system_message, user_message=photo_recognize_text, additional_message=additional_message
+            system_message=system_message,
+            user_message=photo_recognize_text,
+            additional_message=additional_message,
+            user_id=user_id,
+            priority=RequestPriority.PHOTO,
         )
         response_parsed = await self._parse_json_response(response)
         return DishData(**response_parsed)
 
-    @retry()
-    async def recognize_meal_by_text_from_audio(self, message: str, additional_message: str = "") -> DishData:
+    @retry
+    async def recognize_meal_by_text_from_audio(
+        self, message: str, additional_message: str = "", user_id: int | None = None
+    ) -> DishData:
         system_message = """
         Найди в тексте ВСЮ ЕДУ и посчитай КБЖУ.  
         Верни ответ строго в формате JSON, содержащий следующие поля:
@@ -221,20 +342,51 @@ class GigachatClient(AIClientInterface):
         {"name": "Ризотто с курицей, "protein": 25.3, "fat": 10.2, "carbohydrates": 150.2, "calories": 400.1}
         ```
         """
-        find_meal_text = "Что из еды представлено, просто перечисли."
         logging.info(f"Audio text: {message}")
+        if self._config.GIGACHAT_AUDIO_RECOGNITION_MODE == "single":
+            # Расшифровка сразу уходит на расчёт КБЖУ: модель сама отбрасывает слова, не относящиеся к еде
+            transcript_note = "Текст — расшифровка голосового сообщения, слова не про еду игнорируй."
+            response = await self._send_request(
+                system_message=f"{transcript_note}\n{system_message}",
+                user_message=message,
+                additional_message=additional_message,
+                user_id=user_id,
+                priority=RequestPriority.TEXT,
+            )
+            response_parsed = await self._parse_json_response(response)
+            return DishData(**response_parsed)
+
+        find_meal_text = "Что из еды представлено, просто перечисли."
         meal_recognize_text = await self._send_request(
-            system_message=find_meal_text, user_message=message, additional_message=additional_message
+            system_message=find_meal_text,
+            user_message=message,
+            additional_message=additional_message,
+            user_id=user_id,
+            priority=RequestPriority.TEXT,
         )
         logging.info(f"Meal recognized: {meal_recognize_text}")
         response = await self._send_request(
-            system_message=system_message, user_message=meal_recognize_text, additional_message=additional_message
+            system_message=system_message,
+            user_message=meal_recognize_text,
+            additional_message=additional_message,
+            user_id=user_id,
+            priority=RequestPriority.TEXT,
         )
         response_parsed = await self._parse_json_response(response)
         return DishData(**response_parsed)
 
-    @retry()
-    async def get_dish_recommendation(self, message: str, additional_message: str = "") -> DishRecommendation:
+    @retry
+    async def get_dish_recommendation(
+        self,
+        message: str,
+        additional_message: str = "",
+        user_id: int | None = None,
+        on_draft: Callable[[DishRecommendationDraft], Awaitable[None]] | None = None,
+        background: bool = False,
+    ) -> DishRecommendation:
+        if background and self._circuit_breaker.state is not CircuitState.CLOSED:
+            # Пробные запросы полуоткрытого предохранителя остаются пользователям
+            raise ServiceUnavailableError("GigaChat восстанавливается после сбоев, фоновые запросы отложены")
         system_message = """Тебе нужно предложить пользователю блюдо на основании следующих данных:
             1. Блюдо не должно сильно превышать желаемый КБЖУ (из role user content) на 1 порцию.  
             2. Список прошлых блюд пользователя с их КБЖУ — эта информация поможет понять вкусовые предпочтения 
@@ -246,30 +398,46 @@ class GigachatClient(AIClientInterface):
              но не больше.
             - Рецепт может быть на несколько порций, в ответе КБЖУ возвращай суммарно для всех порций.
 
-            Формат ответа: строго в формате JSON, содержащий:
+            Формат ответа: строго в формате JSON с полями в этом порядке:
+            - "name" (str) — название блюда
+            - "servings_count" (int) - кол-во порций, которые получаются в рецепте
             - "protein" (float) — белки во всех порциях
             - "fat" (float) — жиры во всех порциях
             - "carbohydrates" (float) — углеводы во всех порциях
             - "calories" (float) — калории во всех порциях
-            - "name" (str) — название блюда
             - "receipt" (str) — рецепт (включая ингредиенты с граммировками и приготовлением)
-            - "servings_count" (int) - кол-во порций, которые получаются в рецепте
 
             Пример ответа:
             ```json
             {
+                "name": "Ризотто с цыпленком",
+                "servings_count": 5,
                 "protein": 25.0,
                 "fat": 10.0,
                 "carbohydrates": 50.0,
                 "calories": 400.0,
-                "name": "Ризотто с цыпленком",
                 "receipt": "Рецепт (включая ингредиенты с граммировками и приготовлением)"
-                "servings_count": 5
             }
             ```
             """
-        response = await self._send_request(
-            system_message=system_message, user_message=message, additional_message=additional_message
-        )
+        request_kwargs = {
+            "system_message": system_message,
+            "user_message": message,
+            "additional_message": additional_message,
+            "user_id": user_id,
+            "priority": RequestPriority.BACKGROUND if background else RequestPriority.RECOMMENDATION,
+        }
+        if on_draft and self._config.GIGACHAT_STREAMING_ENABLED:
+            # Название и КБЖУ идут в ответе первыми и показываются пользователю, пока генерируется рецепт
+            response, draft = "", {}
+            async for content in self._stream_request(**request_kwargs):
+                response += content
+                if len(draft) < len(RECOMMENDATION_DRAFT_FIELDS):
+                    fields = extract_completed_fields(response, RECOMMENDATION_DRAFT_FIELDS)
+                    if fields != draft:
+                        draft = fields
+                        await on_draft(DishRecommendationDraft(**draft))
+        else:
+            response = await self._send_request(**request_kwargs)
         response_parsed = await self._parse_json_response(response)
         return DishRecommendation(**response_parsed)
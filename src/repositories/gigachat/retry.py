@@ -0,0 +1,127 @@
+import asyncio
+import email.utils
+import json
+import logging
+import random
+import time
+from enum import StrEnum
+from functools import wraps
+
+import httpx
+import pydantic
+
+from metrics import Counter
+from usecases.errors import MaxRetryError, NotFoundError, ServiceUnavailableError
+
+gigachat_retries = Counter(
+    "gigachat_retries_total", "Повторные попытки запросов к GigaChat по типу ошибки", labelnames=["kind"]
+)
+
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+FORMAT_RETRY_MESSAGE = (
+    "Ответ должен быть в формате JSON и в формате ответа из примера. "
+    "Пожалуйста, отправь данные снова, но строго в формате JSON."
+)
+
+
+class ErrorKind(StrEnum):
+    TRANSPORT = "transport"  # сеть, таймауты, 429 и 5xx: повтор с экспоненциальной задержкой
+    FORMAT = "format"  # модель ответила не по формату: сразу переспрашиваем
+    FATAL = "fatal"  # остальные 4xx и ошибки в коде: повтор не поможет
+
+
+class RetryPolicy:
+    """Политика повторов запросов к GigaChat с общим дедлайном на вызов"""
+
+    def __init__(self, max_attempts: int, base_delay_sec: float, max_delay_sec: float, deadline_sec: float) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay_sec = base_delay_sec
+        self.max_delay_sec = max_delay_sec
+        self.deadline_sec = deadline_sec
+
+    @staticmethod
+    def classify(error: BaseException) -> ErrorKind:
+        if isinstance(error, httpx.HTTPStatusError):
+            if error.response.status_code in RETRYABLE_STATUS_CODES:
+                return ErrorKind.TRANSPORT
+            return ErrorKind.FATAL
+        if isinstance(error, httpx.TransportError | TimeoutError):
+            return ErrorKind.TRANSPORT
+        if isinstance(error, json.JSONDecodeError | NotFoundError | pydantic.ValidationError | KeyError | TypeError):
+            return ErrorKind.FORMAT
+        return ErrorKind.FATAL
+
+    def backoff_delay(self, attempt: int, error: BaseException) -> float:
+        """Full jitter от экспоненты попытки, но не меньше Retry-After из ответа сервера"""
+        delay = random.uniform(0, min(self.max_delay_sec, self.base_delay_sec * 2**attempt))
+        if isinstance(error, httpx.HTTPStatusError) and (retry_after := _parse_retry_after(error.response)):
+            delay = max(delay, retry_after)
+        return delay
+
+
+def is_service_failure(error: BaseException) -> bool:
+    """Сбой на стороне GigaChat, который учитывает предохранитель"""
+    return RetryPolicy.classify(error) is ErrorKind.TRANSPORT
+
+
+def _parse_retry_after(response: httpx.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry(func):
+    """Повторяет метод клиента по политике self._retry_policy.
+
+    Ошибки формата переспрашиваются сразу с уточнением в additional_message, транспортные ошибки — после
+    задержки, фатальные и превышение дедлайна завершают вызов MaxRetryError. ServiceUnavailableError от открытого
+    предохранителя пробрасывается сразу
+    """
+
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        policy: RetryPolicy = self._retry_policy
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + policy.deadline_sec
+
+        for attempt in range(policy.max_attempts):
+            try:
+                async with asyncio.timeout_at(deadline):
+                    return await func(self, *args, **kwargs)
+            except ServiceUnavailableError:
+                raise
+            except Exception as e:
+                error = e
+            logging.error(f"Ошибка в ответе от AI client ({func.__name__}, попытка {attempt + 1}): {error!r}")
+
+            if loop.time() >= deadline:
+                raise MaxRetryError(f"Истекло время ожидания ответа для {func.__name__}") from error
+
+            kind = policy.classify(error)
+            if kind is ErrorKind.FATAL:
+                raise MaxRetryError(f"Неисправимая ошибка при выполнении {func.__name__}") from error
+            if attempt == policy.max_attempts - 1:
+                break
+
+            gigachat_retries.inc(kind=kind)
+            if kind is ErrorKind.FORMAT:
+                kwargs["additional_message"] = FORMAT_RETRY_MESSAGE
+                continue
+
+            delay = policy.backoff_delay(attempt, error)
+            if loop.time() + delay >= deadline:
+                raise MaxRetryError(f"Не успеть повторить {func.__name__} до дедлайна") from error
+            await asyncio.sleep(delay)
+
+        logging.error(f"Не удалось выполнить {func.__name__} после {policy.max_attempts} попыток")
+        raise MaxRetryError(f"Превышено максимальное количество попыток для {func.__name__}") from error
+
+    return wrapper
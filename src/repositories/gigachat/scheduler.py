@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Hashable
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+from metrics import Gauge, Histogram
+
+gigachat_queue_depth = Gauge(
+    "gigachat_queue_depth", "Запросы к GigaChat, ожидающие в очереди планировщика", labelnames=["priority"]
+)
+gigachat_in_flight = Gauge("gigachat_in_flight", "Запросы к GigaChat, выполняющиеся прямо сейчас")
+gigachat_queue_wait_seconds = Histogram(
+    "gigachat_queue_wait_seconds", "Время ожидания запроса к GigaChat в очереди планировщика", labelnames=["priority"]
+)
+
+
+class RequestPriority(IntEnum):
+    """Полосы планировщика: чем меньше значение, тем раньше запрос получит слот"""
+
+    TEXT = 0
+    PHOTO = 1
+    RECOMMENDATION = 2
+    # Упреждающие запросы без ожидающего пользователя, например пополнение пула рекомендаций
+    BACKGROUND = 3
+
+
+class TokenBucket:
+    """Ограничение частоты: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def delay(self) -> float:
+        """Через сколько секунд появится следующий токен"""
+        self._refill()
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+
+class AIRequestScheduler:
+    """Общий на процесс планировщик запросов к GigaChat.
+
+    Ограничивает число одновременных запросов и их частоту под квоту API. Ожидающие запросы разложены по полосам
+    приоритета, внутри полосы — по очередям пользователей, которые обслуживаются по кругу: один пользователь
+    с десятком сообщений подряд не задерживает остальных больше чем на один запрос
+    """
+
+    def __init__(self, max_concurrency: int, rate_per_sec: float, burst: int) -> None:
+        self._max_concurrency = max_concurrency
+        self._bucket = TokenBucket(rate=rate_per_sec, capacity=burst)
+        self._in_flight = 0
+        self._lanes: dict[RequestPriority, OrderedDict[Hashable, deque[asyncio.Future]]] = {
+            priority: OrderedDict() for priority in RequestPriority
+        }
+        self._refill_timer: asyncio.TimerHandle | None = None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def queue_depth(self, priority: RequestPriority | None = None) -> int:
+        priorities = RequestPriority if priority is None else (priority,)
+        return sum(len(queue) for p in priorities for queue in self._lanes[p].values())
+
+    @asynccontextmanager
+    async def slot(self, priority: RequestPriority, user_id: int | None = None) -> AsyncIterator[None]:
+        started_at = time.monotonic()
+        if not self.queue_depth() and self._in_flight < self._max_concurrency and self._bucket.try_take():
+            self._in_flight += 1
+        else:
+            await self._wait_in_queue(priority, user_id)
+        gigachat_queue_wait_seconds.observe(time.monotonic() - started_at, priority=priority.name)
+
+        gigachat_in_flight.inc()
+        try:
+            yield
+        finally:
+            gigachat_in_flight.dec()
+            self._in_flight -= 1
+            self._dispatch()
+
+    async def _wait_in_queue(self, priority: RequestPriority, user_id: int | None) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        lane = self._lanes[priority]
+        lane.setdefault(user_id, deque()).append(waiter)
+        gigachat_queue_depth.inc(priority=priority.name)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот уже выдан, но запрос отменили — возвращаем слот следующему
+                self._in_flight -= 1
+                self._dispatch()
+            else:
+                self._remove_waiter(priority, user_id, waiter)
+            raise
+
+    def _remove_waiter(self, priority: RequestPriority, user_id: int | None, waiter: asyncio.Future) -> None:
+        queue = self._lanes[priority].get(user_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        gigachat_queue_depth.dec(priority=priority.name)
+        if not queue:
+            del self._lanes[priority][user_id]
+
+    def _dispatch(self) -> None:
+        """Выдаёт свободные слоты ожидающим: старшая полоса первой, внутри полосы пользователи по кругу"""
+        while self._in_flight < self._max_concurrency:
+            priority = next((p for p in RequestPriority if self._lanes[p]), None)
+            if priority is None:
+                return
+
+            lane = self._lanes[priority]
+            user_id, queue = next(iter(lane.items()))
+            if queue[0].done():
+                # Ожидание отменено, а задача ещё не успела убрать себя из очереди
+                self._remove_waiter(priority, user_id, queue[0])
+                continue
+
+            if not self._bucket.try_take():
+                self._schedule_refill()
+                return
+
+            waiter = queue.popleft()
+            gigachat_queue_depth.dec(priority=priority.name)
+            if queue:
+                lane.move_to_end(user_id)
+            else:
+                del lane[user_id]
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _schedule_refill(self) -> None:
+        if self._refill_timer is not None:
+            return
+        self._refill_timer = asyncio.get_running_loop().call_later(self._bucket.delay(), self._on_refill)
+
+    def _on_refill(self) -> None:
+        self._refill_timer = None
+        self._dispatch()
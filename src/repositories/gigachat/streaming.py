@@ -0,0 +1,35 @@
+import json
+import re
+from collections.abc import AsyncIterator
+
+import httpx
+
+_NUMBER = r"-?\d+(?:\.\d+)?"
+_STRING = r'"(?:[^"\\]|\\.)*"'
+
+
+def extract_completed_fields(text: str, fields: dict[str, type]) -> dict:
+    """Достаёт из недописанного JSON поля, значения которых уже полностью получены.
+
+    Число считается полученным, когда после него пришёл разделитель, строка — когда пришла закрывающая кавычка:
+    так в черновик не попадёт "25" вместо "25.3"
+    """
+    completed = {}
+    for name, field_type in fields.items():
+        value_re = _STRING if field_type is str else _NUMBER
+        if match := re.search(rf'"{name}"\s*:\s*({value_re})\s*[,}}\n]', text):
+            completed[name] = json.loads(match.group(1))
+    return completed
+
+
+async def iter_sse_content(response: httpx.Response) -> AsyncIterator[str]:
+    """Текст из server-sent events потокового ответа chat/completions"""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line.removeprefix("data:").strip()
+        if data == "[DONE]":
+            return
+        choices = json.loads(data)["choices"]
+        if choices and (content := choices[0].get("delta", {}).get("content")):
+            yield content
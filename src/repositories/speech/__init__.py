@@ -0,0 +1,11 @@
+from config import SpeechConfig
+from usecases.interfaces import SpeechToTextInterface
+
+from .google_backend import GoogleSpeechToText
+from .vosk_backend import VoskSpeechToText
+
+
+def create_speech_to_text(config: SpeechConfig) -> SpeechToTextInterface:
+    if config.SPEECH_BACKEND == "vosk":
+        return VoskSpeechToText(model_path=config.SPEECH_VOSK_MODEL_PATH)
+    return GoogleSpeechToText(language=config.SPEECH_LANGUAGE)
@@ -0,0 +1,28 @@
+import logging
+
+import speech_recognition
+
+from usecases.audio import PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH
+from usecases.interfaces import SpeechToTextInterface
+
+
+class GoogleSpeechToText(SpeechToTextInterface):
+    """Удалённое распознавание через бесплатный Google Web Speech API"""
+
+    def __init__(self, language: str) -> None:
+        self._language = language
+
+    def warm_up(self) -> None:
+        return None
+
+    def transcribe(self, pcm_audio: bytes) -> str:
+        recognizer = speech_recognition.Recognizer()
+        audio = speech_recognition.AudioData(pcm_audio, sample_rate=PCM_SAMPLE_RATE, sample_width=PCM_SAMPLE_WIDTH)
+
+        try:
+            return recognizer.recognize_google(audio, language=self._language)
+        except speech_recognition.UnknownValueError:
+            return ""
+        except speech_recognition.RequestError as e:
+            logging.error(f"Ошибка Google Speech API: {e}")
+            return ""
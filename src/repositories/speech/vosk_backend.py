@@ -0,0 +1,47 @@
+import json
+import logging
+import threading
+
+from usecases.audio import PCM_SAMPLE_RATE, PCM_SAMPLE_WIDTH
+from usecases.interfaces import SpeechToTextInterface
+
+try:
+    import vosk
+except ImportError:  # vosk нужен только для локального распознавания (SPEECH_BACKEND=vosk)
+    vosk = None
+
+# Порция PCM, которую отдаём декодеру за раз: 0.25 сек аудио
+_FEED_SIZE = PCM_SAMPLE_RATE * PCM_SAMPLE_WIDTH // 4
+
+
+class VoskSpeechToText(SpeechToTextInterface):
+    """Локальное распознавание на CPU моделью Vosk. Модель загружается один раз на процесс"""
+
+    def __init__(self, model_path: str) -> None:
+        self._model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        with self._lock:
+            if self._model is not None:
+                return
+            if vosk is None:
+                raise RuntimeError("Для SPEECH_BACKEND=vosk установите пакет vosk")
+
+            vosk.SetLogLevel(-1)
+            self._model = vosk.Model(self._model_path)
+            logging.info(f"Модель Vosk загружена из {self._model_path}")
+
+    def transcribe(self, pcm_audio: bytes) -> str:
+        self.warm_up()
+        # Модель потокобезопасна, распознаватель — нет, поэтому он свой на каждое сообщение
+        recognizer = vosk.KaldiRecognizer(self._model, PCM_SAMPLE_RATE)
+
+        phrases = []
+        audio = memoryview(pcm_audio)
+        for offset in range(0, len(audio), _FEED_SIZE):
+            if recognizer.AcceptWaveform(bytes(audio[offset : offset + _FEED_SIZE])):
+                phrases.append(json.loads(recognizer.Result())["text"])
+        phrases.append(json.loads(recognizer.FinalResult())["text"])
+        return " ".join(phrase for phrase in phrases if phrase)
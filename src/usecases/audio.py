@@ -0,0 +1,115 @@
+import asyncio
+import contextlib
+import logging
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any
+
+from metrics import Gauge
+from usecases.errors import AudioQueueFullError, AudioToTextError
+
+audio_queue_depth = Gauge("audio_queue_depth", "Голосовые сообщения, ожидающие обработки")
+audio_in_progress = Gauge("audio_in_progress", "Голосовые сообщения в обработке")
+
+PCM_SAMPLE_RATE = 16_000
+PCM_SAMPLE_WIDTH = 2
+_PIPE_CHUNK_SIZE = 64 * 1024
+
+
+class AudioProcessor:
+    """Выполняет тяжёлые этапы обработки голосовых сообщений вне event loop с ограничением параллельности"""
+
+    def __init__(
+        self, max_concurrency: int, max_queue_size: int, executor_workers: int, ffmpeg_timeout_sec: float
+    ) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_queue_size = max_queue_size
+        self._waiting = 0
+        self._executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="audio")
+        self._ffmpeg_timeout_sec = ffmpeg_timeout_sec
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Очередь на обработку: сверх max_concurrency сообщения ждут, сверх max_queue_size — отклоняются"""
+        if self._waiting >= self._max_queue_size:
+            raise AudioQueueFullError
+
+        self._waiting += 1
+        audio_queue_depth.inc()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+            audio_queue_depth.dec()
+
+        audio_in_progress.inc()
+        try:
+            yield
+        finally:
+            audio_in_progress.dec()
+            self._semaphore.release()
+
+    async def run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def convert_ogg_to_pcm(self, chunks: AsyncIterable[bytes]) -> bytes:
+        """Потоково конвертирует OGG в PCM s16le 16 кГц моно с помощью ffmpeg.
+
+        Чанки скачиваемого файла сразу пишутся в stdin ffmpeg, весь файл целиком в памяти не собирается
+        """
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            *("-hide_banner", "-loglevel", "error", "-f", "ogg", "-i", "pipe:0"),
+            *("-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(PCM_SAMPLE_RATE), "pipe:1"),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, pcm, err = await asyncio.wait_for(
+                asyncio.gather(
+                    self._feed_stdin(process.stdin, chunks),
+                    self._read_stdout(process.stdout),
+                    process.stderr.read(),
+                ),
+                self._ffmpeg_timeout_sec,
+            )
+            await process.wait()
+        except TimeoutError:
+            logging.error("ffmpeg не успел сконвертировать аудио")
+            raise AudioToTextError from None
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+        if process.returncode != 0:
+            logging.error(f"Ошибка ffmpeg: {err.decode(errors='replace')}")
+            raise AudioToTextError
+
+        return pcm
+
+    @staticmethod
+    async def _feed_stdin(stdin: asyncio.StreamWriter, chunks: AsyncIterable[bytes]) -> None:
+        try:
+            async for chunk in chunks:
+                stdin.write(chunk)
+                await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg завершился раньше времени, причина будет в stderr и коде возврата
+            return
+        finally:
+            stdin.close()
+            with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+                await stdin.wait_closed()
+
+    @staticmethod
+    async def _read_stdout(stdout: asyncio.StreamReader) -> bytes:
+        parts = []
+        while chunk := await stdout.read(_PIPE_CHUNK_SIZE):
+            parts.append(chunk)
+        return b"".join(parts)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
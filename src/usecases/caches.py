@@ -0,0 +1,220 @@
+import asyncio
+import contextlib
+import hashlib
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Hashable, Iterable
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from typing import Any
+
+
+class KnownUsersCache:
+    """Процессный кэш telegram_id пользователей, которые уже сохранены в БД"""
+
+    def __init__(self) -> None:
+        self._user_ids: set[int] = set()
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._lock_waiters: dict[int, int] = {}
+        self.is_warmed_up = False
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._user_ids
+
+    def __len__(self) -> int:
+        return len(self._user_ids)
+
+    def add(self, user_id: int) -> None:
+        self._user_ids.add(user_id)
+
+    def warm_up(self, user_ids: Iterable[int]) -> None:
+        self._user_ids.update(user_ids)
+        self.is_warmed_up = True
+
+    @asynccontextmanager
+    async def lock(self, user_id: int) -> AsyncIterator[None]:
+        """Сериализует регистрацию одного и того же пользователя из параллельных апдейтов"""
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        self._lock_waiters[user_id] = self._lock_waiters.get(user_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_waiters[user_id] -= 1
+            if not self._lock_waiters[user_id]:
+                del self._lock_waiters[user_id]
+                del self._locks[user_id]
+
+
+class TTLCache:
+    """LRU-кэш с ограничением по числу записей и времени жизни записи"""
+
+    def __init__(self, max_size: int, ttl_sec: float) -> None:
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self._items: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable) -> Any | None:
+        item = self._items.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._items[key]
+            return None
+
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._items[key] = (time.monotonic() + self.ttl_sec, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+class DishTextCache(TTLCache):
+    """Кэш распознанных по тексту блюд: нормализованный текст -> сохранённое блюдо"""
+
+    def __init__(self, max_size: int, ttl_sec: float, is_db_enabled: bool = False) -> None:
+        super().__init__(max_size=max_size, ttl_sec=ttl_sec)
+        self.is_db_enabled = is_db_enabled
+
+
+class DishImageCache(TTLCache):
+    """Кэш распознанных по фото блюд. Ключи: ("file", file_unique_id) и ("image", отпечаток изображения)"""
+
+    def get_by_file_id(self, file_unique_id: str) -> Any | None:
+        return self.get(("file", file_unique_id))
+
+    def get_by_image_hash(self, image_hash: str) -> Any | None:
+        return self.get(("image", image_hash))
+
+    def set_dish(self, dish: Any, image_hash: str, file_unique_id: str | None = None) -> None:
+        self.set(("image", image_hash), dish)
+        if file_unique_id:
+            self.set(("file", file_unique_id), dish)
+
+
+class RecommendationCache(TTLCache):
+    """Кэш рекомендаций по похожим запросам: корзины остатка КБЖУ и отпечаток любимых блюд -> варианты блюд.
+
+    Остаток округляется вниз до calories_bucket ккал и macros_bucket г, поэтому пользователи с близким остатком
+    на день получают один ключ. На ключ хранится до variants_per_key разных блюд, чтобы было из чего выбрать
+    не показанное пользователю за последние recent_days
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_sec: float,
+        calories_bucket: int,
+        macros_bucket: int,
+        variants_per_key: int,
+        recent_days: int,
+    ) -> None:
+        super().__init__(max_size=max_size, ttl_sec=ttl_sec)
+        self.calories_bucket = calories_bucket
+        self.macros_bucket = macros_bucket
+        self.variants_per_key = variants_per_key
+        self.recent_days = recent_days
+
+    def make_key(
+        self,
+        protein: Decimal,
+        fat: Decimal,
+        carbohydrates: Decimal,
+        calories: Decimal,
+        top_dishes: Iterable[str],
+    ) -> tuple:
+        preferences = "\n".join(sorted(name.strip().lower() for name in top_dishes))
+        return (
+            int(protein // self.macros_bucket),
+            int(fat // self.macros_bucket),
+            int(carbohydrates // self.macros_bucket),
+            int(calories // self.calories_bucket),
+            hashlib.sha256(preferences.encode()).hexdigest()[:16],
+        )
+
+    def add_variant(self, key: Hashable, recommendation: Any) -> None:
+        variants = [dish for dish in self.get(key) or [] if dish.name.lower() != recommendation.name.lower()]
+        self.set(key, [*variants, recommendation][-self.variants_per_key :])
+
+
+class RecommendationPool:
+    """Заранее сгенерированные рекомендации активных пользователей.
+
+    Запись годна, пока не изменился контекст (цель и съеденное за день, context_key) и не истёк max_age_sec.
+    Активным считается пользователь, запрашивавший рекомендацию за последние active_user_ttl_sec
+    """
+
+    def __init__(self, size: int, max_age_sec: float, active_user_ttl_sec: float) -> None:
+        self.size = size
+        self.max_age_sec = max_age_sec
+        self.active_user_ttl_sec = active_user_ttl_sec
+        self._entries: dict[int, deque[tuple[str, float, Any]]] = {}
+        self._active_users: dict[int, float] = {}
+        self._refresh_requested: set[int] = set()
+        self._refresh_event = asyncio.Event()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def touch(self, user_id: int) -> None:
+        self._active_users[user_id] = time.monotonic()
+
+    def active_users(self) -> list[int]:
+        expired_at = time.monotonic() - self.active_user_ttl_sec
+        for user_id in [user_id for user_id, seen_at in self._active_users.items() if seen_at < expired_at]:
+            del self._active_users[user_id]
+            self._entries.pop(user_id, None)
+        return list(self._active_users)
+
+    def _drop_stale(self, user_id: int, context_key: str) -> int:
+        entries = self._entries.get(user_id)
+        if not entries:
+            return 0
+        expired_at = time.monotonic() - self.max_age_sec
+        fresh = deque(entry for entry in entries if entry[0] == context_key and entry[1] > expired_at)
+        self._entries[user_id] = fresh
+        return len(entries) - len(fresh)
+
+    def pop(self, user_id: int, context_key: str) -> Any | None:
+        self._drop_stale(user_id, context_key)
+        entries = self._entries.get(user_id)
+        return entries.popleft()[2] if entries else None
+
+    def add(self, user_id: int, context_key: str, recommendation: Any) -> None:
+        self._entries.setdefault(user_id, deque()).append((context_key, time.monotonic(), recommendation))
+
+    def missing_count(self, user_id: int, context_key: str) -> int:
+        """Сколько рекомендаций не хватает до полного пула при текущем контексте"""
+        self._drop_stale(user_id, context_key)
+        return max(0, self.size - len(self._entries.get(user_id, ())))
+
+    def pooled(self, user_id: int) -> list[Any]:
+        return [recommendation for _, _, recommendation in self._entries.get(user_id, ())]
+
+    def request_refresh(self, user_id: int) -> None:
+        if not self.size:
+            return
+        self._refresh_requested.add(user_id)
+        self._refresh_event.set()
+
+    async def wait_for_refresh(self, timeout_sec: float) -> set[int]:
+        """Ждёт запросов на пополнение не дольше timeout_sec и возвращает пользователей, для которых они пришли"""
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._refresh_event.wait(), timeout_sec)
+        self._refresh_event.clear()
+        requested, self._refresh_requested = self._refresh_requested, set()
+        return requested
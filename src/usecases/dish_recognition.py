@@ -1,76 +1,165 @@
-import io
+import asyncio
+import datetime
 import logging
+from collections.abc import AsyncIterable, Callable
 from typing import BinaryIO
 
-import ffmpeg
-import speech_recognition
-
+from config import current_moscow_datetime
+from metrics import Counter
+from usecases.audio import AudioProcessor
+from usecases.caches import DishImageCache, DishTextCache
 from usecases.errors import AudioToTextError
-from usecases.interfaces import AIClientInterface, DBRepositoryInterface
+from usecases.interfaces import AIClientInterface, DBRepositoryInterface, SpeechToTextInterface
 from usecases.schemas import DishData, DishSchema
+from usecases.utils import MAX_NORMALIZED_TEXT_LENGTH, image_hash, normalize_dish_text
+
+dish_text_cache_requests = Counter(
+    "dish_text_cache_requests_total",
+    "Обращения к кэшу распознавания блюд по тексту",
+    labelnames=["result"],
+)
+dish_image_cache_requests = Counter(
+    "dish_image_cache_requests_total",
+    "Обращения к кэшу распознавания блюд по фото",
+    labelnames=["result"],
+)
 
 
 class DishRecognitionUseCase:
-    def __init__(self, ai_client: AIClientInterface, db_repository: DBRepositoryInterface):
+    def __init__(
+        self,
+        ai_client: AIClientInterface,
+        db_repository: DBRepositoryInterface,
+        dish_text_cache: DishTextCache,
+        dish_image_cache: DishImageCache,
+        audio_processor: AudioProcessor,
+        speech_to_text: SpeechToTextInterface,
+    ):
         self._ai_client = ai_client
         self._db = db_repository
-
-    async def _save_dish_to_db(self, dish_data: DishData) -> DishSchema:
+        self._dish_text_cache = dish_text_cache
+        self._dish_image_cache = dish_image_cache
+        self._audio_processor = audio_processor
+        self._speech_to_text = speech_to_text
+
+    async def _save_dish_to_db(
+        self,
+        dish_data: DishData,
+        normalized_text: str | None = None,
+        meal_user_id: int | None = None,
+        cache_dish: Callable[[DishSchema], None] | None = None,
+    ) -> DishSchema:
+        """Сохраняет блюдо. С meal_user_id тем же запросом добавляет его в статистику пользователя.
+
+        cache_dish кладёт блюдо в кэш только после коммита: иначе при откате кэш ссылался бы на несуществующую запись
+        """
         async with self._db as db:
-            return await db.save_dish(dish_data)
+            if meal_user_id is None:
+                dish = await db.save_dish(dish_data)
+            else:
+                dish = await db.log_meal(user_id=meal_user_id, dish_data=dish_data)
+            if normalized_text and self._dish_text_cache.is_db_enabled:
+                await db.save_dish_text(normalized_text=normalized_text, dish_id=dish.id)
+            if cache_dish:
+                db.on_commit(lambda: cache_dish(dish))
+        return dish
+
+    async def _log_cached_dish(self, dish: DishSchema, meal_user_id: int | None) -> DishSchema:
+        if meal_user_id is not None:
+            async with self._db as db:
+                await db.add_statistics_obj(user_id=meal_user_id, dish_id=dish.id)
+        return dish
+
+    async def _get_cached_dish_by_text(self, normalized_text: str) -> DishSchema | None:
+        if dish := self._dish_text_cache.get(normalized_text):
+            dish_text_cache_requests.inc(result="memory_hit")
+            return dish
+
+        if self._dish_text_cache.is_db_enabled:
+            created_after = current_moscow_datetime() - datetime.timedelta(seconds=self._dish_text_cache.ttl_sec)
+            async with self._db as db:
+                dish = await db.get_dish_by_text(normalized_text=normalized_text, created_after=created_after)
+            if dish:
+                dish_text_cache_requests.inc(result="db_hit")
+                self._dish_text_cache.set(normalized_text, dish)
+                return dish
+
+        dish_text_cache_requests.inc(result="miss")
+        return None
+
+    async def recognize_dish_from_text(
+        self, dish_name: str, user_id: int | None = None, log_meal: bool = False
+    ) -> DishSchema:
+        """Распознаёт блюдо по тексту. С log_meal сразу добавляет его в статистику пользователя user_id"""
+        meal_user_id = user_id if log_meal else None
+        normalized_text = normalize_dish_text(dish_name)
+        if len(normalized_text) > MAX_NORMALIZED_TEXT_LENGTH:
+            normalized_text = ""
+
+        # Повторный запрос того же блюда переиспользует уже сохранённую запись dishes без обращения к LLM
+        if normalized_text and (dish := await self._get_cached_dish_by_text(normalized_text)):
+            return await self._log_cached_dish(dish, meal_user_id)
 
-    async def recognize_dish_from_text(self, dish_name: str) -> DishSchema:
         async with self._ai_client as ai_client:
-            dish_nutrition_data = await ai_client.recognize_meal_by_text(message=dish_name)
-            return await self._save_dish_to_db(dish_data=dish_nutrition_data)
+            dish_nutrition_data = await ai_client.recognize_meal_by_text(message=dish_name, user_id=user_id)
+        return await self._save_dish_to_db(
+            dish_data=dish_nutrition_data,
+            normalized_text=normalized_text,
+            meal_user_id=meal_user_id,
+            cache_dish=(lambda dish: self._dish_text_cache.set(normalized_text, dish)) if normalized_text else None,
+        )
 
-    async def recognize_dish_from_image(self, dish_bytes: BinaryIO, mime_type: str) -> DishSchema:
+    def get_cached_dish_by_file_id(self, file_unique_id: str) -> DishSchema | None:
+        """Позволяет не скачивать фото, которое уже распознавали (повторная отправка или пересылка)"""
+        if dish := self._dish_image_cache.get_by_file_id(file_unique_id):
+            dish_image_cache_requests.inc(result="file_id_hit")
+        return dish
+
+    async def recognize_dish_from_image(
+        self,
+        dish_bytes: BinaryIO,
+        mime_type: str,
+        file_unique_id: str | None = None,
+        user_id: int | None = None,
+        log_meal: bool = False,
+    ) -> DishSchema:
+        meal_user_id = user_id if log_meal else None
+        if file_unique_id and (dish := self.get_cached_dish_by_file_id(file_unique_id)):
+            return await self._log_cached_dish(dish, meal_user_id)
+
+        dish_image_hash = await asyncio.to_thread(image_hash, dish_bytes)
+        if dish := self._dish_image_cache.get_by_image_hash(dish_image_hash):
+            dish_image_cache_requests.inc(result="image_hash_hit")
+            self._dish_image_cache.set_dish(dish, image_hash=dish_image_hash, file_unique_id=file_unique_id)
+            return await self._log_cached_dish(dish, meal_user_id)
+
+        dish_image_cache_requests.inc(result="miss")
         async with self._ai_client as ai_client:
-            dish_nutrition_data = await ai_client.recognize_meal_by_image(dish_bytes=dish_bytes, mime_type=mime_type)
-            return await self._save_dish_to_db(dish_data=dish_nutrition_data)
+            dish_nutrition_data = await ai_client.recognize_meal_by_image(
+                dish_bytes=dish_bytes, mime_type=mime_type, user_id=user_id
+            )
+        return await self._save_dish_to_db(
+            dish_data=dish_nutrition_data,
+            meal_user_id=meal_user_id,
+            cache_dish=lambda dish: self._dish_image_cache.set_dish(
+                dish, image_hash=dish_image_hash, file_unique_id=file_unique_id
+            ),
+        )
 
-    async def recognize_dish_from_audio(self, file_bytes: bytes) -> DishSchema:
-        text = await self._recognize_speech(file_bytes=file_bytes)
+    async def recognize_dish_from_audio(
+        self, audio_chunks: AsyncIterable[bytes], user_id: int | None = None, log_meal: bool = False
+    ) -> DishSchema:
+        async with self._audio_processor.slot():
+            text = await self._recognize_speech(audio_chunks=audio_chunks)
         if not text:
             logging.error("Не удалось распознать аудио")
             raise AudioToTextError
 
         async with self._ai_client as ai_client:
-            dish_nutrition_data = await ai_client.recognize_meal_by_text_from_audio(message=text)
-            return await self._save_dish_to_db(dish_data=dish_nutrition_data)
-
-    @staticmethod
-    async def _convert_ogg_to_wav(file_bytes: bytes) -> io.BytesIO:
-        """Конвертирует OGG в WAV с помощью ffmpeg"""
-        input_audio = io.BytesIO(file_bytes)  # Создаём BytesIO из bytes
-        output_audio = io.BytesIO()
-
-        process = (
-            ffmpeg.input("pipe:0", format="ogg")
-            .output("pipe:1", format="wav")
-            .run_async(pipe_stdin=True, pipe_stdout=True, pipe_stderr=True)
-        )
-
-        out, _ = process.communicate(input=input_audio.read())  # Передаём байты
-        output_audio.write(out)
-        output_audio.seek(0)
-
-        return output_audio  # Возвращаем объект BytesIO
-
-    async def _recognize_speech(self, file_bytes: bytes) -> str:
-        """Распознаёт речь из аудиофайла"""
-        recognizer = speech_recognition.Recognizer()
-
-        # Конвертируем OGG в WAV
-        wav_audio = await self._convert_ogg_to_wav(file_bytes)
-
-        with speech_recognition.AudioFile(wav_audio) as source:
-            audio = recognizer.record(source)
+            dish_nutrition_data = await ai_client.recognize_meal_by_text_from_audio(message=text, user_id=user_id)
+        return await self._save_dish_to_db(dish_data=dish_nutrition_data, meal_user_id=user_id if log_meal else None)
 
-        try:
-            text = recognizer.recognize_google(audio, language="ru-RU")
-            return text
-        except speech_recognition.UnknownValueError:
-            return ""
-        except speech_recognition.RequestError:
-            return ""
+    async def _recognize_speech(self, audio_chunks: AsyncIterable[bytes]) -> str:
+        """Распознаёт речь из потока OGG-чанков"""
+        pcm_audio = await self._audio_processor.convert_ogg_to_pcm(audio_chunks)
+        return await self._audio_processor.run_blocking(self._speech_to_text.transcribe, pcm_audio)
@@ -13,4 +13,10 @@ class UserNutritionNotSetError(Exception): ...
 class AudioToTextError(Exception): ...
 
 
+class AudioQueueFullError(Exception): ...
+
+
 class MaxRetryError(Exception): ...
+
+
+class ServiceUnavailableError(Exception): ...
@@ -1,2 +1,3 @@
 from .ai_client import AIClientInterface
 from .db import DBRepositoryInterface
+from .speech_to_text import SpeechToTextInterface
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
 from typing import BinaryIO, Self
 
-from usecases.schemas import DishData, DishRecommendation
+from usecases.schemas import DishData, DishRecommendation, DishRecommendationDraft
 
 
 class AIClientInterface(ABC):
@@ -13,19 +14,40 @@ class AIClientInterface(ABC):
 
     @abstractmethod
     async def _send_request(
-        self, system_message: str, user_message: str, attachments: list[str] | None = None, additional_message: str = ""
+        self,
+        system_message: str,
+        user_message: str,
+        attachments: list[str] | None = None,
+        additional_message: str = "",
+        user_id: int | None = None,
     ) -> str: ...
 
     @abstractmethod
-    async def recognize_meal_by_text(self, message: str, additional_message: str = "") -> DishData: ...
+    async def recognize_meal_by_text(
+        self, message: str, additional_message: str = "", user_id: int | None = None
+    ) -> DishData: ...
 
     @abstractmethod
-    async def recognize_meal_by_text_from_audio(self, message: str, additional_message: str = "") -> DishData: ...
+    async def recognize_meal_by_text_from_audio(
+        self, message: str, additional_message: str = "", user_id: int | None = None
+    ) -> DishData: ...
 
     @abstractmethod
     async def recognize_meal_by_image(
-        self, dish_bytes: BinaryIO, mime_type: str, additional_message: str = ""
+        self, dish_bytes: BinaryIO, mime_type: str, additional_message: str = "", user_id: int | None = None
     ) -> DishData: ...
 
     @abstractmethod
-    async def get_dish_recommendation(self, message: str, additional_message: str = "") -> DishRecommendation: ...
+    async def get_dish_recommendation(
+        self,
+        message: str,
+        additional_message: str = "",
+        user_id: int | None = None,
+        on_draft: Callable[[DishRecommendationDraft], Awaitable[None]] | None = None,
+        background: bool = False,
+    ) -> DishRecommendation:
+        """on_draft вызывается с уже полученной частью ответа, если клиент умеет отдавать его потоком.
+
+        background — упреждающий запрос: уступает интерактивным и не выполняется, пока сервис восстанавливается
+        после сбоев (ServiceUnavailableError)
+        """
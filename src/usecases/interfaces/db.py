@@ -1,12 +1,16 @@
 import datetime
 from abc import ABC, abstractmethod
+from collections.abc import Callable
 from typing import Self
 
 from usecases.schemas import (
+    CountedStatisticsSchema,
+    DailyNutritionSchema,
     DishData,
     DishSchema,
     NutritionData,
     NutritionSchema,
+    RecommendationDataSchema,
     UserSchema,
 )
 
@@ -18,15 +22,31 @@ class DBRepositoryInterface(ABC):
     @abstractmethod
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None: ...
 
+    # callback вызывается после коммита текущей транзакции; при откате — никогда
     @abstractmethod
-    async def create_user(self, user: UserSchema) -> None: ...
+    def on_commit(self, callback: Callable[[], None]) -> None: ...
+
+    @abstractmethod
+    async def create_user(self, user: UserSchema) -> bool: ...
 
     @abstractmethod
     async def get_users(self) -> list[UserSchema]: ...
 
+    @abstractmethod
+    async def get_user_ids(self) -> list[int]: ...
+
     @abstractmethod
     async def save_dish(self, dish_data: DishData) -> DishSchema: ...
 
+    @abstractmethod
+    async def log_meal(self, user_id: int, dish_data: DishData) -> DishSchema: ...
+
+    @abstractmethod
+    async def get_dish_by_text(self, normalized_text: str, created_after: datetime.datetime) -> DishSchema | None: ...
+
+    @abstractmethod
+    async def save_dish_text(self, normalized_text: str, dish_id: int) -> None: ...
+
     @abstractmethod
     async def add_statistics_obj(self, user_id: int, dish_id: int, like: bool = True) -> None: ...
 
@@ -35,9 +55,27 @@ class DBRepositoryInterface(ABC):
         self, user_id: int, valid_from_dt: datetime.datetime, valid_to_dt: datetime.datetime
     ) -> list[DishSchema]: ...
 
+    @abstractmethod
+    async def get_nutrition_totals(
+        self, user_id: int, valid_from_dt: datetime.datetime, valid_to_dt: datetime.datetime
+    ) -> CountedStatisticsSchema: ...
+
+    @abstractmethod
+    async def get_user_daily_nutrition_totals(
+        self, user_id: int, valid_from_dt: datetime.datetime, valid_to_dt: datetime.datetime
+    ) -> list[DailyNutritionSchema]: ...
+
     @abstractmethod
     async def get_user_dishes_history(self, user_id: int, limit: int = 50) -> list[str]: ...
 
+    @abstractmethod
+    async def get_recommendation_data(
+        self, user_id: int, valid_from_dt: datetime.datetime, valid_to_dt: datetime.datetime, history_limit: int = 50
+    ) -> RecommendationDataSchema | None: ...
+
+    @abstractmethod
+    async def get_recommended_dish_names(self, user_id: int, created_after: datetime.datetime) -> list[str]: ...
+
     @abstractmethod
     async def save_user_recommendation(self, user_id: int, dish_id: int) -> None: ...
 
@@ -0,0 +1,13 @@
+from abc import ABC, abstractmethod
+
+
+class SpeechToTextInterface(ABC):
+    """Распознавание речи. Методы блокирующие и вызываются в пуле потоков AudioProcessor"""
+
+    @abstractmethod
+    def warm_up(self) -> None:
+        """Загружает модель и прочие тяжёлые ресурсы, вызывается один раз при старте"""
+
+    @abstractmethod
+    def transcribe(self, pcm_audio: bytes) -> str:
+        """Возвращает текст из PCM s16le 16 кГц моно или пустую строку, если речь не распознана"""
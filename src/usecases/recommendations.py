@@ -1,55 +1,184 @@
+import asyncio
+import collections
 import datetime
+import logging
+from collections.abc import Awaitable, Callable
 from decimal import Decimal
 
 from config import settings
-from usecases.errors import UserNutritionNotSetError
+from metrics import Counter
+from usecases.caches import RecommendationCache, RecommendationPool
+from usecases.errors import ServiceUnavailableError, UserNutritionNotSetError
 from usecases.interfaces import AIClientInterface, DBRepositoryInterface
-from usecases.schemas import CountedStatisticsSchema, DishData, DishRecommendation, DishSchema, NutritionSchema
+from usecases.schemas import (
+    CountedStatisticsSchema,
+    DishData,
+    DishRecommendation,
+    DishRecommendationDraft,
+    RecommendationContext,
+)
+
+recommendation_pool_requests = Counter(
+    "recommendation_pool_requests_total",
+    "Запросы рекомендаций: hit — выдана готовая из пула, miss — сгенерирована по запросу",
+    labelnames=["result"],
+)
+recommendation_cache_requests = Counter(
+    "recommendation_cache_requests_total",
+    "Промахи пула рекомендаций по кэшу похожих запросов: hit — выдана из кэша, miss — запрос к модели",
+    labelnames=["result"],
+)
+
+DISHES_HISTORY_LIMIT = 50
+TOP_DISHES_COUNT = 5
 
 
 class RecommendationUseCase:
-    def __init__(self, ai_client: AIClientInterface, db_repository: DBRepositoryInterface):
+    def __init__(
+        self,
+        ai_client: AIClientInterface,
+        db_repository: DBRepositoryInterface,
+        recommendation_pool: RecommendationPool,
+        recommendation_cache: RecommendationCache,
+    ):
         self._ai_client = ai_client
         self._db = db_repository
+        self._pool = recommendation_pool
+        self._recommendation_cache = recommendation_cache
 
-    async def _get_dish_recommendation_message_text(self, user_id: int) -> str:
-        async with self._db as db:
-            user_nutrition_goal: NutritionSchema = await db.get_user_nutrition_goal(user_id=user_id)
-        if not user_nutrition_goal:
-            raise UserNutritionNotSetError
-
+    async def _get_recommendation_context(self, user_id: int) -> RecommendationContext:
+        now = datetime.datetime.now(tz=settings.moscow_tz)
         async with self._db as db:
-            user_dishes_history: list[str] = await db.get_user_dishes_history(user_id=user_id, limit=50)
-            dishes_history: [DishSchema] = await db.get_user_dishes_history_by_period(
+            recommendation_data = await db.get_recommendation_data(
                 user_id=user_id,
-                valid_from_dt=datetime.datetime.now(tz=settings.moscow_tz),
-                valid_to_dt=datetime.datetime.now(tz=settings.moscow_tz),
+                valid_from_dt=datetime.datetime.combine(now.date(), datetime.time.min, tzinfo=settings.moscow_tz),
+                valid_to_dt=datetime.datetime.combine(now.date(), datetime.time.max, tzinfo=settings.moscow_tz),
+                history_limit=DISHES_HISTORY_LIMIT,
             )
+        if recommendation_data is None:
+            raise UserNutritionNotSetError
+
+        user_nutrition_goal = recommendation_data.nutrition_goal
+        today_totals = recommendation_data.totals
+        user_dishes_history = recommendation_data.dishes_history
         dish_nutrition_goal_text = CountedStatisticsSchema(
             user_id=user_id,
-            protein=max(user_nutrition_goal.protein - sum(stat.protein for stat in dishes_history), Decimal(2)),
-            fat=max(user_nutrition_goal.fat - sum(stat.fat for stat in dishes_history), Decimal(0)),
-            carbohydrates=max(
-                user_nutrition_goal.carbohydrates - sum(stat.carbohydrates for stat in dishes_history), Decimal(10)
-            ),
-            calories=max(user_nutrition_goal.calories - sum(stat.calories for stat in dishes_history), Decimal(300)),
+            protein=max(user_nutrition_goal.protein - today_totals.protein, Decimal(2)),
+            fat=max(user_nutrition_goal.fat - today_totals.fat, Decimal(0)),
+            carbohydrates=max(user_nutrition_goal.carbohydrates - today_totals.carbohydrates, Decimal(10)),
+            calories=max(user_nutrition_goal.calories - today_totals.calories, Decimal(300)),
         )
         if user_dishes_history:
-            return (
+            message = (
                 f"Примерный (не точный) желаемый кбжу: {dish_nutrition_goal_text}. "
                 f"История прошлых блюд: {', '.join(user_dishes_history)}"
             )
-        return (
-            f"Примерный (не точный) желаемый кбжу: {dish_nutrition_goal_text}. "
-            f"Истории прошлых блюд нет, просто порекомендуй что-нибудь вкусное."
+        else:
+            message = (
+                f"Примерный (не точный) желаемый кбжу: {dish_nutrition_goal_text}. "
+                f"Истории прошлых блюд нет, просто порекомендуй что-нибудь вкусное."
+            )
+        return RecommendationContext(
+            context_key=f"{now.date()}:{dish_nutrition_goal_text}",
+            message=message,
+            remaining=dish_nutrition_goal_text,
+            dishes_history=user_dishes_history,
+        )
+
+    def _get_cache_key(self, context: RecommendationContext) -> tuple:
+        return self._recommendation_cache.make_key(
+            protein=context.remaining.protein,
+            fat=context.remaining.fat,
+            carbohydrates=context.remaining.carbohydrates,
+            calories=context.remaining.calories,
+            top_dishes=[name for name, _ in collections.Counter(context.dishes_history).most_common(TOP_DISHES_COUNT)],
+        )
+
+    async def _get_cached_recommendation(
+        self, user_id: int, cache_key: tuple, remaining: CountedStatisticsSchema
+    ) -> DishRecommendation | None:
+        """Рекомендация из кэша похожих запросов, которую пользователю не показывали за последние recent_days.
+
+        Ключ кэша округлён до корзин, поэтому порция варианта дополнительно сверяется с точным остатком КБЖУ
+        """
+        variants = [
+            dish
+            for dish in self._recommendation_cache.get(cache_key) or []
+            if all(
+                getattr(dish, field) / max(dish.servings_count, 1) <= getattr(remaining, field)
+                for field in ("protein", "fat", "carbohydrates", "calories")
+            )
+        ]
+        if not variants:
+            return None
+
+        recent_after = datetime.datetime.now(tz=settings.moscow_tz) - datetime.timedelta(
+            days=self._recommendation_cache.recent_days
         )
+        async with self._db as db:
+            recent_names = await db.get_recommended_dish_names(user_id=user_id, created_after=recent_after)
+        recent_names = {name.lower() for name in recent_names}
+        return next((dish for dish in variants if dish.name.lower() not in recent_names), None)
 
-    async def generate_recommendation(self, user_id: int) -> DishRecommendation:
-        dish_recommendation_text = await self._get_dish_recommendation_message_text(user_id=user_id)
-        async with self._ai_client as ai_client:
-            dish_recommendation = await ai_client.get_dish_recommendation(message=dish_recommendation_text)
+    async def generate_recommendation(
+        self, user_id: int, on_draft: Callable[[DishRecommendationDraft], Awaitable[None]] | None = None
+    ) -> DishRecommendation:
+        """Выдаёт готовую рекомендацию из пула или из кэша похожих запросов, иначе генерирует сразу"""
+        context = await self._get_recommendation_context(user_id=user_id)
+        self._pool.touch(user_id)
+        dish_recommendation = self._pool.pop(user_id, context.context_key)
+        if dish_recommendation is not None:
+            recommendation_pool_requests.inc(result="hit")
+        else:
+            recommendation_pool_requests.inc(result="miss")
+            cache_key = self._get_cache_key(context)
+            dish_recommendation = await self._get_cached_recommendation(user_id, cache_key, context.remaining)
+            if dish_recommendation is not None:
+                recommendation_cache_requests.inc(result="hit")
+            else:
+                recommendation_cache_requests.inc(result="miss")
+                async with self._ai_client as ai_client:
+                    dish_recommendation = await ai_client.get_dish_recommendation(
+                        message=context.message, user_id=user_id, on_draft=on_draft
+                    )
+                self._recommendation_cache.add_variant(cache_key, dish_recommendation)
+        self._pool.request_refresh(user_id)
 
         async with self._db as db:
             saved_dish = await db.save_dish(DishData(**dish_recommendation.model_dump()))
             await db.save_user_recommendation(user_id=user_id, dish_id=saved_dish.id)
         return dish_recommendation
+
+    async def refill_recommendation_pool(self, user_id: int) -> None:
+        """Догенерирует рекомендации пользователя до размера пула под его текущий контекст"""
+        try:
+            context = await self._get_recommendation_context(user_id=user_id)
+        except UserNutritionNotSetError:
+            return
+
+        for _ in range(self._pool.missing_count(user_id, context.context_key)):
+            message = context.message
+            if pooled_names := [dish.name for dish in self._pool.pooled(user_id)]:
+                message += f". Не предлагай: {', '.join(pooled_names)}"
+            try:
+                async with self._ai_client as ai_client:
+                    dish_recommendation = await ai_client.get_dish_recommendation(
+                        message=message, user_id=user_id, background=True
+                    )
+            except ServiceUnavailableError:
+                # Пока GigaChat восстанавливается, пул не пополняется: попробуем на следующем цикле воркера
+                return
+            self._pool.add(user_id, context.context_key, dish_recommendation)
+            self._recommendation_cache.add_variant(self._get_cache_key(context), dish_recommendation)
+
+    async def run_recommendation_pool_worker(self, refresh_interval_sec: float) -> None:
+        """Фоновое пополнение пула: сразу после выдачи рекомендации и раз в refresh_interval_sec для всех активных"""
+        while True:
+            requested = await self._pool.wait_for_refresh(refresh_interval_sec)
+            for user_id in requested or self._pool.active_users():
+                try:
+                    await self.refill_recommendation_pool(user_id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.warning(f"Не удалось пополнить пул рекомендаций пользователя {user_id}: {e!r}")
@@ -73,6 +73,10 @@ class NutritionSchema(NutritionData):
     id: int
 
 
+class DailyNutritionSchema(NutritionData):
+    date: datetime.date
+
+
 class DishData(NutritionData):
     name: str
 
@@ -86,6 +90,17 @@ class DishRecommendation(DishData):
     servings_count: int
 
 
+class DishRecommendationDraft(CustomBaseModel):
+    """Часть рекомендации, уже полученная из потокового ответа модели"""
+
+    name: str | None = None
+    servings_count: int | None = None
+    protein: Decimal | None = None
+    fat: Decimal | None = None
+    carbohydrates: Decimal | None = None
+    calories: Decimal | None = None
+
+
 class CountedStatisticsSchema(CustomBaseModel):
     user_id: int
     protein: Decimal = Decimal(0)
@@ -94,3 +109,20 @@ class CountedStatisticsSchema(CustomBaseModel):
     calories: Decimal = Decimal(0)
     valid_from_dt: datetime.datetime | None = None
     valid_to_dt: datetime.datetime | None = None
+
+
+class RecommendationDataSchema(CustomBaseModel):
+    """Цель КБЖУ пользователя, съеденное за период и названия последних блюд — одним запросом к БД"""
+
+    nutrition_goal: NutritionSchema
+    totals: CountedStatisticsSchema
+    dishes_history: list[str]
+
+
+class RecommendationContext(CustomBaseModel):
+    """Данные для запроса рекомендации: остаток КБЖУ на сегодня, история блюд и готовый текст запроса"""
+
+    context_key: str
+    message: str
+    remaining: CountedStatisticsSchema
+    dishes_history: list[str]
@@ -1,10 +1,9 @@
 import logging
 from datetime import datetime, time, timedelta
-from decimal import Decimal
 
 from config import settings
 from usecases.interfaces import DBRepositoryInterface
-from usecases.schemas import CountedStatisticsSchema, DishSchema
+from usecases.schemas import CountedStatisticsSchema, DailyNutritionSchema
 
 
 class StatisticsUseCase:
@@ -18,56 +17,33 @@ class StatisticsUseCase:
         logging.info(f"{today_start=}")
         logging.info(f"{today_end=}")
         async with self._db as db:
-            dishes_history: [DishSchema] = await db.get_user_dishes_history_by_period(
-                user_id=user_id,
-                valid_from_dt=today_start,
-                valid_to_dt=today_end,
-            )
-        return CountedStatisticsSchema(
-            user_id=user_id,
-            valid_from_dt=today_start,
-            valid_to_dt=today_end,
-            protein=sum((stat.protein for stat in dishes_history), start=Decimal("0")),
-            fat=sum((stat.fat for stat in dishes_history), start=Decimal("0")),
-            carbohydrates=sum((stat.carbohydrates for stat in dishes_history), start=Decimal("0")),
-            calories=sum((stat.calories for stat in dishes_history), start=Decimal("0")),
-        )
+            return await db.get_nutrition_totals(user_id=user_id, valid_from_dt=today_start, valid_to_dt=today_end)
 
     async def get_monthly_statistics(self, user_id: int) -> list[CountedStatisticsSchema]:
         today = datetime.now(settings.moscow_tz).date()
         start_date = today - timedelta(days=29)  # включая сегодня — итого 30 дней
 
-        statistics = []
         async with self._db as db:
-            for offset in range(30):
-                now = start_date + timedelta(days=offset)
-                current_date_start = datetime.combine(now, time.min).replace(tzinfo=settings.moscow_tz)
-                current_date_end = datetime.combine(now, time.max).replace(tzinfo=settings.moscow_tz)
+            daily_totals: list[DailyNutritionSchema] = await db.get_user_daily_nutrition_totals(
+                user_id=user_id,
+                valid_from_dt=datetime.combine(start_date, time.min).replace(tzinfo=settings.moscow_tz),
+                valid_to_dt=datetime.combine(today, time.max).replace(tzinfo=settings.moscow_tz),
+            )
+        totals_by_date = {totals.date: totals for totals in daily_totals}
 
-                dishes: [DishSchema] = await db.get_user_dishes_history_by_period(
+        statistics = []
+        for offset in range(30):
+            current_date = start_date + timedelta(days=offset)
+            # Дни без блюд в выборке отсутствуют — заполняем их нулями
+            totals = totals_by_date.get(current_date)
+            statistics.append(
+                CountedStatisticsSchema(
                     user_id=user_id,
-                    valid_from_dt=current_date_start,
-                    valid_to_dt=current_date_end,
-                )
-                if not dishes:
-                    statistics.append(
-                        CountedStatisticsSchema(
-                            user_id=user_id, valid_from_dt=current_date_start, valid_to_dt=current_date_end
-                        )
-                    )
-                    continue
-
-                statistics.append(
-                    CountedStatisticsSchema(
-                        user_id=user_id,
-                        valid_from_dt=current_date_start,
-                        valid_to_dt=current_date_end,
-                        protein=sum((d.protein for d in dishes), start=Decimal("0")),
-                        fat=sum((d.fat for d in dishes), start=Decimal("0")),
-                        carbohydrates=sum((d.carbohydrates for d in dishes), start=Decimal("0")),
-                        calories=sum((d.calories for d in dishes), start=Decimal("0")),
-                    )
+                    valid_from_dt=datetime.combine(current_date, time.min).replace(tzinfo=settings.moscow_tz),
+                    valid_to_dt=datetime.combine(current_date, time.max).replace(tzinfo=settings.moscow_tz),
+                    **(totals.model_dump(exclude={"date"}) if totals else {}),
                 )
+            )
 
         return statistics
 
@@ -1,18 +1,43 @@
 from decimal import Decimal
 
+from usecases.caches import KnownUsersCache
 from usecases.errors import UserNutritionNotSetError
 from usecases.interfaces import AIClientInterface, DBRepositoryInterface
 from usecases.schemas import ActivityType, GoalType, NutritionData, NutritionGoalSchema, NutritionSchema, UserSchema
 
 
 class UsersUseCase:
-    def __init__(self, ai_client: AIClientInterface, db_repository: DBRepositoryInterface):
+    def __init__(
+        self, ai_client: AIClientInterface, db_repository: DBRepositoryInterface, known_users: KnownUsersCache
+    ):
         self._ai_client = ai_client
         self._db = db_repository
+        self._known_users = known_users
+
+    async def warm_up_known_users(self) -> None:
+        async with self._db as db:
+            user_ids = await db.get_user_ids()
+        self._known_users.warm_up(user_ids)
 
     async def save_user(self, user: UserSchema) -> None:
         async with self._db as db:
             await db.create_user(user)
+        self._known_users.add(user.telegram_id)
+
+    async def register_user_if_new(self, user: UserSchema) -> bool:
+        """Сохраняет пользователя, если его ещё нет в БД. Возвращает True для нового пользователя"""
+        if user.telegram_id in self._known_users:
+            return False
+
+        async with self._known_users.lock(user.telegram_id):
+            if user.telegram_id in self._known_users:
+                return False
+
+            async with self._db as db:
+                # ON CONFLICT DO NOTHING: для существующего пользователя вернёт False, отдельная проверка не нужна
+                is_created = await db.create_user(user)
+            self._known_users.add(user.telegram_id)
+            return is_created
 
     async def get_users(self) -> list[UserSchema]:
         async with self._db as db:
@@ -0,0 +1,46 @@
+import hashlib
+import io
+import re
+from decimal import ROUND_HALF_UP, Decimal
+
+from PIL import Image
+
+MAX_NORMALIZED_TEXT_LENGTH = 512
+MAX_DISH_NAME_LENGTH = 100
+# Разница яркости соседних пикселей dHash, которую считаем шумом пережатия JPEG, а не границей на фото
+IMAGE_HASH_NOISE_THRESHOLD = 8
+
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+
+def normalize_dish_text(text: str) -> str:
+    """Приводит описание блюда к каноничному виду: регистр, ё, пунктуация и лишние пробелы не важны"""
+    text = _NON_WORD_RE.sub(" ", text.lower().replace("ё", "е"))
+    return " ".join(text.split())
+
+
+def nutrition_hash(protein: Decimal, fat: Decimal, carbohydrates: Decimal, calories: Decimal) -> str:
+    """Отпечаток КБЖУ с точностью хранения в nutrition: один знак после запятой, округление как в PostgreSQL"""
+    values = (
+        Decimal(value).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+        for value in (protein, fat, carbohydrates, calories)
+    )
+    return hashlib.sha256("|".join(map(str, values)).encode()).hexdigest()
+
+
+def image_hash(image_bytes: bytes) -> str:
+    """Перцептивный dHash изображения (64 бита), устойчивый к пережатию при пересылке фото.
+
+    Для байтов, которые Pillow не смог открыть, возвращает sha256 содержимого.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            pixels = image.convert("L").resize((9, 8)).tobytes()
+    except OSError:
+        return hashlib.sha256(image_bytes).hexdigest()
+    bits = (
+        pixels[row * 9 + col] > pixels[row * 9 + col + 1] + IMAGE_HASH_NOISE_THRESHOLD
+        for row in range(8)
+        for col in range(8)
+    )
+    return f"dhash:{sum(bit << index for index, bit in enumerate(bits)):016x}"
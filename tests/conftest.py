@@ -0,0 +1,24 @@
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from repositories.db.models import Base
+
+
+@pytest_asyncio.fixture
+async def db_engine():
+    """Движок тестовой PostgreSQL из TEST_DB_URL (postgresql+asyncpg://...). Схема создаётся и удаляется на тест"""
+    db_url = os.getenv("TEST_DB_URL")
+    if not db_url:
+        pytest.skip("TEST_DB_URL не задан")
+
+    engine = create_async_engine(db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
@@ -0,0 +1,106 @@
+"""Хендлеры добавления блюда вместе с UnitOfWorkMiddleware. Нужна PostgreSQL: TEST_DB_URL=postgresql+asyncpg://..."""
+
+import contextlib
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import pytest_asyncio
+from punq import Container
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import bot.api
+import bot.middleware
+from bot.api import process_dish_audio, process_dish_image, process_dish_text
+from bot.middleware import UnitOfWorkMiddleware
+from repositories import DBRepository, UnitOfWork
+from repositories.db.models import Statistics
+from usecases import DishRecognitionUseCase, StatisticsUseCase
+from usecases.audio import AudioProcessor
+from usecases.caches import DishImageCache, DishTextCache
+from usecases.interfaces import SpeechToTextInterface
+from usecases.schemas import DishData, UserSchema
+
+USER_ID = 5_000_000_000
+DISH = DishData(name="Борщ", protein=Decimal("8.2"), fat=Decimal(6), carbohydrates=Decimal(12), calories=Decimal(140))
+
+
+@pytest_asyncio.fixture
+async def session_factory(db_engine, monkeypatch):
+    session_factory = async_sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+    async with DBRepository(session_factory=session_factory) as db:
+        await db.create_user(UserSchema(telegram_id=USER_ID, username="test", first_name="Test"))
+
+    ai_client = AsyncMock()
+    ai_client.__aenter__.return_value = ai_client
+    ai_client.recognize_meal_by_text.return_value = DISH
+    ai_client.recognize_meal_by_image.return_value = DISH
+    ai_client.recognize_meal_by_text_from_audio.return_value = DISH
+
+    audio_processor = MagicMock(spec=AudioProcessor)
+    audio_processor.slot.return_value = contextlib.nullcontext()
+    audio_processor.convert_ogg_to_pcm = AsyncMock(return_value=b"pcm")
+    audio_processor.run_blocking = AsyncMock(return_value="борщ")
+
+    container = Container()
+    container.register(UnitOfWork, instance=UnitOfWork(session_factory=session_factory))
+    container.register(StatisticsUseCase, instance=MagicMock(spec=StatisticsUseCase))
+    container.register(
+        DishRecognitionUseCase,
+        instance=DishRecognitionUseCase(
+            ai_client=ai_client,
+            db_repository=DBRepository(session_factory=session_factory),
+            dish_text_cache=DishTextCache(max_size=10, ttl_sec=60),
+            dish_image_cache=DishImageCache(max_size=10, ttl_sec=60),
+            audio_processor=audio_processor,
+            speech_to_text=MagicMock(spec=SpeechToTextInterface),
+        ),
+    )
+    monkeypatch.setattr(bot.api, "container", container)
+    monkeypatch.setattr(bot.middleware, "container", container)
+    # Пауза перед удалением «✅ Подсчет завершен!» тесту не нужна
+    monkeypatch.setattr(bot.api, "asyncio", MagicMock(sleep=AsyncMock()))
+    return session_factory
+
+
+def make_message(text: str = "Борщ") -> MagicMock:
+    processing_message = MagicMock(message_id=2, edit_text=AsyncMock())
+    telegram_bot = MagicMock(
+        get_file=AsyncMock(return_value=MagicMock(file_path="file")),
+        download_file=AsyncMock(return_value=b"photo"),
+        delete_message=AsyncMock(),
+    )
+    return MagicMock(
+        text=text,
+        photo=[MagicMock(file_unique_id="photo-1")],
+        from_user=MagicMock(id=USER_ID),
+        chat=MagicMock(id=USER_ID),
+        bot=telegram_bot,
+        answer=AsyncMock(return_value=processing_message),
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "handler, text",
+    [
+        (process_dish_text, "Борщ"),
+        # Описание длиннее MAX_NORMALIZED_TEXT_LENGTH не кэшируется: блюду не на что повесить колбэк on_commit
+        (process_dish_text, "Борщ " * 200),
+        (process_dish_image, None),
+        (process_dish_audio, None),
+    ],
+)
+async def test_logged_meal_survives_unit_of_work(session_factory, handler, text):
+    message = make_message(text)
+
+    await UnitOfWorkMiddleware()(
+        lambda event, _data: handler(event, AsyncMock()), message, {"handler": MagicMock(callback=handler)}
+    )
+
+    replies = [call.args[0] for call in message.answer.await_args_list]
+    replies += [call.args[0] for call in message.answer.return_value.edit_text.await_args_list]
+    assert not [reply for reply in replies if reply.startswith(("❌", "⚠️"))]
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count()).select_from(Statistics)) == 1
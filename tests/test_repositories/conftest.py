@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from repositories import DBRepository, instrument_engine
+from repositories.db.instrumentation import current_repository_call
+
+from .statement_budgets import STATEMENT_BUDGETS
+
+
+class StatementLog:
+    """SQL-запросы, которые движок отправил в БД, в порядке выполнения"""
+
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def clear(self) -> None:
+        self.statements.clear()
+
+    def record(self, _conn, _cursor, statement, _parameters, _context, _executemany) -> None:
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def statement_log(db_engine) -> StatementLog:
+    log = StatementLog()
+    event.listen(db_engine.sync_engine, "before_cursor_execute", log.record)
+    yield log
+    event.remove(db_engine.sync_engine, "before_cursor_execute", log.record)
+
+
+@pytest.fixture
+def statement_budget(db_engine):
+    """Проверяет после теста, что ни один вызов метода репозитория не превысил STATEMENT_BUDGETS"""
+    calls = {}
+
+    def record_call(*_):
+        if (call := current_repository_call.get()) is not None:
+            calls[id(call)] = call
+
+    instrument_engine(db_engine)
+    event.listen(db_engine.sync_engine, "after_cursor_execute", record_call)
+    yield STATEMENT_BUDGETS
+    event.remove(db_engine.sync_engine, "after_cursor_execute", record_call)
+
+    over_budget = [
+        f"{call.method}: {call.statements} > {STATEMENT_BUDGETS[call.method]}"
+        for call in calls.values()
+        if call.statements > STATEMENT_BUDGETS[call.method]
+    ]
+    assert not over_budget, f"Превышен бюджет SQL-запросов: {over_budget}"
+
+
+@pytest.fixture
+def db_repository(db_engine) -> DBRepository:
+    return DBRepository(session_factory=async_sessionmaker(autocommit=False, autoflush=False, bind=db_engine))
@@ -0,0 +1,46 @@
+"""Клиент GigaChat поверх httpx.MockTransport и заготовки ответов API для тестов"""
+
+import time
+
+import httpx
+
+from config import GigachatConfig
+from repositories.gigachat import (
+    AIRequestScheduler,
+    CircuitBreaker,
+    GigachatClient,
+    GigachatTokenCache,
+    is_service_failure,
+)
+
+OAUTH_URL = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
+COMPLETIONS_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+
+
+def make_client(handler, circuit_breaker: CircuitBreaker | None = None) -> tuple[GigachatClient, GigachatTokenCache]:
+    config = GigachatConfig()
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    token_cache = GigachatTokenCache(config=config, http_client=http_client)
+    scheduler = AIRequestScheduler(max_concurrency=5, rate_per_sec=100, burst=10)
+    circuit_breaker = circuit_breaker or CircuitBreaker(
+        failure_threshold=100, recovery_timeout_sec=1, half_open_max_calls=1, is_failure=is_service_failure
+    )
+    client = GigachatClient(
+        config=config,
+        http_client=http_client,
+        token_cache=token_cache,
+        scheduler=scheduler,
+        circuit_breaker=circuit_breaker,
+    )
+    return client, token_cache
+
+
+def oauth_response(token: str, expires_in_sec: float = 1800) -> httpx.Response:
+    return httpx.Response(200, json={"access_token": token, "expires_at": int((time.time() + expires_in_sec) * 1000)})
+
+
+DISH_JSON = '```json\n{"name": "Суп", "calories": 200, "protein": 10, "fat": 5, "carbohydrates": 25}\n```'
+
+
+def completion_response(content: str = "ok") -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
@@ -0,0 +1,22 @@
+# Сколько SQL-запросов может выполнить один вызов каждого метода DBRepositoryInterface
+STATEMENT_BUDGETS = {
+    "create_user": 1,
+    "get_users": 1,
+    "get_user_ids": 1,
+    # Второй запрос — только при гонке со вставкой того же блюда в другой транзакции
+    "save_dish": 2,
+    "log_meal": 2,
+    "get_dish_by_text": 1,
+    "save_dish_text": 1,
+    "add_statistics_obj": 1,
+    "get_user_dishes_history_by_period": 1,
+    "get_nutrition_totals": 1,
+    "get_user_daily_nutrition_totals": 1,
+    "get_user_dishes_history": 1,
+    "get_recommendation_data": 1,
+    "get_recommended_dish_names": 1,
+    "save_user_recommendation": 1,
+    "save_nutrition": 1,
+    "set_user_nutrition_goal": 1,
+    "get_user_nutrition_goal": 1,
+}
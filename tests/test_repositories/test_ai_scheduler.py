@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from repositories.gigachat import AIRequestScheduler, RequestPriority
+from repositories.gigachat.scheduler import gigachat_queue_wait_seconds
+
+
+async def hold_slot(scheduler, order, name, priority, user_id, release):
+    async with scheduler.slot(priority=priority, user_id=user_id):
+        order.append(name)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_scheduler_serves_priority_lanes_and_users_round_robin():
+    scheduler = AIRequestScheduler(max_concurrency=1, rate_per_sec=1000, burst=1000)
+    order = []
+    release = asyncio.Event()
+    release.set()
+
+    async with scheduler.slot(priority=RequestPriority.TEXT, user_id=0):
+        tasks = [
+            asyncio.create_task(hold_slot(scheduler, order, name, priority, user_id, release))
+            for name, priority, user_id in [
+                ("pool-refill", RequestPriority.BACKGROUND, 3),
+                ("recommendation", RequestPriority.RECOMMENDATION, 3),
+                ("spam-1", RequestPriority.TEXT, 1),
+                ("spam-2", RequestPriority.TEXT, 1),
+                ("spam-3", RequestPriority.TEXT, 1),
+                ("photo", RequestPriority.PHOTO, 2),
+                ("other-user", RequestPriority.TEXT, 2),
+            ]
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth() == 7
+
+    await asyncio.gather(*tasks)
+
+    assert order == ["spam-1", "other-user", "spam-2", "spam-3", "photo", "recommendation", "pool-refill"]
+    assert scheduler.in_flight == 0
+    assert scheduler.queue_depth() == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_limits_concurrency_and_rate():
+    scheduler = AIRequestScheduler(max_concurrency=2, rate_per_sec=20, burst=2)
+    order = []
+    release = asyncio.Event()
+    waits_before = gigachat_queue_wait_seconds.value(priority=RequestPriority.TEXT.name)
+
+    tasks = [
+        asyncio.create_task(hold_slot(scheduler, order, user_id, RequestPriority.TEXT, user_id, release))
+        for user_id in range(3)
+    ]
+    await asyncio.sleep(0.01)
+    assert scheduler.in_flight == 2
+    assert scheduler.queue_depth() == 1
+
+    release.set()
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    await asyncio.gather(*tasks)
+
+    # Третий запрос ждал новый токен: burst исчерпан первыми двумя
+    assert loop.time() - started_at >= 0.03
+    assert order == [0, 1, 2]
+    assert gigachat_queue_wait_seconds.value(priority=RequestPriority.TEXT.name) - waits_before == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    scheduler = AIRequestScheduler(max_concurrency=1, rate_per_sec=1000, burst=1000)
+    release = asyncio.Event()
+
+    async with scheduler.slot(priority=RequestPriority.TEXT, user_id=1):
+        waiter = asyncio.create_task(hold_slot(scheduler, [], "waiter", RequestPriority.TEXT, 2, release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.queue_depth() == 0
+
+    assert scheduler.in_flight == 0
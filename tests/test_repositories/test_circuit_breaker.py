@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from repositories.gigachat import CircuitBreaker, CircuitState, RetryPolicy, is_service_failure
+from repositories.gigachat.circuit_breaker import gigachat_circuit_state
+from usecases.errors import MaxRetryError, ServiceUnavailableError
+
+from .gigachat_helpers import (
+    COMPLETIONS_URL,
+    DISH_JSON,
+    OAUTH_URL,
+    completion_response,
+    make_client,
+    oauth_response,
+)
+
+
+def make_breaker_client(statuses: list[int]):
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == OAUTH_URL:
+            return oauth_response("token")
+        assert str(request.url) == COMPLETIONS_URL
+        requests.append(request)
+        status = statuses.pop(0)
+        return completion_response(DISH_JSON) if status == 200 else httpx.Response(status)
+
+    circuit_breaker = CircuitBreaker(
+        failure_threshold=2, recovery_timeout_sec=0.05, half_open_max_calls=1, is_failure=is_service_failure
+    )
+    client, _ = make_client(handler, circuit_breaker=circuit_breaker)
+    client._retry_policy = RetryPolicy(max_attempts=2, base_delay_sec=0, max_delay_sec=0, deadline_sec=5)
+    return client, circuit_breaker, requests
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_failures_and_rejects_instantly():
+    client, circuit_breaker, requests = make_breaker_client([503, 503])
+
+    with pytest.raises(MaxRetryError):
+        await client.recognize_meal_by_text(message="суп")
+    assert circuit_breaker.state is CircuitState.OPEN
+    assert gigachat_circuit_state.value() == CircuitState.OPEN
+
+    started_at = time.monotonic()
+    with pytest.raises(ServiceUnavailableError):
+        await client.recognize_meal_by_text(message="суп")
+    assert time.monotonic() - started_at < 0.01
+    assert len(requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_or_reopens_breaker():
+    client, circuit_breaker, requests = make_breaker_client([503, 503, 503, 200])
+    with pytest.raises(MaxRetryError):
+        await client.recognize_meal_by_text(message="суп")
+
+    await asyncio.sleep(0.06)
+    assert circuit_breaker.state is CircuitState.HALF_OPEN
+    with pytest.raises(ServiceUnavailableError):
+        # Пробный запрос упал — предохранитель снова открыт, повтор отклоняется без обращения к API
+        await client.recognize_meal_by_text(message="суп")
+    assert circuit_breaker.state is CircuitState.OPEN
+    assert len(requests) == 3
+
+    await asyncio.sleep(0.06)
+    dish = await client.recognize_meal_by_text(message="суп")
+    assert dish.name == "Суп"
+    assert circuit_breaker.state is CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_background_recommendation_skipped_until_breaker_closes():
+    client, circuit_breaker, requests = make_breaker_client([503, 503])
+    with pytest.raises(MaxRetryError):
+        await client.recognize_meal_by_text(message="суп")
+
+    await asyncio.sleep(0.06)
+    assert circuit_breaker.state is CircuitState.HALF_OPEN
+    with pytest.raises(ServiceUnavailableError):
+        await client.get_dish_recommendation(message="рекомендация", background=True)
+    # Фоновый запрос не занял пробный слот и не дошёл до API
+    assert circuit_breaker.state is CircuitState.HALF_OPEN
+    assert len(requests) == 2
+
+
+def test_format_and_client_errors_do_not_trip_breaker():
+    request = httpx.Request("POST", COMPLETIONS_URL)
+    assert is_service_failure(httpx.ConnectError("down", request=request))
+    assert is_service_failure(httpx.HTTPStatusError("", request=request, response=httpx.Response(502)))
+    assert not is_service_failure(httpx.HTTPStatusError("", request=request, response=httpx.Response(400)))
+    assert not is_service_failure(ValueError("bad json"))
@@ -0,0 +1,69 @@
+import inspect
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from repositories import handler_scope, instrument_engine
+from repositories.db.instrumentation import (
+    NO_LABEL,
+    db_rows,
+    db_statements,
+    db_statements_per_call,
+    instrument_repository,
+)
+from usecases.interfaces import DBRepositoryInterface
+
+from .statement_budgets import STATEMENT_BUDGETS
+
+
+@instrument_repository
+class FakeRepository:
+    def __init__(self, connection) -> None:
+        self._connection = connection
+
+    async def count_numbers(self) -> int:
+        self._connection.execute(text("SELECT 1 UNION ALL SELECT 2")).all()
+        return self._connection.execute(text("SELECT 3")).scalar()
+
+
+def test_statement_budgets_cover_repository_interface():
+    methods = {
+        name
+        for name in DBRepositoryInterface.__abstractmethods__
+        if not name.startswith("_") and inspect.iscoroutinefunction(getattr(DBRepositoryInterface, name))
+    }
+    assert set(STATEMENT_BUDGETS) == methods
+
+
+@pytest.mark.asyncio
+async def test_statements_are_labeled_by_repository_method_and_handler():
+    engine = create_engine("sqlite://")
+    instrument_engine(MagicMock(sync_engine=engine))
+    statements_before = db_statements.value(method="count_numbers", handler="process_dish_text")
+    rows_before = db_rows.value(method="count_numbers")
+    calls_before = db_statements_per_call.value(method="count_numbers")
+
+    with engine.connect() as connection, handler_scope("process_dish_text"):
+        assert await FakeRepository(connection).count_numbers() == 3
+
+    assert db_statements.value(method="count_numbers", handler="process_dish_text") == statements_before + 2
+    assert db_statements_per_call.value(method="count_numbers") == calls_before + 1
+    # SQLite не сообщает rowcount для SELECT
+    assert db_rows.value(method="count_numbers") == rows_before
+
+
+def test_failed_statement_leaves_no_state_on_connection():
+    engine = create_engine("sqlite://")
+    instrument_engine(MagicMock(sync_engine=engine))
+    statements_before = db_statements.value(method=NO_LABEL, handler=NO_LABEL)
+
+    with engine.connect() as connection:
+        info_before = dict(connection.info)
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM missing"))
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+        assert dict(connection.info) == info_before
+
+    assert db_statements.value(method=NO_LABEL, handler=NO_LABEL) == statements_before + 1
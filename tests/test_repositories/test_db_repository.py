@@ -0,0 +1,115 @@
+import datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from repositories import DBRepository
+from usecases.schemas import DishData
+from usecases.utils import nutrition_hash
+
+
+def make_repository(row) -> DBRepository:
+    repository = DBRepository(session_factory=MagicMock())
+    repository._session = MagicMock()
+    result = MagicMock(one=MagicMock(return_value=row), one_or_none=MagicMock(return_value=row))
+    repository._session.execute = AsyncMock(return_value=result)
+    return repository
+
+
+@pytest.mark.asyncio
+async def test_get_recommendation_data_is_single_query():
+    row = MagicMock(
+        goal_id=7,
+        goal_protein=Decimal(100),
+        goal_fat=Decimal(70),
+        goal_carbohydrates=Decimal(250),
+        goal_calories=Decimal(2000),
+        protein=Decimal(20),
+        fat=Decimal(30),
+        carbohydrates=Decimal(100),
+        calories=Decimal(800),
+        dish_names=["борщ", "гречка"],
+    )
+    repository = make_repository(row)
+    now = datetime.datetime.now(tz=datetime.UTC)
+
+    data = await repository.get_recommendation_data(user_id=123, valid_from_dt=now, valid_to_dt=now)
+
+    repository._session.execute.assert_awaited_once()
+    sql = str(repository._session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith("WITH goal AS")
+    assert data.nutrition_goal.id == 7
+    assert data.totals.calories == Decimal(800)
+    assert data.dishes_history == ["борщ", "гречка"]
+
+
+@pytest.mark.asyncio
+async def test_get_recommendation_data_without_goal():
+    repository = make_repository(row=None)
+    now = datetime.datetime.now(tz=datetime.UTC)
+
+    assert await repository.get_recommendation_data(user_id=123, valid_from_dt=now, valid_to_dt=now) is None
+
+
+@pytest.mark.asyncio
+async def test_log_meal_inserts_nutrition_dish_and_statistics_in_one_statement():
+    row = MagicMock(
+        _mapping={
+            "id": 5,
+            "name": "Суп",
+            "protein": Decimal(10),
+            "fat": Decimal(5),
+            "carbohydrates": Decimal(20),
+            "calories": Decimal(165),
+        }
+    )
+    repository = make_repository(row)
+    dish_data = DishData(
+        name="Суп", protein=Decimal(10), fat=Decimal(5), carbohydrates=Decimal(20), calories=Decimal(165)
+    )
+
+    dish = await repository.log_meal(user_id=5_000_000_000, dish_data=dish_data)
+
+    repository._session.execute.assert_awaited_once()
+    sql = str(repository._session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.count("INSERT INTO") == 3
+    assert "INSERT INTO statistics" in sql
+    assert dish.id == 5
+    assert dish.name == "Суп"
+
+
+@pytest.mark.asyncio
+async def test_save_dish_rereads_catalog_after_concurrent_insert():
+    row = MagicMock(
+        _mapping={
+            "id": 9,
+            "name": "Борщ",
+            "protein": Decimal(8),
+            "fat": Decimal(6),
+            "carbohydrates": Decimal(12),
+            "calories": Decimal(140),
+        }
+    )
+    repository = make_repository(row)
+    repository._session.execute.return_value.one_or_none.return_value = None
+    dish_data = DishData(
+        name="борщ!", protein=Decimal(8), fat=Decimal(6), carbohydrates=Decimal(12), calories=Decimal(140)
+    )
+
+    dish = await repository.save_dish(dish_data)
+
+    assert repository._session.execute.await_count == 2
+    sql = str(repository._session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (normalized_name, nutrition_hash) DO NOTHING" in sql
+    assert dish.id == 9
+
+
+def test_nutrition_hash_matches_stored_precision():
+    assert nutrition_hash(Decimal("10.25"), Decimal(5), Decimal(20), Decimal(165)) == nutrition_hash(
+        Decimal("10.3"), Decimal("5.0"), Decimal("20.0"), Decimal("165.0")
+    )
+    assert nutrition_hash(Decimal(10), Decimal(5), Decimal(20), Decimal(165)) != nutrition_hash(
+        Decimal(10), Decimal(5), Decimal(20), Decimal(166)
+    )
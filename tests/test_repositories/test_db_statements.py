@@ -0,0 +1,83 @@
+"""Число SQL-запросов на метод репозитория. Нужна PostgreSQL: TEST_DB_URL=postgresql+asyncpg://..."""
+
+import datetime
+from decimal import Decimal
+
+import pytest
+import pytest_asyncio
+
+from usecases.schemas import DishData, NutritionData, UserSchema
+
+USER_ID = 5_000_000_000
+# Каждый вызов метода репозитория в этих тестах проверяется по STATEMENT_BUDGETS
+pytestmark = pytest.mark.usefixtures("statement_budget")
+
+DISH = DishData(name="Борщ", protein=Decimal("8.2"), fat=Decimal(6), carbohydrates=Decimal(12), calories=Decimal(140))
+
+
+@pytest_asyncio.fixture
+async def db(db_repository, statement_log):
+    async with db_repository as db:
+        await db.create_user(UserSchema(telegram_id=USER_ID, username="test", first_name="Test"))
+        statement_log.clear()
+        yield db
+
+
+@pytest.mark.asyncio
+async def test_save_dish_is_one_statement_without_lazy_loads(db, statement_log):
+    dish = await db.save_dish(DISH)
+    assert len(statement_log) == 1
+    assert dish.protein == Decimal("8.2")
+
+    statement_log.clear()
+    same_dish = await db.save_dish(DISH.model_copy(update={"name": "борщ"}))
+    assert len(statement_log) == 1
+    assert same_dish.id == dish.id
+    assert same_dish.name == "Борщ"
+
+
+@pytest.mark.asyncio
+async def test_log_meal_is_one_statement(db, statement_log):
+    dish = await db.log_meal(user_id=USER_ID, dish_data=DISH)
+
+    assert len(statement_log) == 1
+    now = datetime.datetime.now(tz=datetime.UTC)
+    totals = await db.get_nutrition_totals(
+        user_id=USER_ID, valid_from_dt=now - datetime.timedelta(minutes=1), valid_to_dt=now
+    )
+    assert totals.calories == dish.calories
+
+
+@pytest.mark.asyncio
+async def test_write_methods_are_one_statement_each(db, statement_log):
+    nutrition = await db.save_nutrition(
+        NutritionData(protein=Decimal("100.04"), fat=Decimal(70), carbohydrates=Decimal(250), calories=Decimal(2000))
+    )
+    assert len(statement_log) == 1
+    assert nutrition.protein == Decimal("100.0")
+
+    dish = await db.save_dish(DISH)
+    statement_log.clear()
+    await db.add_statistics_obj(user_id=USER_ID, dish_id=dish.id)
+    await db.save_user_recommendation(user_id=USER_ID, dish_id=dish.id)
+    await db.set_user_nutrition_goal(user_id=USER_ID, nutrition_goal_id=nutrition.id)
+    assert len(statement_log) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_recommendation_data_is_one_statement(db, statement_log):
+    nutrition = await db.save_nutrition(
+        NutritionData(protein=Decimal(100), fat=Decimal(70), carbohydrates=Decimal(250), calories=Decimal(2000))
+    )
+    await db.set_user_nutrition_goal(user_id=USER_ID, nutrition_goal_id=nutrition.id)
+    await db.log_meal(user_id=USER_ID, dish_data=DISH)
+    statement_log.clear()
+
+    now = datetime.datetime.now(tz=datetime.UTC)
+    data = await db.get_recommendation_data(
+        user_id=USER_ID, valid_from_dt=now - datetime.timedelta(minutes=1), valid_to_dt=now
+    )
+
+    assert len(statement_log) == 1
+    assert data.nutrition_goal.id == nutrition.id
+    assert data.dishes_history == ["Борщ"]
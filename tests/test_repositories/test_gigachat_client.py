@@ -0,0 +1,236 @@
+import asyncio
+import json
+import time
+from decimal import Decimal
+
+import httpx
+import pytest
+
+from config import GigachatConfig
+from repositories.gigachat import GigachatClient, RetryPolicy
+from repositories.gigachat.streaming import extract_completed_fields
+from usecases.errors import MaxRetryError
+
+from .gigachat_helpers import DISH_JSON, OAUTH_URL, completion_response, make_client, oauth_response
+
+
+@pytest.mark.asyncio
+async def test_token_is_reused_between_requests():
+    calls = {"oauth": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == OAUTH_URL:
+            calls["oauth"] += 1
+            await asyncio.sleep(0)
+            return oauth_response("token")
+        assert request.headers["Authorization"] == "Bearer token"
+        return completion_response()
+
+    client, _ = make_client(handler)
+    async with client as ai_client:
+        responses = await asyncio.gather(*(ai_client._send_request(system_message="test") for _ in range(5)))
+
+    assert responses == ["ok"] * 5
+    assert calls["oauth"] == 1
+
+
+@pytest.mark.asyncio
+async def test_token_refreshed_before_expiry():
+    tokens = iter(["expiring", "fresh"])
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == OAUTH_URL:
+            return oauth_response(next(tokens), expires_in_sec=30)
+        return completion_response(request.headers["Authorization"])
+
+    client, _ = make_client(handler)
+    assert await client._send_request(system_message="test") == "Bearer expiring"
+    assert await client._send_request(system_message="test") == "Bearer fresh"
+
+
+@pytest.mark.asyncio
+async def test_unauthorized_triggers_single_reauth_and_retry():
+    tokens = iter(["revoked", "new"])
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == OAUTH_URL:
+            return oauth_response(next(tokens))
+        if request.headers["Authorization"] == "Bearer revoked":
+            return httpx.Response(401)
+        return completion_response()
+
+    client, _ = make_client(handler)
+    assert await client._send_request(system_message="test") == "ok"
+
+
+def make_retrying_client(completions, deadline_sec: float = 5) -> tuple[GigachatClient, list[httpx.Request]]:
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == OAUTH_URL:
+            return oauth_response("token")
+        requests.append(request)
+        return await next(completions)(request)
+
+    client, _ = make_client(handler)
+    client._retry_policy = RetryPolicy(
+        max_attempts=3, base_delay_sec=0.01, max_delay_sec=0.02, deadline_sec=deadline_sec
+    )
+    return client, requests
+
+
+def respond(response: httpx.Response, delay_sec: float = 0):
+    async def handler(_):
+        await asyncio.sleep(delay_sec)
+        return response
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_transport_error_is_retried_after_retry_after():
+    client, requests = make_retrying_client(
+        iter([respond(httpx.Response(429, headers={"Retry-After": "0.2"})), respond(completion_response(DISH_JSON))])
+    )
+
+    started_at = time.monotonic()
+    dish = await client.recognize_meal_by_text(message="суп")
+
+    assert dish.name == "Суп"
+    assert len(requests) == 2
+    assert time.monotonic() - started_at >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_format_error_is_reprompted_without_backoff():
+    client, requests = make_retrying_client(
+        iter([respond(completion_response("не json")), respond(completion_response(DISH_JSON))])
+    )
+    client._retry_policy.base_delay_sec = client._retry_policy.max_delay_sec = 10
+
+    dish = await asyncio.wait_for(client.recognize_meal_by_text(message="суп"), timeout=1)
+
+    assert dish.name == "Суп"
+    assert "строго в формате JSON" in json.loads(requests[1].content)["messages"][0]["content"]
+
+
+@pytest.mark.asyncio
+async def test_fatal_error_fails_fast():
+    client, requests = make_retrying_client(iter([respond(httpx.Response(400))]))
+
+    with pytest.raises(MaxRetryError):
+        await client.recognize_meal_by_text(message="суп")
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_total_wait_is_bounded_by_deadline():
+    slow = respond(completion_response(DISH_JSON), delay_sec=1)
+    client, _ = make_retrying_client(iter([slow, slow, slow]), deadline_sec=0.1)
+
+    started_at = time.monotonic()
+    with pytest.raises(MaxRetryError):
+        await client.recognize_meal_by_text(message="суп")
+    assert time.monotonic() - started_at < 0.5
+
+
+FILES_URL = "https://gigachat.devices.sberbank.ru/api/v1/files"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(("mode", "expected_completions"), [("single", 2), ("two_step", 4)])
+async def test_photo_is_uploaded_once_across_retries(mode, expected_completions):
+    calls = {"upload": 0, "completion": 0}
+    completions = iter(["гречка", "не json", "гречка", DISH_JSON] if mode == "two_step" else ["не json", DISH_JSON])
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == OAUTH_URL:
+            return oauth_response("token")
+        if str(request.url) == FILES_URL:
+            calls["upload"] += 1
+            return httpx.Response(200, json={"id": "file-1"})
+        calls["completion"] += 1
+        return completion_response(next(completions))
+
+    client, _ = make_client(handler)
+    client._config = GigachatConfig(GIGACHAT_PHOTO_RECOGNITION_MODE=mode)
+    dish = await client.recognize_meal_by_image(dish_bytes=b"photo", mime_type="image/jpeg")
+
+    assert dish.name == "Суп"
+    assert calls == {"upload": 1, "completion": expected_completions}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(("mode", "expected_completions"), [("single", 1), ("two_step", 2)])
+async def test_audio_text_recognition_modes(mode, expected_completions):
+    completions = iter([DISH_JSON] if mode == "single" else ["суп", DISH_JSON])
+    system_messages = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == OAUTH_URL:
+            return oauth_response("token")
+        system_messages.append(json.loads(request.content)["messages"][0]["content"])
+        return completion_response(next(completions))
+
+    client, _ = make_client(handler)
+    client._config = GigachatConfig(GIGACHAT_AUDIO_RECOGNITION_MODE=mode)
+    dish = await client.recognize_meal_by_text_from_audio(message="ну я съел суп")
+
+    assert dish.name == "Суп"
+    assert len(system_messages) == expected_completions
+    assert "КБЖУ" in system_messages[-1]
+
+
+RECOMMENDATION_JSON = (
+    '```json\n{"name": "Омлет", "servings_count": 2, "protein": 30.5, "fat": 20, "carbohydrates": 6, '
+    '"calories": 330, "receipt": "Взбить яйца с молоком и обжарить"}\n```'
+)
+
+
+def sse_events(content: str, chunk_size: int = 7) -> list[bytes]:
+    chunks = [content[i : i + chunk_size] for i in range(0, len(content), chunk_size)]
+    events = [{"choices": [{"delta": {"content": chunk}, "index": 0}]} for chunk in chunks]
+    return [f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode() for event in events] + [b"data: [DONE]\n\n"]
+
+
+@pytest.mark.asyncio
+async def test_recommendation_is_streamed_with_early_drafts():
+    events = sse_events(RECOMMENDATION_JSON)
+    sent = []
+
+    async def stream_body():
+        for event in events:
+            sent.append(event)
+            yield event
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == OAUTH_URL:
+            return oauth_response("token")
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=stream_body())
+
+    drafts = []
+
+    async def on_draft(draft):
+        drafts.append((len(sent), draft))
+
+    client, _ = make_client(handler)
+    recommendation = await client.get_dish_recommendation(message="рекомендация", on_draft=on_draft)
+
+    assert recommendation.name == "Омлет"
+    assert recommendation.receipt == "Взбить яйца с молоком и обжарить"
+    first_sent, first_draft = drafts[0]
+    assert first_draft.name == "Омлет"
+    assert first_sent < len(events) // 3
+    last_sent, last_draft = drafts[-1]
+    assert last_draft.calories == 330
+    assert last_draft.protein == Decimal("30.5")
+    assert last_sent < len(events) - 5
+
+
+def test_extract_completed_fields_skips_unfinished_values():
+    fields = {"name": str, "protein": float, "fat": float}
+    partial = '```json\n{"name": "Суп \\"Том ям\\"", "protein": 25.'
+
+    assert extract_completed_fields(partial, fields) == {"name": 'Суп "Том ям"'}
+    assert extract_completed_fields(partial + '3, "fat": 1', fields) == {"name": 'Суп "Том ям"', "protein": 25.3}
@@ -0,0 +1,47 @@
+import json
+from typing import ClassVar
+from unittest.mock import MagicMock, patch
+
+from config import SpeechConfig
+from repositories.speech import GoogleSpeechToText, VoskSpeechToText, create_speech_to_text, vosk_backend
+
+
+class FakeKaldiRecognizer:
+    instances: ClassVar[list["FakeKaldiRecognizer"]] = []
+
+    def __init__(self, *_):
+        self.fed = []
+        self.instances.append(self)
+
+    def AcceptWaveform(self, data):  # noqa: N802
+        self.fed.append(data)
+        return len(self.fed) == 1
+
+    def Result(self):  # noqa: N802
+        return json.dumps({"text": "гречка с"})
+
+    def FinalResult(self):  # noqa: N802
+        return json.dumps({"text": "курицей"})
+
+
+def test_create_speech_to_text_uses_configured_backend():
+    assert isinstance(create_speech_to_text(SpeechConfig(SPEECH_BACKEND="google")), GoogleSpeechToText)
+    assert isinstance(create_speech_to_text(SpeechConfig(SPEECH_BACKEND="vosk")), VoskSpeechToText)
+
+
+def test_vosk_model_is_loaded_once_and_fed_incrementally():
+    fake_vosk = MagicMock()
+    fake_vosk.KaldiRecognizer = FakeKaldiRecognizer
+    with patch.object(vosk_backend, "vosk", fake_vosk):
+        speech_to_text = VoskSpeechToText(model_path="model")
+        speech_to_text.warm_up()
+        text = speech_to_text.transcribe(b"\x00" * (vosk_backend._FEED_SIZE * 2 + 10))
+        speech_to_text.transcribe(b"")
+
+    fake_vosk.Model.assert_called_once_with("model")
+    assert text == "гречка с курицей"
+    assert [len(chunk) for chunk in FakeKaldiRecognizer.instances[0].fed] == [
+        vosk_backend._FEED_SIZE,
+        vosk_backend._FEED_SIZE,
+        10,
+    ]
@@ -0,0 +1,153 @@
+import datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from repositories import DBRepository, UnitOfWork
+from repositories.db.models import Statistics
+from repositories.db.unit_of_work import current_session
+from usecases.schemas import DishData, UserSchema
+
+DISH = DishData(name="Борщ", protein=Decimal("8.2"), fat=Decimal(6), carbohydrates=Decimal(12), calories=Decimal(140))
+
+
+def make_session_factory() -> MagicMock:
+    sessions = []
+
+    def create_session():
+        session = async_sessionmaker()()
+        session.commit = AsyncMock()
+        session.rollback = AsyncMock()
+        session.close = AsyncMock()
+        sessions.append(session)
+        return session
+
+    return MagicMock(side_effect=create_session, sessions=sessions)
+
+
+@pytest.mark.asyncio
+async def test_repositories_share_unit_of_work_session_and_commit_once():
+    session_factory = make_session_factory()
+    unit_of_work = UnitOfWork(session_factory=session_factory)
+    repository = DBRepository(session_factory=session_factory)
+
+    async with unit_of_work.begin() as session:
+        async with repository as db:
+            assert db._session is session
+        async with unit_of_work.begin() as nested_session, repository as db:
+            assert nested_session is session
+            assert db._session is session
+        session.commit.assert_not_awaited()
+
+    assert session_factory.call_count == 1
+    session.commit.assert_awaited_once()
+    session.close.assert_awaited_once()
+    assert current_session.get() is None
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_rolls_back_on_error():
+    unit_of_work = UnitOfWork(session_factory=make_session_factory())
+
+    with pytest.raises(ValueError):
+        async with unit_of_work.begin() as session:
+            raise ValueError
+
+    session.commit.assert_not_awaited()
+    session.rollback.assert_awaited_once()
+    session.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_repository_without_unit_of_work_commits_itself():
+    session_factory = make_session_factory()
+
+    async with DBRepository(session_factory=session_factory):
+        pass
+
+    session_factory.sessions[0].commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_only_read_only_repository_blocks_release_transaction():
+    dish_row = MagicMock(
+        _mapping={"id": 1, "name": "Борщ", "protein": 8, "fat": 6, "carbohydrates": 12, "calories": 140}
+    )
+    unit_of_work = UnitOfWork(session_factory=make_session_factory())
+    repository = DBRepository(session_factory=MagicMock())
+
+    async with unit_of_work.begin() as session:
+        session.in_transaction = MagicMock(return_value=True)
+        session.execute = AsyncMock(return_value=MagicMock(one_or_none=MagicMock(return_value=None)))
+        async with repository as db:
+            await db.get_dish_by_text(normalized_text="борщ", created_after=datetime.datetime.now(tz=datetime.UTC))
+        session.rollback.assert_awaited_once()
+
+        # log_meal — SELECT с INSERT в CTE: по типу запроса запись не видна, но метод помечен @writes
+        session.execute.return_value.one_or_none.return_value = dish_row
+        async with repository as db:
+            await db.log_meal(user_id=1, dish_data=DISH)
+        session.rollback.assert_awaited_once()
+
+    session.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_on_commit_callbacks_run_only_after_commit():
+    unit_of_work = UnitOfWork(session_factory=make_session_factory())
+    repository = DBRepository(session_factory=make_session_factory())
+    committed = []
+
+    async with unit_of_work.begin() as session:
+        async with repository as db:
+            db.on_commit(lambda: committed.append("dish"))
+        assert committed == []
+        await unit_of_work.commit()
+        session.commit.assert_awaited_once()
+        assert committed == ["dish"]
+
+    assert committed == ["dish"]
+    assert session.commit.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_on_commit_callbacks_are_dropped_on_rollback():
+    unit_of_work = UnitOfWork(session_factory=make_session_factory())
+    committed = []
+
+    with pytest.raises(ValueError):
+        async with unit_of_work.begin(), DBRepository(session_factory=make_session_factory()) as db:
+            db.on_commit(lambda: committed.append("dish"))
+            raise ValueError
+
+    assert committed == []
+
+
+@pytest.mark.asyncio
+async def test_commit_outside_unit_of_work_does_nothing():
+    session_factory = make_session_factory()
+
+    await UnitOfWork(session_factory=session_factory).commit()
+
+    session_factory.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_log_meal_in_unit_of_work_is_committed(db_engine):
+    session_factory = async_sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+    repository = DBRepository(session_factory=session_factory)
+    async with repository as db:
+        await db.create_user(UserSchema(telegram_id=5_000_000_000, username="test", first_name="Test"))
+
+    # Без колбэков on_commit: после блока репозитория транзакцию держит только сама запись
+    async with UnitOfWork(session_factory=session_factory).begin():
+        async with repository as db:
+            await db.log_meal(user_id=5_000_000_000, dish_data=DISH)
+        async with repository as db:
+            await db.get_user_ids()
+
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count()).select_from(Statistics)) == 1
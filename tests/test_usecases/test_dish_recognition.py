@@ -1,16 +1,48 @@
+import asyncio
+import threading
 from decimal import Decimal
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from usecases.dish_recognition import DishRecognitionUseCase
+from usecases.audio import AudioProcessor
+from usecases.caches import DishImageCache, DishTextCache
+from usecases.dish_recognition import DishRecognitionUseCase, dish_text_cache_requests
+from usecases.errors import AudioQueueFullError, AudioToTextError
+from usecases.interfaces import SpeechToTextInterface
 from usecases.schemas import DishData, DishSchema
 
 
+async def audio_chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def make_db_repo() -> AsyncMock:
+    """Репозиторий, транзакция которого коммитится: колбэки on_commit вызываются сразу"""
+    db_repo = AsyncMock()
+    db_repo.__aenter__.return_value.on_commit = MagicMock(side_effect=lambda callback: callback())
+    return db_repo
+
+
+def make_usecase(
+    ai_client, db_repo, dish_text_cache=None, audio_processor=None, speech_to_text=None
+) -> DishRecognitionUseCase:
+    return DishRecognitionUseCase(
+        ai_client=ai_client,
+        db_repository=db_repo,
+        dish_text_cache=dish_text_cache if dish_text_cache is not None else DishTextCache(max_size=10, ttl_sec=60),
+        dish_image_cache=DishImageCache(max_size=10, ttl_sec=60),
+        audio_processor=audio_processor
+        or AudioProcessor(max_concurrency=1, max_queue_size=10, executor_workers=1, ffmpeg_timeout_sec=5),
+        speech_to_text=speech_to_text or MagicMock(spec=SpeechToTextInterface),
+    )
+
+
 @pytest.mark.asyncio
 async def test_recognize_dish_from_text():
     ai_client = AsyncMock()
-    db_repo = AsyncMock()
+    db_repo = make_db_repo()
 
     dish_data = DishData(
         name="авокадо тост", calories=Decimal(500), protein=Decimal(20), fat=Decimal(15), carbohydrates=Decimal(60)
@@ -18,8 +50,207 @@ async def test_recognize_dish_from_text():
     ai_client.__aenter__.return_value.recognize_meal_by_text.return_value = dish_data
     db_repo.__aenter__.return_value.save_dish.return_value = DishSchema(id=1, **dish_data.model_dump())
 
-    usecase = DishRecognitionUseCase(ai_client=ai_client, db_repository=db_repo)
+    usecase = make_usecase(ai_client=ai_client, db_repo=db_repo)
     result = await usecase.recognize_dish_from_text(dish_name="авокадо тост")
 
     assert result.name == "авокадо тост"
     assert result.calories == 500
+    db_repo.__aenter__.return_value.save_dish_text.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_recognize_dish_from_text_memory_cache_hit():
+    ai_client = AsyncMock()
+    db_repo = make_db_repo()
+
+    dish_data = DishData(
+        name="Гречка с курицей", calories=Decimal(450), protein=Decimal(35), fat=Decimal(10), carbohydrates=Decimal(55)
+    )
+    ai_client.__aenter__.return_value.recognize_meal_by_text.return_value = dish_data
+    db_repo.__aenter__.return_value.save_dish.return_value = DishSchema(id=7, **dish_data.model_dump())
+
+    usecase = make_usecase(ai_client=ai_client, db_repo=db_repo)
+    hits_before = dish_text_cache_requests.value(result="memory_hit")
+    first = await usecase.recognize_dish_from_text(dish_name="Гречка с курицей")
+    second = await usecase.recognize_dish_from_text(dish_name="  гречка,  с КУРИЦЕЙ! ")
+
+    assert first.id == second.id == 7
+    ai_client.__aenter__.return_value.recognize_meal_by_text.assert_awaited_once()
+    db_repo.__aenter__.return_value.save_dish.assert_awaited_once()
+    assert dish_text_cache_requests.value(result="memory_hit") == hits_before + 1
+
+
+@pytest.mark.asyncio
+async def test_recognize_dish_from_text_not_cached_until_commit():
+    ai_client = AsyncMock()
+    db_repo = AsyncMock()
+    # Транзакция так и не закоммитилась: колбэки on_commit не вызываются
+    db_repo.__aenter__.return_value.on_commit = MagicMock()
+
+    dish_data = DishData(
+        name="Сырники", calories=Decimal(400), protein=Decimal(25), fat=Decimal(15), carbohydrates=Decimal(40)
+    )
+    ai_client.__aenter__.return_value.recognize_meal_by_text.return_value = dish_data
+    db_repo.__aenter__.return_value.save_dish.return_value = DishSchema(id=9, **dish_data.model_dump())
+
+    usecase = make_usecase(ai_client=ai_client, db_repo=db_repo)
+    await usecase.recognize_dish_from_text(dish_name="Сырники")
+    await usecase.recognize_dish_from_text(dish_name="Сырники")
+
+    assert ai_client.__aenter__.return_value.recognize_meal_by_text.await_count == 2
+    db_repo.__aenter__.return_value.on_commit.assert_called()
+
+
+@pytest.mark.asyncio
+async def test_recognize_dish_from_text_logs_meal():
+    ai_client = AsyncMock()
+    db_repo = make_db_repo()
+    db = db_repo.__aenter__.return_value
+
+    dish_data = DishData(
+        name="Омлет", calories=Decimal(300), protein=Decimal(20), fat=Decimal(22), carbohydrates=Decimal(3)
+    )
+    ai_client.__aenter__.return_value.recognize_meal_by_text.return_value = dish_data
+    db.log_meal.return_value = DishSchema(id=3, **dish_data.model_dump())
+
+    usecase = make_usecase(ai_client=ai_client, db_repo=db_repo)
+    first = await usecase.recognize_dish_from_text(dish_name="омлет", user_id=123, log_meal=True)
+    second = await usecase.recognize_dish_from_text(dish_name="Омлет", user_id=123, log_meal=True)
+
+    assert first.id == second.id == 3
+    db.log_meal.assert_awaited_once_with(user_id=123, dish_data=dish_data)
+    db.save_dish.assert_not_awaited()
+    db.add_statistics_obj.assert_awaited_once_with(user_id=123, dish_id=3)
+
+
+@pytest.mark.asyncio
+async def test_recognize_dish_from_text_db_cache_hit():
+    ai_client = AsyncMock()
+    db_repo = AsyncMock()
+
+    cached_dish = DishSchema(
+        id=3, name="Борщ", calories=Decimal(300), protein=Decimal(12), fat=Decimal(14), carbohydrates=Decimal(30)
+    )
+    db_repo.__aenter__.return_value.get_dish_by_text.return_value = cached_dish
+
+    usecase = make_usecase(
+        ai_client=ai_client, db_repo=db_repo, dish_text_cache=DishTextCache(max_size=10, ttl_sec=60, is_db_enabled=True)
+    )
+    result = await usecase.recognize_dish_from_text(dish_name="Борщ")
+
+    assert result == cached_dish
+    assert db_repo.__aenter__.return_value.get_dish_by_text.await_args.kwargs["normalized_text"] == "борщ"
+    ai_client.__aenter__.return_value.recognize_meal_by_text.assert_not_awaited()
+    db_repo.__aenter__.return_value.save_dish.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_recognize_dish_from_image_cache_hits():
+    ai_client = AsyncMock()
+    db_repo = make_db_repo()
+
+    dish_data = DishData(
+        name="Омлет", calories=Decimal(250), protein=Decimal(18), fat=Decimal(19), carbohydrates=Decimal(2)
+    )
+    ai_client.__aenter__.return_value.recognize_meal_by_image.return_value = dish_data
+    db_repo.__aenter__.return_value.save_dish.return_value = DishSchema(id=5, **dish_data.model_dump())
+
+    usecase = make_usecase(ai_client=ai_client, db_repo=db_repo)
+    first = await usecase.recognize_dish_from_image(dish_bytes=b"photo", mime_type="image/jpeg", file_unique_id="a")
+    # Та же картинка, пересланная другим сообщением, приходит с другим file_unique_id
+    forwarded = await usecase.recognize_dish_from_image(dish_bytes=b"photo", mime_type="image/jpeg", file_unique_id="b")
+
+    assert first.id == forwarded.id == 5
+    assert usecase.get_cached_dish_by_file_id("a") == usecase.get_cached_dish_by_file_id("b") == first
+    assert usecase.get_cached_dish_by_file_id("c") is None
+    ai_client.__aenter__.return_value.recognize_meal_by_image.assert_awaited_once()
+    db_repo.__aenter__.return_value.save_dish.assert_awaited_once()
+
+
+def test_image_cache_evicts_least_recently_used():
+    cache = DishImageCache(max_size=2, ttl_sec=60)
+    cache.set_dish("борщ", image_hash="1")
+    cache.set_dish("омлет", image_hash="2")
+    cache.get_by_image_hash("1")
+    cache.set_dish("салат", image_hash="3")
+
+    assert len(cache) == 2
+    assert cache.get_by_image_hash("1") == "борщ"
+    assert cache.get_by_image_hash("2") is None
+
+
+@pytest.mark.asyncio
+async def test_recognize_dish_from_audio_runs_speech_recognition_off_event_loop():
+    ai_client = AsyncMock()
+    db_repo = AsyncMock()
+    dish_data = DishData(
+        name="Суп", calories=Decimal(200), protein=Decimal(10), fat=Decimal(5), carbohydrates=Decimal(25)
+    )
+    ai_client.__aenter__.return_value.recognize_meal_by_text_from_audio.return_value = dish_data
+    db_repo.__aenter__.return_value.save_dish.return_value = DishSchema(id=2, **dish_data.model_dump())
+
+    audio_processor = AudioProcessor(max_concurrency=1, max_queue_size=10, executor_workers=1, ffmpeg_timeout_sec=5)
+    audio_processor.convert_ogg_to_pcm = AsyncMock(return_value=b"pcm")
+    loop_thread = threading.current_thread()
+    recognition_threads = []
+
+    def transcribe(_):
+        recognition_threads.append(threading.current_thread())
+        return "суп"
+
+    speech_to_text = MagicMock(spec=SpeechToTextInterface)
+    speech_to_text.transcribe.side_effect = transcribe
+
+    usecase = make_usecase(
+        ai_client=ai_client, db_repo=db_repo, audio_processor=audio_processor, speech_to_text=speech_to_text
+    )
+    result = await usecase.recognize_dish_from_audio(audio_chunks=audio_chunks(b"ogg"))
+
+    assert result.id == 2
+    assert recognition_threads and recognition_threads[0] is not loop_thread
+    ai_client.__aenter__.return_value.recognize_meal_by_text_from_audio.assert_awaited_once_with(
+        message="суп", user_id=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_audio_processor_limits_concurrency_and_queue():
+    audio_processor = AudioProcessor(max_concurrency=1, max_queue_size=1, executor_workers=1, ffmpeg_timeout_sec=5)
+    release = asyncio.Event()
+
+    async def hold_slot():
+        async with audio_processor.slot():
+            await release.wait()
+
+    running = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AudioQueueFullError):
+        async with audio_processor.slot():
+            pass
+
+    release.set()
+    await asyncio.gather(running, queued)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("command", "expected"),
+    [(("cat",), b"ogg-chunk-1ogg-chunk-2"), (("sh", "-c", "cat > /dev/null; echo broken >&2; exit 1"), None)],
+)
+async def test_audio_processor_streams_chunks_through_subprocess(command, expected):
+    audio_processor = AudioProcessor(max_concurrency=1, max_queue_size=1, executor_workers=1, ffmpeg_timeout_sec=5)
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def fake_ffmpeg(*_, **kwargs):
+        return await create_subprocess_exec(*command, **kwargs)
+
+    with patch("usecases.audio.asyncio.create_subprocess_exec", fake_ffmpeg):
+        chunks = audio_chunks(b"ogg-chunk-1", b"ogg-chunk-2")
+        if expected is None:
+            with pytest.raises(AudioToTextError):
+                await audio_processor.convert_ogg_to_pcm(chunks)
+        else:
+            assert await audio_processor.convert_ogg_to_pcm(chunks) == expected
@@ -4,8 +4,62 @@ from unittest.mock import AsyncMock, MagicMock
 import pytest
 
 from usecases import RecommendationUseCase
-from usecases.errors import UserNutritionNotSetError
-from usecases.schemas import DishRecommendation, DishSchema, NutritionSchema
+from usecases.caches import RecommendationCache, RecommendationPool
+from usecases.errors import ServiceUnavailableError, UserNutritionNotSetError
+from usecases.schemas import (
+    CountedStatisticsSchema,
+    DishRecommendation,
+    NutritionSchema,
+    RecommendationDataSchema,
+)
+
+
+def make_pool(size: int = 2) -> RecommendationPool:
+    return RecommendationPool(size=size, max_age_sec=60, active_user_ttl_sec=60)
+
+
+def make_cache() -> RecommendationCache:
+    return RecommendationCache(
+        max_size=10, ttl_sec=60, calories_bucket=50, macros_bucket=5, variants_per_key=3, recent_days=14
+    )
+
+
+def make_recommendation_data(eaten_calories: int = 800, dishes_history: list[str] | None = None):
+    return RecommendationDataSchema(
+        nutrition_goal=NutritionSchema(
+            protein=Decimal(100), fat=Decimal(70), carbohydrates=Decimal(250), calories=Decimal(2000), id=1
+        ),
+        totals=CountedStatisticsSchema(
+            user_id=123,
+            protein=Decimal(20),
+            fat=Decimal(30),
+            carbohydrates=Decimal(100),
+            calories=Decimal(eaten_calories),
+        ),
+        dishes_history=dishes_history or [],
+    )
+
+
+def make_db(eaten_calories: int = 800) -> MagicMock:
+    mock_db = MagicMock()
+    mock_db.__aenter__.return_value = mock_db
+    mock_db.get_recommendation_data = AsyncMock(return_value=make_recommendation_data(eaten_calories))
+    mock_db.save_dish = AsyncMock(return_value=MagicMock(id=1))
+    mock_db.get_recommended_dish_names = AsyncMock(return_value=[])
+    mock_db.save_user_recommendation = AsyncMock()
+    return mock_db
+
+
+def make_recommendation(name: str) -> DishRecommendation:
+    return DishRecommendation(
+        name=name,
+        protein=Decimal(40),
+        fat=Decimal(10),
+        carbohydrates=Decimal(60),
+        calories=Decimal(600),
+        receipt="Рецепт блюда",
+        servings_count=2,
+    )
 
 
 @pytest.mark.asyncio
@@ -13,27 +67,8 @@ async def test_generate_recommendation_success():
     # Подготовка mock-ов
     mock_db = MagicMock()
     mock_db.__aenter__.return_value = mock_db
-    mock_db.get_user_nutrition_goal = AsyncMock(
-        return_value=NutritionSchema(
-            protein=Decimal(100),
-            fat=Decimal(70),
-            carbohydrates=Decimal(250),
-            calories=Decimal(2000),
-            id=1,
-        )
-    )
-    mock_db.get_user_dishes_history = AsyncMock(return_value=["борщ", "гречка"])
-    mock_db.get_user_dishes_history_by_period = AsyncMock(
-        return_value=[
-            DishSchema(
-                protein=Decimal(20),
-                fat=Decimal(30),
-                carbohydrates=Decimal(100),
-                calories=Decimal(800),
-                name="4 сыра пицца",
-                id=1,
-            ),
-        ]
+    mock_db.get_recommendation_data = AsyncMock(
+        return_value=make_recommendation_data(dishes_history=["борщ", "гречка"])
     )
     mock_db.save_dish = AsyncMock(return_value=MagicMock(id=1))
     mock_db.save_user_recommendation = AsyncMock()
@@ -53,28 +88,150 @@ async def test_generate_recommendation_success():
     )
 
     # Создание usecase
-    use_case = RecommendationUseCase(ai_client=mock_ai, db_repository=mock_db)
+    use_case = RecommendationUseCase(
+        ai_client=mock_ai, db_repository=mock_db, recommendation_pool=make_pool(), recommendation_cache=make_cache()
+    )
 
     # Вызов
     result = await use_case.generate_recommendation(user_id=123)
 
     # Проверки
     assert result.name == "Куриная грудка"
-    mock_db.get_user_nutrition_goal.assert_called_once_with(user_id=123)
-    mock_db.get_user_dishes_history.assert_called_once_with(user_id=123, limit=50)
+    mock_db.get_recommendation_data.assert_awaited_once()
+    assert mock_db.get_recommendation_data.await_args.kwargs["history_limit"] == 50
     mock_ai.get_dish_recommendation.assert_awaited()
+    assert "calories=Decimal('1200')" in mock_ai.get_dish_recommendation.await_args.kwargs["message"]
 
 
 @pytest.mark.asyncio
 async def test_generate_recommendation_nutrition_not_set():
     mock_db = MagicMock()
     mock_db.__aenter__.return_value = mock_db
-    mock_db.get_user_nutrition_goal = AsyncMock(return_value=None)
+    mock_db.get_recommendation_data = AsyncMock(return_value=None)
 
     mock_ai = MagicMock()
     mock_ai.__aenter__.return_value = mock_ai
 
-    use_case = RecommendationUseCase(ai_client=mock_ai, db_repository=mock_db)
+    use_case = RecommendationUseCase(
+        ai_client=mock_ai, db_repository=mock_db, recommendation_pool=make_pool(), recommendation_cache=make_cache()
+    )
 
     with pytest.raises(UserNutritionNotSetError):
         await use_case.generate_recommendation(user_id=123)
+
+
+@pytest.mark.asyncio
+async def test_generate_recommendation_served_from_pool():
+    mock_db = make_db()
+    mock_ai = MagicMock()
+    mock_ai.__aenter__.return_value = mock_ai
+    mock_ai.get_dish_recommendation = AsyncMock(side_effect=[make_recommendation("Омлет"), make_recommendation("Плов")])
+    pool = make_pool()
+    use_case = RecommendationUseCase(
+        ai_client=mock_ai, db_repository=mock_db, recommendation_pool=pool, recommendation_cache=make_cache()
+    )
+
+    await use_case.refill_recommendation_pool(user_id=123)
+    assert [dish.name for dish in pool.pooled(123)] == ["Омлет", "Плов"]
+    assert "Не предлагай: Омлет" in mock_ai.get_dish_recommendation.await_args.kwargs["message"]
+
+    result = await use_case.generate_recommendation(user_id=123)
+
+    assert result.name == "Омлет"
+    assert mock_ai.get_dish_recommendation.await_count == 2
+    mock_db.save_user_recommendation.assert_awaited_once_with(user_id=123, dish_id=1)
+    assert await pool.wait_for_refresh(timeout_sec=0) == {123}
+
+
+@pytest.mark.asyncio
+async def test_refill_recommendation_pool_is_background_and_stops_when_service_unavailable():
+    mock_ai = MagicMock()
+    mock_ai.__aenter__.return_value = mock_ai
+    mock_ai.get_dish_recommendation = AsyncMock(
+        side_effect=[make_recommendation("Омлет"), ServiceUnavailableError("GigaChat временно недоступен")]
+    )
+    pool = make_pool(size=3)
+    use_case = RecommendationUseCase(
+        ai_client=mock_ai, db_repository=make_db(), recommendation_pool=pool, recommendation_cache=make_cache()
+    )
+
+    await use_case.refill_recommendation_pool(user_id=123)
+
+    assert [dish.name for dish in pool.pooled(123)] == ["Омлет"]
+    assert mock_ai.get_dish_recommendation.await_count == 2
+    assert mock_ai.get_dish_recommendation.await_args.kwargs["background"] is True
+
+
+@pytest.mark.asyncio
+async def test_generate_recommendation_ignores_pool_after_intake_changed():
+    mock_ai = MagicMock()
+    mock_ai.__aenter__.return_value = mock_ai
+    mock_ai.get_dish_recommendation = AsyncMock(
+        side_effect=[make_recommendation("Омлет"), make_recommendation("Салат")]
+    )
+    pool, cache = make_pool(size=1), make_cache()
+
+    await RecommendationUseCase(
+        ai_client=mock_ai,
+        db_repository=make_db(eaten_calories=800),
+        recommendation_pool=pool,
+        recommendation_cache=cache,
+    ).refill_recommendation_pool(user_id=123)
+    result = await RecommendationUseCase(
+        ai_client=mock_ai,
+        db_repository=make_db(eaten_calories=1500),
+        recommendation_pool=pool,
+        recommendation_cache=cache,
+    ).generate_recommendation(user_id=123)
+
+    assert result.name == "Салат"
+    assert pool.pooled(123) == []
+
+
+@pytest.mark.asyncio
+async def test_generate_recommendation_reuses_cached_for_similar_remaining_macros():
+    mock_ai = MagicMock()
+    mock_ai.__aenter__.return_value = mock_ai
+    mock_ai.get_dish_recommendation = AsyncMock(side_effect=[make_recommendation("Омлет"), make_recommendation("Плов")])
+    cache = make_cache()
+
+    def make_use_case(mock_db: MagicMock) -> RecommendationUseCase:
+        return RecommendationUseCase(
+            ai_client=mock_ai, db_repository=mock_db, recommendation_pool=make_pool(size=0), recommendation_cache=cache
+        )
+
+    first = await make_use_case(make_db(eaten_calories=810)).generate_recommendation(user_id=123)
+    similar = await make_use_case(make_db(eaten_calories=830)).generate_recommendation(user_id=456)
+    assert first.name == similar.name == "Омлет"
+    assert mock_ai.get_dish_recommendation.await_count == 1
+
+    recently_shown_db = make_db(eaten_calories=830)
+    recently_shown_db.get_recommended_dish_names.return_value = ["омлет"]
+    result = await make_use_case(recently_shown_db).generate_recommendation(user_id=456)
+
+    assert result.name == "Плов"
+    assert mock_ai.get_dish_recommendation.await_count == 2
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_recommendation_skips_cached_variant_over_remaining_budget():
+    # Порция 1180 ккал укладывается в остаток 1190, но не в 1165 из той же корзины 1150-1199
+    hearty = make_recommendation("Стейк").model_copy(update={"calories": Decimal(2360)})
+    mock_ai = MagicMock()
+    mock_ai.__aenter__.return_value = mock_ai
+    mock_ai.get_dish_recommendation = AsyncMock(side_effect=[hearty, make_recommendation("Омлет")])
+    cache = make_cache()
+
+    def make_use_case(mock_db: MagicMock) -> RecommendationUseCase:
+        return RecommendationUseCase(
+            ai_client=mock_ai, db_repository=mock_db, recommendation_pool=make_pool(size=0), recommendation_cache=cache
+        )
+
+    first = await make_use_case(make_db(eaten_calories=810)).generate_recommendation(user_id=123)
+    over_budget = await make_use_case(make_db(eaten_calories=835)).generate_recommendation(user_id=456)
+
+    assert first.name == "Стейк"
+    assert over_budget.name == "Омлет"
+    assert mock_ai.get_dish_recommendation.await_count == 2
+    assert len(cache) == 1
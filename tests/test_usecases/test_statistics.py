@@ -1,33 +1,23 @@
+from datetime import timedelta
 from decimal import Decimal
 from unittest.mock import AsyncMock
 
 import pytest
 
-from usecases.schemas import DishSchema
+from usecases.schemas import CountedStatisticsSchema, DailyNutritionSchema
 from usecases.statistics import StatisticsUseCase
 
 
 @pytest.mark.asyncio
 async def test_get_daily_statistics_with_data():
     db_repo = AsyncMock()
-    db_repo.__aenter__.return_value.get_user_dishes_history_by_period.return_value = [
-        DishSchema(
-            protein=Decimal("10"),
-            fat=Decimal("5"),
-            carbohydrates=Decimal("20"),
-            calories=Decimal("200"),
-            id=1,
-            name="Лазанья",
-        ),
-        DishSchema(
-            protein=Decimal("7"),
-            fat=Decimal("3"),
-            carbohydrates=Decimal("15"),
-            calories=Decimal("150"),
-            id=2,
-            name="Овсянка",
-        ),
-    ]
+    db_repo.__aenter__.return_value.get_nutrition_totals.return_value = CountedStatisticsSchema(
+        user_id=1,
+        protein=Decimal("17"),
+        fat=Decimal("8"),
+        carbohydrates=Decimal("35"),
+        calories=Decimal("350"),
+    )
 
     usecase = StatisticsUseCase(db_repository=db_repo)
     result = await usecase.get_daily_statistics(user_id=1)
@@ -36,12 +26,15 @@ async def test_get_daily_statistics_with_data():
     assert result.fat == Decimal("8")
     assert result.carbohydrates == Decimal("35")
     assert result.calories == Decimal("350")
+    call_kwargs = db_repo.__aenter__.return_value.get_nutrition_totals.await_args.kwargs
+    assert call_kwargs["user_id"] == 1
+    assert call_kwargs["valid_from_dt"].date() == call_kwargs["valid_to_dt"].date()
 
 
 @pytest.mark.asyncio
 async def test_get_daily_statistics_empty():
     db_repo = AsyncMock()
-    db_repo.__aenter__.return_value.get_user_dishes_history_by_period.return_value = []
+    db_repo.__aenter__.return_value.get_nutrition_totals.return_value = CountedStatisticsSchema(user_id=1)
 
     usecase = StatisticsUseCase(db_repository=db_repo)
     result = await usecase.get_daily_statistics(user_id=1)
@@ -56,26 +49,27 @@ async def test_get_daily_statistics_empty():
 async def test_get_monthly_statistics_mixed_days():
     db_repo = AsyncMock()
 
-    async def get_history(valid_from_dt, **_):
-        if valid_from_dt.date().day % 2 == 0:
-            return [
-                DishSchema(
-                    protein=Decimal("5"),
-                    fat=Decimal("2"),
-                    carbohydrates=Decimal("10"),
-                    calories=Decimal("100"),
-                    id=1,
-                    name="Салат",
-                )
-            ]
-        return []
-
-    db_repo.__aenter__.return_value.get_user_dishes_history_by_period.side_effect = get_history
+    async def get_daily_totals(valid_from_dt, valid_to_dt, **_):
+        days = (valid_to_dt.date() - valid_from_dt.date()).days + 1
+        return [
+            DailyNutritionSchema(
+                date=valid_from_dt.date() + timedelta(days=offset),
+                protein=Decimal("5"),
+                fat=Decimal("2"),
+                carbohydrates=Decimal("10"),
+                calories=Decimal("100"),
+            )
+            for offset in range(days)
+            if (valid_from_dt.date() + timedelta(days=offset)).day % 2 == 0
+        ]
+
+    db_repo.__aenter__.return_value.get_user_daily_nutrition_totals.side_effect = get_daily_totals
 
     usecase = StatisticsUseCase(db_repository=db_repo)
     stats = await usecase.get_monthly_statistics(user_id=1)
 
     assert len(stats) == 30
+    db_repo.__aenter__.return_value.get_user_daily_nutrition_totals.assert_awaited_once()
     for stat in stats:
         if stat.valid_from_dt.day % 2 == 0:
             assert stat.protein == Decimal("5")
@@ -92,7 +86,7 @@ async def test_get_monthly_statistics_mixed_days():
 @pytest.mark.asyncio
 async def test_get_monthly_statistics_all_empty():
     db_repo = AsyncMock()
-    db_repo.__aenter__.return_value.get_user_dishes_history_by_period.return_value = []
+    db_repo.__aenter__.return_value.get_user_daily_nutrition_totals.return_value = []
 
     usecase = StatisticsUseCase(db_repository=db_repo)
     stats = await usecase.get_monthly_statistics(user_id=1)
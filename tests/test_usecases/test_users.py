@@ -1,8 +1,10 @@
+import asyncio
 from unittest.mock import AsyncMock
 
 import pytest
 
-from usecases.schemas import ActivityType, GoalType, NutritionGoalSchema
+from usecases.caches import KnownUsersCache
+from usecases.schemas import ActivityType, GoalType, NutritionGoalSchema, UserSchema
 from usecases.users import UsersUseCase
 
 
@@ -14,7 +16,7 @@ async def test_set_nutrition_goal(mocker):
     db_repo.__aenter__.return_value.save_nutrition.return_value = mocker.Mock(id=42)
     db_repo.__aenter__.return_value.set_user_nutrition_goal.return_value = None
 
-    usecase = UsersUseCase(ai_client=ai_client, db_repository=db_repo)
+    usecase = UsersUseCase(ai_client=ai_client, db_repository=db_repo, known_users=KnownUsersCache())
     await usecase.set_nutrition_goal(
         user_id=1,
         goal_data=NutritionGoalSchema(
@@ -28,3 +30,50 @@ async def test_set_nutrition_goal(mocker):
     )
 
     db_repo.__aenter__.return_value.set_user_nutrition_goal.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_register_user_if_new_known_user_skips_db():
+    db_repo = AsyncMock()
+    known_users = KnownUsersCache()
+    known_users.warm_up([1])
+
+    usecase = UsersUseCase(ai_client=AsyncMock(), db_repository=db_repo, known_users=known_users)
+    is_created = await usecase.register_user_if_new(UserSchema(telegram_id=1, first_name="Иван"))
+
+    assert is_created is False
+    db_repo.__aenter__.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_register_user_if_new_existing_in_db_is_cached():
+    db_repo = AsyncMock()
+    db_repo.__aenter__.return_value.create_user.return_value = False
+    known_users = KnownUsersCache()
+
+    usecase = UsersUseCase(ai_client=AsyncMock(), db_repository=db_repo, known_users=known_users)
+    user = UserSchema(telegram_id=1, first_name="Иван")
+    is_created = await usecase.register_user_if_new(user)
+
+    assert is_created is False
+    assert 1 in known_users
+    db_repo.__aenter__.return_value.create_user.assert_awaited_once_with(user)
+
+
+@pytest.mark.asyncio
+async def test_register_user_if_new_concurrent_updates_insert_once():
+    db_repo = AsyncMock()
+
+    async def create_user(_):
+        await asyncio.sleep(0)
+        return True
+
+    db_repo.__aenter__.return_value.create_user.side_effect = create_user
+    known_users = KnownUsersCache()
+
+    usecase = UsersUseCase(ai_client=AsyncMock(), db_repository=db_repo, known_users=known_users)
+    user = UserSchema(telegram_id=1, first_name="Иван")
+    results = await asyncio.gather(*(usecase.register_user_if_new(user) for _ in range(5)))
+
+    assert results.count(True) == 1
+    db_repo.__aenter__.return_value.create_user.assert_awaited_once_with(user)
@@ -0,0 +1,46 @@
+import io
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from usecases.utils import image_hash
+
+
+def dish_photo() -> Image.Image:
+    """Тарелка борща на столе: мягкие границы и освещение, как на фотографии"""
+    image = Image.merge("RGB", [Image.linear_gradient("L").resize((640, 480))] * 3)
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((80, 60, 560, 420), fill=(250, 250, 245))
+    draw.ellipse((160, 120, 480, 360), fill=(170, 40, 50))
+    draw.rectangle((0, 400, 640, 480), fill=(90, 60, 40))
+    return image.filter(ImageFilter.GaussianBlur(4))
+
+
+def encode_jpeg(image: Image.Image, quality: int, size: tuple[int, int] | None = None) -> bytes:
+    if size:
+        image = image.resize(size)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_image_hash_survives_reencoding():
+    original = encode_jpeg(dish_photo(), quality=95)
+    # Telegram пережимает фото при пересылке: другое качество и размер, другие байты
+    forwarded = [
+        encode_jpeg(Image.open(io.BytesIO(original)), quality=quality, size=size)
+        for quality, size in ((80, None), (60, (320, 240)), (40, (1280, 960)))
+    ]
+
+    assert original not in forwarded
+    assert {image_hash(photo) for photo in forwarded} == {image_hash(original)}
+    assert image_hash(original).startswith("dhash:")
+
+
+def test_image_hash_differs_for_other_image():
+    other = dish_photo().transpose(Image.Transpose.FLIP_LEFT_RIGHT).rotate(90, expand=True)
+
+    assert image_hash(encode_jpeg(dish_photo(), quality=95)) != image_hash(encode_jpeg(other, quality=95))
+
+
+def test_image_hash_of_non_image_bytes():
+    assert image_hash(b"photo") == image_hash(b"photo") != image_hash(b"other")